@@ -9,4 +9,10 @@ admin.site.register(Week)
 admin.site.register(Media)
 admin.site.register(KidVoiceRecording)
 admin.site.register(Feedback)
+admin.site.register(UploadSession)
+admin.site.register(DerivativeJob)
 
+admin.site.register(PendingFileDeletion)
+admin.site.register(DirectUpload)
+admin.site.register(WeekSummary)
+admin.site.register(RecordingRollup)
@@ -0,0 +1,96 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Sum
+
+from .models import KidVoiceRecording, RecordingRollup, Week
+
+MEDIA_TYPES = [media_type for media_type, _ in KidVoiceRecording.MEDIA_TYPE_CHOICES]
+TOTALS = ('recordings', 'reviewed', 'stars_total', 'review_time_total')
+
+
+def empty_totals():
+    return {'recordings': 0, 'reviewed': 0, 'stars_total': 0, 'review_time_total': timedelta()}
+
+
+def add_totals(totals, row):
+    for field in TOTALS:
+        totals[field] += row[field]
+
+
+def rollup_stats(totals):
+    """
+    Recording count, reviewed count, average stars, completion rate (share of
+    recordings reviewed) and average review latency in hours of ``totals``.
+    """
+    recordings, reviewed = totals['recordings'], totals['reviewed']
+    return {
+        'recordings': recordings,
+        'reviewed': reviewed,
+        'average_stars': round(totals['stars_total'] / reviewed, 2) if reviewed else None,
+        'completion_rate': round(reviewed / recordings, 3) if recordings else None,
+        'average_review_hours': (round(totals['review_time_total'].total_seconds() / reviewed / 3600, 2)
+                                 if reviewed else None),
+    }
+
+
+def stats_of(rows):
+    """
+    Stats of ``rows`` (rollup sums with a ``media_type``) overall and by
+    media type.
+    """
+    overall = empty_totals()
+    media_types = {media_type: empty_totals() for media_type in MEDIA_TYPES}
+    for row in rows:
+        add_totals(overall, row)
+        add_totals(media_types[row['media_type']], row)
+    return {'overall': rollup_stats(overall),
+            'media_types': {media_type: rollup_stats(totals) for media_type, totals in media_types.items()}}
+
+
+def grouped_stats(rows, key):
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row[key]].append(row)
+    return {value: stats_of(group) for value, group in groups.items()}
+
+
+def summed_rollups(queryset, key):
+    return list(queryset.values(key, 'media_type').order_by().annotate(**{field: Sum(field) for field in TOTALS}))
+
+
+def kid_progress(kid):
+    """
+    Review stats of a kid's recordings for each week, overall and by media
+    type, and across all weeks, from the recording rollups in two queries.
+    """
+    weeks = list(Week.objects.filter(kid=kid).order_by('week_number').values('id', 'week_number'))
+    rows = summed_rollups(RecordingRollup.objects.filter(week__kid=kid), 'week_id')
+    by_week = grouped_stats(rows, 'week_id')
+    empty = stats_of([])
+    return {
+        'kid_id': kid.id,
+        'k_id': kid.k_id,
+        'name': kid.name,
+        **stats_of(rows),
+        'weeks': [{'week_id': week['id'], 'week_number': week['week_number'], **by_week.get(week['id'], empty)}
+                  for week in weeks],
+    }
+
+
+def doctor_caseload(doctor):
+    """
+    Review stats of the recordings of a doctor's kids for each kid and
+    across the caseload, overall and by media type, in two queries.
+    """
+    kids = list(doctor.kids.order_by('name').values('id', 'k_id', 'name'))
+    rows = summed_rollups(RecordingRollup.objects.filter(week__kid__doctor=doctor), 'week__kid_id')
+    by_kid = grouped_stats(rows, 'week__kid_id')
+    empty = stats_of([])
+    return {
+        'job_id': doctor.job_id,
+        'full_name': doctor.full_name,
+        **stats_of(rows),
+        'kids': [{'kid_id': kid['id'], 'k_id': kid['k_id'], 'name': kid['name'], **by_kid.get(kid['id'], empty)}
+                 for kid in kids],
+    }
@@ -0,0 +1,209 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+
+from .models import KidVoiceRecording, Media, Week, media_kind
+from .serializers import KidVoiceRecordingSaveSerializer, KidVoiceRecordingUploadSerializer, WeekSerializer
+from .deletions import schedule_file_deletion
+from .uploads import acreate_from_upload, astore_upload, media_fields, replace_week_media
+from .versions import akid_version, aweek_version, not_modified, version_etag, with_etag
+from .views import (
+    doctor_directory, doctor_directory_page, format_response, parse_doctor_directory_params, week_media,
+)
+
+
+def json_response(status_value, message, data=None, status_code=status.HTTP_200_OK):
+    return JsonResponse(format_response(status_value, message, data), status=status_code)
+
+
+async def read_form(request):
+    # Multipart parsing spools uploads to disk; keep it off the event loop
+    return await sync_to_async(lambda: (request.POST, request.FILES), thread_sensitive=False)()
+
+
+class AsyncAPIView(View):
+    """
+    Base class of the natively async API views. Like DRF's APIView they are
+    exempt from CSRF checks.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+
+# 7- Pictures Upload
+class PicturesUploadAsyncView(AsyncAPIView):
+    async def post(self, request, week_id):
+        _, files = await read_form(request)
+        pictures = files.getlist('file')
+
+        if len(pictures) != 4 or not all([media_kind(file.name) == 'picture' for file in pictures]):
+            return json_response(False, "You must upload exactly 4 pictures.", status_code=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            week = await Week.objects.aget(id=week_id)
+        except Week.DoesNotExist:
+            return json_response(False, "Week with id not found.", status_code=status.HTTP_404_NOT_FOUND)
+
+        # The four pictures are written to storage concurrently, before the week's current media is replaced
+        upload_to = Media._meta.get_field('file').upload_to
+        results = await asyncio.gather(*[astore_upload(picture, upload_to, request) for picture in pictures],
+                                       return_exceptions=True)
+        stored = [result for result in results if not isinstance(result, BaseException)]
+        if len(stored) != len(results):
+            await sync_to_async(schedule_file_deletion)([upload.name for upload in stored])
+            raise next(result for result in results if isinstance(result, BaseException))
+        await sync_to_async(replace_week_media)(week, [media_fields(upload, 'picture') for upload in stored])
+
+        return json_response(True, "Pictures uploaded successfully.", {"urls": [upload.url for upload in stored]})
+
+
+# 8- Video Upload
+class VideoUploadAsyncView(AsyncAPIView):
+    async def post(self, request, week_id):
+        _, files = await read_form(request)
+        video = files.get('file')
+
+        if not video or media_kind(video.name) != 'video':
+            return json_response(False, "You must upload exactly 1 video file.", status_code=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            week = await Week.objects.aget(id=week_id)
+        except Week.DoesNotExist:
+            return json_response(False, "Week with id not found.", status_code=status.HTTP_404_NOT_FOUND)
+
+        stored = await astore_upload(video, Media._meta.get_field('file').upload_to, request)
+        media, = await sync_to_async(replace_week_media)(week, [media_fields(stored, 'video')])
+
+        return json_response(True, "Video uploaded successfully.", {"url": media.url})
+
+
+# 9- Kid uploads voice recordings for pictures and video
+class KidVoiceRecordingUploadAsyncView(AsyncAPIView):
+    async def post(self, request):
+        data, files = await read_form(request)
+        serializer = KidVoiceRecordingUploadSerializer(data={'file': files.get('file')})
+        if not serializer.is_valid():
+            return json_response(False, "Invalid data.", serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
+
+        media_type = data.get('media_type')
+        if media_type not in ['pictures', 'video']:
+            return json_response(False, "Invalid media_type. Must be 'pictures' or 'video'.",
+                                 status_code=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            week = await Week.objects.aget(id=data.get('week_id'))
+        except (Week.DoesNotExist, ValueError):
+            return json_response(False, "Week with id not found.", status_code=status.HTTP_404_NOT_FOUND)
+
+        voice_recording = await acreate_from_upload(KidVoiceRecording, serializer.validated_data['file'], request,
+                                                    week=week, feedback_state=False, media_type=media_type)
+
+        return json_response(True, "Voice recording uploaded successfully.", {'url': voice_recording.url})
+
+
+# 6- List all weeks for a specific kid
+class KidWeekListAsyncView(AsyncAPIView):
+    async def get(self, request, kid_id):
+        etag = version_etag('kid-week-list', kid_id, await akid_version(kid_id))
+        cached_response = not_modified(request, etag)
+        if cached_response is not None:
+            return cached_response
+
+        weeks = [week async for week in Week.objects.filter(kid_id=kid_id)]
+        response = json_response(True, "Weeks fetched successfully.", WeekSerializer(weeks, many=True).data)
+        return with_etag(response, etag) if etag else response
+
+
+# 12- Doctor gets voice records uploaded by the kid using week_id
+class DoctorVoiceRecordsListAsyncView(AsyncAPIView):
+    async def get(self, request, week_id):
+        version = await aweek_version(week_id)
+        if version is None:
+            return json_response(False, "Week with id not found.", status_code=status.HTTP_404_NOT_FOUND)
+        etag = version_etag('doctor-voice-records', week_id, version)
+        cached_response = not_modified(request, etag)
+        if cached_response is not None:
+            return cached_response
+
+        voice_records = [record async for record in KidVoiceRecording.objects.filter(week_id=week_id)]
+        if not voice_records:
+            return json_response(False, "No voice recordings found for this week.", status_code=status.HTTP_404_NOT_FOUND)
+
+        serializer = KidVoiceRecordingSaveSerializer(voice_records, many=True, context={'request': request})
+        return with_etag(json_response(True, "Voice records fetched successfully.", serializer.data), etag)
+
+
+# 13- Kid gets pictures and video for the week using week_id
+class KidMediaListAsyncView(AsyncAPIView):
+    async def get(self, request, week_id):
+        version = await aweek_version(week_id)
+        if version is None:
+            return json_response(False, "Week with id not found.", status_code=status.HTTP_404_NOT_FOUND)
+        etag = version_etag('kid-media-list', week_id, version)
+        cached_response = not_modified(request, etag)
+        if cached_response is not None:
+            return cached_response
+
+        summary, pictures, video = await sync_to_async(week_media)(week_id)
+        if summary is None:
+            return json_response(False, "Week with id not found.", status_code=status.HTTP_404_NOT_FOUND)
+        if not summary.picture_count and not summary.video_count:
+            return json_response(False, "No media found for this week.", status_code=status.HTTP_404_NOT_FOUND)
+
+        if summary.media_complete:
+            return with_etag(json_response(True, "Media files fetched successfully.",
+                                           {"pictures": pictures, "video": video[0]}), etag)
+        return json_response(False, "The week must contain exactly 4 pictures and 1 video.",
+                             status_code=status.HTTP_400_BAD_REQUEST)
+
+
+# 14- List all doctors for kid registration
+class DoctorListAsyncView(AsyncAPIView):
+    async def get(self, request):
+        try:
+            q, fields, export = parse_doctor_directory_params(request.GET)
+        except ValueError as error:
+            return json_response(False, str(error), status_code=status.HTTP_400_BAD_REQUEST)
+
+        if export:
+            return StreamingHttpResponse(self.rows(q, fields), content_type='application/x-ndjson')
+
+        try:
+            page = await sync_to_async(doctor_directory_page)(Request(request), q, fields)
+        except NotFound:
+            return json_response(False, "Invalid cursor.", status_code=status.HTTP_400_BAD_REQUEST)
+
+        response = JsonResponse({"status": True, "message": "Doctors fetched successfully.", "data": page['data']})
+        for header, value in page['headers'].items():
+            response[header] = value
+        return response
+
+    @staticmethod
+    async def rows(q, fields):
+        rows = doctor_directory(q).values(*fields).aiterator(chunk_size=settings.DOCTOR_EXPORT_CHUNK_SIZE)
+        async for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+# Async replacements, by URL name, used when settings.API_ASYNC_VIEWS is on
+ASYNC_VIEWS = {
+    'pictures-upload': PicturesUploadAsyncView.as_view(),
+    'video-upload': VideoUploadAsyncView.as_view(),
+    'voice-upload': KidVoiceRecordingUploadAsyncView.as_view(),
+    'kid-week-list': KidWeekListAsyncView.as_view(),
+    'doctor-voice-records': DoctorVoiceRecordsListAsyncView.as_view(),
+    'kid-media-list': KidMediaListAsyncView.as_view(),
+    'doctor-list': DoctorListAsyncView.as_view(),
+}
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend tuned for concurrent writers.
+
+    Every new connection gets ``settings.SQLITE_PRAGMAS``, and transactions
+    start with ``BEGIN IMMEDIATE``. A deferred transaction that reads before
+    it writes cannot upgrade its lock while another writer is active and
+    fails at once with "database is locked"; taking the write lock up front
+    makes it wait for the busy timeout instead.
+
+    The price is that every ``atomic()`` block takes the write lock, even
+    one that only reads (the admin's change forms, for instance), so such
+    blocks queue behind writers. The API's own transactions all write, and
+    the up-front lock is also what serializes their ``select_for_update()``
+    sections, which SQLite otherwise ignores.
+    """
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
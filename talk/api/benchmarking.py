@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+
+from .models import Doctor, Kid, KidVoiceRecording, Media, Week
+from .summaries import rebuild_week_summaries
+
+
+@contextmanager
+def benchmark_environment(on_disk=False):
+    """
+    Run a benchmark against a throwaway test database and media directory
+    so the development database and MEDIA_ROOT are never touched. With
+    ``on_disk`` a SQLite test database is a file rather than in memory, so
+    journaling and locking behave as in production.
+    """
+    media_root = tempfile.mkdtemp(prefix='talk-bench-media-')
+    if on_disk and connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(media_root, 'benchmark.sqlite3')
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(MEDIA_ROOT=media_root):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def seed_sample_week():
+    """
+    Create one doctor and kid whose first week has 4 pictures, a video and
+    two voice recordings. Returns the week.
+    """
+    doctor = Doctor.objects.create(job_id=1, phone=1, email='bench@example.com', dob='1980-01-01', full_name='Dr. Bench')
+    kid = Kid.objects.create(k_id=1, name='Bench Kid', dob='2015-01-01', phone=2, age=9, doctor=doctor)
+    week = Week.objects.filter(kid=kid).order_by('week_number').first()
+    for index in range(4):
+        Media.objects.create(week=week, url=f'https://example.com/media/picture{index}.jpg')
+    Media.objects.create(week=week, url='https://example.com/media/video.mp4')
+    for media_type in ('pictures', 'video'):
+        KidVoiceRecording.objects.create(week=week, url=f'https://example.com/voice/{media_type}.mp3', media_type=media_type)
+    rebuild_week_summaries([week.id])
+    return week
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(latencies, elapsed):
+    """
+    Throughput and latency percentiles (milliseconds) of a benchmark run.
+    """
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 4),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+class ClientTarget:
+    """
+    Sends benchmark requests through the Django test client, in process,
+    counting the queries each request runs.
+    """
+
+    def __init__(self):
+        self.client = Client()
+
+    def send(self, method, path, data=None, encoding=None):
+        kwargs = {'content_type': 'application/json'} if encoding == 'json' else {}
+        request = getattr(self.client, method.lower())
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = request(path, data, **kwargs) if data is not None else request(path)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - started
+        return response.status_code, len(content), elapsed, len(queries)
+
+
+class HttpTarget:
+    """
+    Sends benchmark requests to a running server at ``base_url``. Query
+    counts are not visible from outside the server and are reported as None.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, method, path, data=None, encoding=None):
+        headers = {}
+        body = None
+        if encoding == 'json':
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = encode_multipart(BOUNDARY, data)
+            headers['Content-Type'] = MULTIPART_CONTENT
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as error:
+            status, content = error.code, error.read()
+        return status, len(content), time.perf_counter() - started, None
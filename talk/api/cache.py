@@ -0,0 +1,78 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+DOCTOR_LIST_VERSION_KEY = 'api:doctor-list:version'
+
+_stats_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def doctor_profile_key(job_id):
+    return f'api:doctor:{job_id}'
+
+
+def kid_profile_key(k_id):
+    return f'api:kid:{k_id}'
+
+
+def doctor_list_version():
+    """
+    Current generation of the doctor directory pages. A missing version is
+    replaced by a fresh timestamp, so evicting it can never revive old pages.
+    """
+    cache = get_cache()
+    version = cache.get(DOCTOR_LIST_VERSION_KEY)
+    if version is None:
+        cache.add(DOCTOR_LIST_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(DOCTOR_LIST_VERSION_KEY)
+    return version
+
+
+def doctor_list_key(*params):
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()
+    return f'api:doctor-list:{doctor_list_version()}:{digest}'
+
+
+def invalidate_doctor_list():
+    # Pages are keyed by query parameters; moving to a new version drops them all at once
+    get_cache().set(DOCTOR_LIST_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def cached(key, family, build):
+    """
+    Return the cached value of ``key``, building and storing it on a miss.
+    ``None`` results (unknown doctor or kid) are not cached.
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    with _stats_lock:
+        if value is None:
+            _misses[family] += 1
+        else:
+            _hits[family] += 1
+    if value is None:
+        value = build()
+        if value is not None:
+            cache.set(key, value)
+    return value
+
+
+def invalidate(*keys):
+    get_cache().delete_many(keys)
+
+
+def cache_stats():
+    with _stats_lock:
+        families = sorted(set(_hits) | set(_misses))
+        return {family: {'hits': _hits[family], 'misses': _misses[family]} for family in families}
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+
+from .models import KidVoiceRecording, Media, PendingFileDeletion
+
+
+# Every field holding a stored file name, as (model, field)
+STORED_FILE_FIELDS = [
+    (Media, 'file'),
+    (Media, 'preview'),
+    (KidVoiceRecording, 'file'),
+    (KidVoiceRecording, 'normalized_file'),
+]
+
+
+def referenced_names(names):
+    """
+    Return the subset of the stored file ``names`` still used by a row.
+    """
+    names = [name for name in names if name]
+    referenced = set()
+    for model, field in STORED_FILE_FIELDS:
+        referenced.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    return referenced
+
+
+def schedule_file_deletion(names):
+    """
+    Queue the stored files ``names`` for deletion once the grace period is
+    over. Call it inside the transaction that stops referencing them, so the
+    queue entry and the row change are committed (or lost) together.
+    """
+    PendingFileDeletion.objects.bulk_create(
+        [PendingFileDeletion(name=name) for name in set(names) if name], ignore_conflicts=True
+    )
+
+
+def sweep_file_deletions(limit=100):
+    """
+    Delete up to ``limit`` due files from storage and drop their queue entries.
+    Files referenced again are left alone; failed deletions are retried
+    later. Deleting a file twice is harmless, so several sweepers may run.
+    Returns ``(deleted, failed)``.
+    """
+    now = timezone.now()
+    due = list(PendingFileDeletion.objects.filter(delete_after__lte=now).order_by('delete_after')[:limit])
+    in_use = referenced_names([pending.name for pending in due])
+
+    done = []
+    failed = 0
+    for pending in due:
+        if pending.name not in in_use:
+            try:
+                default_storage.delete(pending.name)
+            except Exception as error:
+                delay = settings.FILE_DELETION_RETRY_DELAY * 2 ** min(pending.attempts, 6)
+                PendingFileDeletion.objects.filter(pk=pending.pk).update(
+                    attempts=F('attempts') + 1, last_error=str(error) or repr(error),
+                    delete_after=now + timedelta(seconds=delay)
+                )
+                failed += 1
+                continue
+        done.append(pending.pk)
+
+    PendingFileDeletion.objects.filter(pk__in=done).delete()
+    return len(done), failed
@@ -0,0 +1,243 @@
+import os
+import posixpath
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .deletions import schedule_file_deletion
+from .models import DerivativeJob, KidVoiceRecording, Media
+from .versions import bump_week_versions
+
+
+class DerivativeUnavailable(Exception):
+    """
+    Raised when a derivative cannot be built at all (missing tool or an
+    unsupported file), so the job is failed without being retried.
+    """
+
+
+def derivative_kind_for(instance):
+    if isinstance(instance, KidVoiceRecording):
+        return 'audio'
+    return {'picture': 'thumbnail', 'video': 'poster'}.get(instance.kind)
+
+
+def enqueue_derivative_job(instance):
+    """
+    Queue the derivative job for a freshly created Media or KidVoiceRecording
+    row that has a stored file and mark the row as pending.
+    """
+    if not instance.file:
+        return None
+    kind = derivative_kind_for(instance)
+    if kind is None:
+        return None
+
+    target = 'voice_recording' if isinstance(instance, KidVoiceRecording) else 'media'
+    job = DerivativeJob.objects.create(kind=kind, **{target: instance})
+    type(instance).objects.filter(pk=instance.pk).update(derivative_state='pending')
+    instance.derivative_state = 'pending'
+    return job
+
+
+def fail_exhausted_jobs(timed_out):
+    """
+    Fail the ``timed_out`` running jobs that already used their last attempt,
+    such as a file that kills its worker, instead of reclaiming them forever.
+    """
+    exhausted = DerivativeJob.objects.filter(timed_out, attempts__gte=settings.DERIVATIVE_JOB_MAX_ATTEMPTS)
+    ids = list(exhausted.values_list('id', flat=True))
+    if not ids:
+        return
+    exhausted.filter(id__in=ids).update(status='failed', locked_by='',
+                                        last_error="The worker timed out on the last attempt.")
+    failed = {'derivative_jobs__id__in': ids, 'derivative_jobs__status': 'failed'}
+    Media.objects.filter(**failed).update(derivative_state='failed')
+    KidVoiceRecording.objects.filter(**failed).update(derivative_state='failed')
+
+
+def claim_jobs(limit):
+    """
+    Atomically claim up to ``limit`` due jobs, including running jobs whose
+    worker timed out while they have attempts left. Safe to call from
+    several worker processes at once.
+    """
+    now = timezone.now()
+    timed_out = Q(status='running', locked_at__lt=now - timedelta(seconds=settings.DERIVATIVE_JOB_TIMEOUT))
+    fail_exhausted_jobs(timed_out)
+    due = (Q(status='pending', run_after__lte=now) |
+           (timed_out & Q(attempts__lt=settings.DERIVATIVE_JOB_MAX_ATTEMPTS)))
+    ids = list(DerivativeJob.objects.filter(due).order_by('run_after').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    DerivativeJob.objects.filter(due, id__in=ids).update(
+        status='running', locked_by=token, locked_at=now, attempts=F('attempts') + 1
+    )
+    jobs = list(DerivativeJob.objects.filter(locked_by=token, status='running')
+                .select_related('media', 'voice_recording'))
+    Media.objects.filter(derivative_jobs__in=jobs).update(derivative_state='processing')
+    KidVoiceRecording.objects.filter(derivative_jobs__in=jobs).update(derivative_state='processing')
+    return jobs
+
+
+def complete_job(job, derivative_name, fields=None):
+    field = 'normalized_file' if job.kind == 'audio' else 'preview'
+    updated = type(job.target).objects.filter(pk=job.target.pk).update(
+        **{field: derivative_name, 'derivative_state': 'ready'}, **(fields or {})
+    )
+    if not updated:
+        # The media or recording was deleted (e.g. replaced) while the job ran, taking the job with it
+        schedule_file_deletion([derivative_name])
+        return
+    DerivativeJob.objects.filter(pk=job.pk).update(status='done', locked_by='', last_error='')
+    if job.kind == 'audio':
+        # The normalized file and waveform are part of the week's voice record list
+        bump_week_versions([job.target.week_id])
+
+
+def fail_job(job, error, retryable=True):
+    if retryable and job.attempts < settings.DERIVATIVE_JOB_MAX_ATTEMPTS:
+        delay = settings.DERIVATIVE_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        DerivativeJob.objects.filter(pk=job.pk).update(
+            status='pending', locked_by='', last_error=error, run_after=timezone.now() + timedelta(seconds=delay)
+        )
+        state = 'pending'
+    else:
+        DerivativeJob.objects.filter(pk=job.pk).update(status='failed', locked_by='', last_error=error)
+        state = 'failed'
+    type(job.target).objects.filter(pk=job.target.pk).update(derivative_state=state)
+
+
+@contextmanager
+def local_copy(name):
+    """
+    Yield a local filesystem path for the stored file ``name``, downloading
+    it to a temporary file when the storage is not local.
+    """
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        yield path
+        return
+
+    suffix = posixpath.splitext(name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as local:
+        with default_storage.open(name, 'rb') as source:
+            shutil.copyfileobj(source, local)
+        local.flush()
+        yield local.name
+
+
+def run_ffmpeg(arguments):
+    binary = shutil.which(settings.FFMPEG_BINARY)
+    if binary is None:
+        raise DerivativeUnavailable(f"{settings.FFMPEG_BINARY} is not installed.")
+    result = subprocess.run([binary, '-y', '-v', 'error'] + arguments, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors='replace').strip() or f"ffmpeg exited with {result.returncode}")
+    return result.stdout
+
+
+def make_thumbnail(source, destination):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise DerivativeUnavailable("Pillow is not installed.")
+
+    with Image.open(source) as image:
+        image.thumbnail(settings.DERIVATIVE_THUMBNAIL_SIZE)
+        image.convert('RGB').save(destination, 'JPEG', quality=85)
+
+
+def make_poster(source, destination):
+    width = settings.DERIVATIVE_THUMBNAIL_SIZE[0]
+    run_ffmpeg(['-i', source, '-vf', f"thumbnail,scale='min({width},iw)':-2", '-frames:v', '1', destination])
+
+
+def waveform_peaks(pcm, points):
+    """
+    Reduce mono signed 16-bit little-endian ``pcm`` to at most ``points``
+    peak amplitudes between 0 and 1, one per equal slice of the recording.
+    Vectorized with NumPy when it is installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    if numpy is not None:
+        samples = numpy.abs(numpy.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype='<i2').astype(numpy.int32))
+        if not samples.size:
+            return []
+        width = -(-samples.size // min(points, samples.size))
+        # The last slice is padded with silence, as the pure Python path leaves it short
+        points = -(-samples.size // width)
+        padded = numpy.zeros(width * points, dtype=numpy.int32)
+        padded[:samples.size] = samples
+        peaks = padded.reshape(points, width).max(axis=1) / 32768
+        return [round(float(peak), 3) for peak in peaks]
+
+    samples = array('h', pcm[:len(pcm) - len(pcm) % 2])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    if not samples:
+        return []
+    width = -(-len(samples) // min(points, len(samples)))
+    return [round(max(map(abs, samples[start:start + width])) / 32768, 3) for start in range(0, len(samples), width)]
+
+
+def make_normalized_audio(source, destination):
+    """
+    Transcode a voice recording to a small mono file with the configured
+    codec and bitrate, and compute its waveform from a low-rate decode.
+    """
+    run_ffmpeg(['-i', source, '-vn', '-af', 'loudnorm', '-ac', '1', '-c:a', settings.VOICE_TRANSCODE_CODEC,
+                '-b:a', settings.VOICE_TRANSCODE_BITRATE, destination])
+    rate = settings.VOICE_WAVEFORM_SAMPLE_RATE
+    pcm = run_ffmpeg(['-i', source, '-vn', '-ac', '1', '-ar', str(rate), '-f', 's16le', '-'])
+    return {'waveform': {'duration': round(len(pcm) / 2 / rate, 2),
+                         'peaks': waveform_peaks(pcm, settings.VOICE_WAVEFORM_POINTS)}}
+
+
+# Container extension of the normalized audio per VOICE_TRANSCODE_CODEC
+VOICE_TRANSCODE_EXTENSIONS = {'aac': '.m4a', 'libopus': '.ogg', 'libmp3lame': '.mp3'}
+
+DERIVATIVE_BUILDERS = {
+    'thumbnail': (make_thumbnail, 'previews/', '.jpg'),
+    'poster': (make_poster, 'previews/', '.jpg'),
+    'audio': (make_normalized_audio, 'voice/normalized/', None),
+}
+
+
+def build_derivative(kind, source_name):
+    """
+    Build the ``kind`` derivative of the stored file ``source_name`` and save
+    it to storage. Returns the stored name and the extra row fields the
+    builder computed (e.g. the waveform), or None. Runs inside worker
+    processes and never touches the database.
+    """
+    builder, upload_to, extension = DERIVATIVE_BUILDERS[kind]
+    extension = extension or VOICE_TRANSCODE_EXTENSIONS.get(settings.VOICE_TRANSCODE_CODEC, '.m4a')
+    stem = posixpath.splitext(posixpath.basename(source_name))[0]
+
+    with local_copy(source_name) as source, tempfile.TemporaryDirectory() as workdir:
+        destination = os.path.join(workdir, stem + extension)
+        fields = builder(source, destination)
+        with open(destination, 'rb') as derivative:
+            name = default_storage.generate_filename(posixpath.join(upload_to, stem + extension))
+            return default_storage.save(name, File(derivative, name=name)), fields
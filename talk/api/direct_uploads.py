@@ -0,0 +1,103 @@
+import mimetypes
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .deletions import schedule_file_deletion
+from .models import DirectUpload, KidVoiceRecording, Media
+from .uploads import absolute_media_url, replace_week_media
+
+
+def direct_uploads_supported():
+    # Only object storages can hand out upload URLs; see api.storage.S3MediaStorage
+    return hasattr(default_storage, 'presigned_put') and hasattr(default_storage, 'head')
+
+
+def direct_upload_name(target, filename):
+    model = KidVoiceRecording if target == 'voice' else Media
+    upload_to = model._meta.get_field('file').upload_to
+    # A unique prefix per file, since object stores cannot pick a free name at PUT time
+    return default_storage.generate_filename(posixpath.join(upload_to, uuid.uuid4().hex, posixpath.basename(filename)))
+
+
+def create_direct_uploads(week, target, media_type, files):
+    """
+    Reserve a storage name for each of ``files`` and return the batch id and
+    the upload targets, each with its presigned PUT URL.
+    """
+    batch = uuid.uuid4()
+    uploads = [
+        DirectUpload(
+            batch=batch, week=week, target=target, media_type=media_type or '',
+            name=direct_upload_name(target, file['filename']), size=file['size'],
+            content_type=file.get('content_type') or mimetypes.guess_type(file['filename'])[0] or 'application/octet-stream',
+        )
+        for file in files
+    ]
+    DirectUpload.objects.bulk_create(uploads)
+
+    targets = [
+        {
+            'id': upload.id,
+            'filename': file['filename'],
+            'name': upload.name,
+            'method': 'PUT',
+            'url': default_storage.presigned_put(upload.name, upload.content_type, settings.DIRECT_UPLOAD_EXPIRY),
+            'headers': {'Content-Type': upload.content_type},
+        }
+        for upload, file in zip(uploads, files)
+    ]
+    return batch, targets
+
+
+def complete_direct_uploads(batch, request=None):
+    """
+    Check with a HEAD request that every file of ``batch`` is in storage with
+    the announced size, then create the week media (replacing the current
+    set) or the voice recording. Returns ``(created, problems)`` where
+    problems maps upload ids to what is wrong; ``created`` is None when the
+    batch does not exist, expired or was already completed.
+    """
+    uploads = list(DirectUpload.objects.active().filter(batch=batch).select_related('week').order_by('created_at'))
+    if not uploads:
+        return None, {}
+
+    problems = {}
+    for upload in uploads:
+        stored = default_storage.head(upload.name)
+        if stored is None:
+            problems[str(upload.id)] = "File has not been uploaded."
+        elif stored['size'] != upload.size:
+            problems[str(upload.id)] = f"Uploaded {stored['size']} bytes instead of {upload.size}."
+    if problems:
+        return [], problems
+
+    first = uploads[0]
+    fields = [{'file': upload.name, 'url': absolute_media_url(request, upload.name), 'size': upload.size}
+              for upload in uploads]
+    with transaction.atomic():
+        # Only one of concurrent completions of the batch gets to create the rows
+        if not DirectUpload.objects.filter(batch=batch).delete()[0]:
+            return None, {}
+        if first.target == 'voice':
+            created = [KidVoiceRecording.objects.create(week=first.week, feedback_state=False,
+                                                        media_type=first.media_type, **fields[0])]
+        else:
+            kind = 'picture' if first.target == 'pictures' else 'video'
+            created = replace_week_media(first.week, [dict(item, kind=kind) for item in fields])
+    return created, {}
+
+
+def purge_expired_direct_uploads(limit=100):
+    """
+    Delete up to ``limit`` expired upload targets, queueing whatever the
+    client may have uploaded for deletion.
+    """
+    expired = list(DirectUpload.objects.expired().values_list('id', 'name')[:limit])
+    with transaction.atomic():
+        schedule_file_deletion([name for _, name in expired])
+        DirectUpload.objects.filter(id__in=[upload_id for upload_id, _ in expired]).delete()
+    return len(expired)
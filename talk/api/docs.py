@@ -0,0 +1,94 @@
+from django.conf import settings
+
+# View methods decorated while the docs are enabled, whose arguments are resolved
+# against drf_yasg by apply_view_schemas()
+_decorated = []
+
+
+class _Deferred:
+    """
+    Stands in for ``drf_yasg.openapi``: attribute access and calls are only
+    recorded, so the arguments of the view decorators cost nothing and never
+    import drf_yasg. ``resolve`` replays them when a schema is built.
+    """
+
+    def __init__(self, parent=None, name=None, args=(), kwargs=None):
+        self._parent, self._name, self._args, self._kwargs = parent, name, args, kwargs
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return _Deferred(self, name)
+
+    def __call__(self, *args, **kwargs):
+        return _Deferred(self, args=args, kwargs=kwargs)
+
+
+def resolve(value):
+    """
+    ``value`` with the deferred ``openapi`` objects it contains built.
+    """
+    if isinstance(value, _Deferred):
+        if value._parent is None:
+            from drf_yasg import openapi as real_openapi
+            return real_openapi
+        target = resolve(value._parent)
+        if value._kwargs is None:
+            return getattr(target, value._name)
+        return target(*resolve(value._args), **resolve(value._kwargs))
+    if isinstance(value, (list, tuple)):
+        return type(value)(resolve(item) for item in value)
+    if isinstance(value, dict):
+        return {key: resolve(item) for key, item in value.items()}
+    return value
+
+
+openapi = _Deferred()
+
+
+def swagger_auto_schema(**kwargs):
+    """
+    Record the drf_yasg ``swagger_auto_schema`` arguments of a view method;
+    a no-op when the docs are disabled.
+    """
+    def decorator(view_method):
+        if settings.API_DOCS_ENABLED:
+            _decorated.append((view_method, kwargs))
+        return view_method
+    return decorator
+
+
+def apply_view_schemas():
+    """
+    Apply drf_yasg's ``swagger_auto_schema`` to the recorded view methods,
+    before the API is introspected. The URLconf is loaded first so every
+    view module has been imported and recorded its methods.
+    """
+    from django.urls import get_resolver
+    from drf_yasg.utils import swagger_auto_schema as drf_yasg_swagger_auto_schema
+
+    get_resolver().url_patterns
+    while _decorated:
+        view_method, kwargs = _decorated.pop()
+        drf_yasg_swagger_auto_schema(**resolve(kwargs))(view_method)
+
+
+def ui_view(renderer):
+    """
+    View serving the ``renderer`` ('swagger' or 'redoc') docs page. The
+    drf_yasg schema view is only built on the first request; without the
+    spec renderers, ``?format=openapi`` cannot introspect the API.
+    """
+    view = None
+
+    def docs_page(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            from drf_yasg.views import UI_RENDERERS, get_schema_view
+
+            from .schema import api_info
+            view = get_schema_view(api_info(), public=True).as_view(renderer_classes=UI_RENDERERS[renderer])
+        return view(request, *args, **kwargs)
+
+    docs_page.csrf_exempt = True
+    return docs_page
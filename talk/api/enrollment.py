@@ -0,0 +1,79 @@
+import csv
+import io
+from collections import Counter
+
+from django.db import transaction
+
+from .models import Doctor, Kid, Week, WeekSummary
+from .serializers import KidEnrollmentSerializer
+
+
+def read_kids_csv(file):
+    """
+    Read enrollment rows from a binary CSV file (or upload) whose header row
+    names the kid fields.
+    """
+    text = io.TextIOWrapper(getattr(file, 'file', file), encoding='utf-8-sig', newline='')
+    try:
+        return [dict(row) for row in csv.DictReader(text)]
+    finally:
+        text.detach()
+
+
+def format_errors(errors):
+    return [{'index': index, 'errors': field_errors} for index, field_errors in sorted(errors.items())]
+
+
+def validate_kids(rows):
+    """
+    Validate every row and check uniqueness and doctors for the whole batch
+    with one query per field. Returns ``(valid_data, errors)`` where errors
+    maps the row index to its field errors.
+    """
+    errors = {}
+    valid = {}
+    for index, row in enumerate(rows):
+        serializer = KidEnrollmentSerializer(data=row)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            errors[index] = serializer.errors
+
+    for field in ('k_id', 'phone'):
+        counts = Counter(data[field] for data in valid.values())
+        taken = set(Kid.objects.filter(**{f'{field}__in': list(counts)}).values_list(field, flat=True))
+        for index, data in valid.items():
+            if data[field] in taken:
+                errors.setdefault(index, {})[field] = [f"A kid with this {field} already exists."]
+            elif counts[data[field]] > 1:
+                errors.setdefault(index, {})[field] = [f"This {field} appears more than once in the batch."]
+
+    doctor_ids = {data['doctor'] for data in valid.values()}
+    known_doctors = set(Doctor.objects.filter(id__in=doctor_ids).values_list('id', flat=True))
+    for index, data in valid.items():
+        if data['doctor'] not in known_doctors:
+            errors.setdefault(index, {})['doctor'] = [f"Invalid pk \"{data['doctor']}\" - object does not exist."]
+
+    return [data for index, data in sorted(valid.items()) if index not in errors], errors
+
+
+def enroll_kids(rows):
+    """
+    Validate ``rows`` together and, when every row is valid, insert the kids
+    and their weeks with two bulk inserts in one transaction. Returns
+    ``(kids, errors)``; nothing is inserted when ``errors`` is not empty.
+    """
+    valid, errors = validate_kids(rows)
+    if errors or not valid:
+        return [], errors
+
+    kids = [Kid(doctor_id=data.pop('doctor'), **data) for data in valid]
+    with transaction.atomic():
+        Kid.objects.bulk_create(kids)
+        if any(kid.pk is None for kid in kids):
+            # Backends that cannot return primary keys from bulk inserts
+            ids = dict(Kid.objects.filter(k_id__in=[kid.k_id for kid in kids]).values_list('k_id', 'id'))
+            for kid in kids:
+                kid.pk = ids[kid.k_id]
+        WeekSummary.create_for(Week.objects.bulk_create([week for kid in kids for week in Week.initial_weeks(kid)]))
+    return kids, errors
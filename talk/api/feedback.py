@@ -0,0 +1,77 @@
+from collections import Counter
+
+from django.db import transaction
+
+from .models import Feedback, KidVoiceRecording
+from .serializers import FeedbackItemSerializer
+from .summaries import record_feedback
+
+
+ALREADY_REVIEWED = "Feedback has already been provided for this voice recording."
+
+
+def validate_feedback(items):
+    """
+    Validate every item and look all the recordings up with one query.
+    Returns ``(accepted, errors, conflicts)``: accepted maps the item index to
+    its validated data, errors to its field errors and conflicts to the
+    already reviewed message.
+    """
+    errors = {}
+    valid = {}
+    for index, item in enumerate(items):
+        serializer = FeedbackItemSerializer(data=item)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            errors[index] = serializer.errors
+
+    counts = Counter(data['voice_id'] for data in valid.values())
+    recordings = KidVoiceRecording.objects.only('id', 'feedback_state').in_bulk(list(counts))
+    conflicts = {}
+    for index, data in valid.items():
+        recording = recordings.get(data['voice_id'])
+        if counts[data['voice_id']] > 1:
+            errors[index] = {'voice_id': ["This voice_id appears more than once in the batch."]}
+        elif recording is None:
+            errors[index] = {'voice_id': ["Voice recording not found."]}
+        elif recording.feedback_state:
+            conflicts[index] = ALREADY_REVIEWED
+
+    accepted = {index: data for index, data in valid.items() if index not in errors and index not in conflicts}
+    return accepted, errors, conflicts
+
+
+def create_feedback_batch(items):
+    """
+    Give feedback on many recordings at once. Invalid items reject the whole
+    batch; recordings that already have feedback are reported as conflicts
+    and skipped. The feedback rows are inserted with one bulk insert and the
+    recordings flagged with one update, in a single transaction that also
+    updates the week summaries.
+    Returns ``(feedback, errors, conflicts)``.
+    """
+    accepted, errors, conflicts = validate_feedback(items)
+    if errors or not accepted:
+        return [], errors, conflicts
+
+    ids = [data['voice_id'] for data in accepted.values()]
+    with transaction.atomic():
+        # Re-check under the row locks so a concurrent review is reported, not overwritten
+        open_ids = set(KidVoiceRecording.objects.select_for_update()
+                       .filter(id__in=ids, feedback_state=False).values_list('id', flat=True))
+        open_ids -= set(Feedback.objects.filter(voice_recording_id__in=open_ids).values_list('voice_recording_id', flat=True))
+        feedback = [Feedback(voice_recording_id=data['voice_id'], stars=data['stars'], note=data['note'])
+                    for index, data in sorted(accepted.items()) if data['voice_id'] in open_ids]
+        Feedback.objects.bulk_create(feedback)
+        KidVoiceRecording.objects.filter(id__in=open_ids).update(feedback_state=True)
+        record_feedback(feedback)
+
+    for index, data in accepted.items():
+        if data['voice_id'] not in open_ids:
+            conflicts[index] = ALREADY_REVIEWED
+    return feedback, errors, conflicts
+
+
+def format_conflicts(conflicts):
+    return [{'index': index, 'message': message} for index, message in sorted(conflicts.items())]
@@ -0,0 +1,268 @@
+import json
+import statistics
+import subprocess
+import uuid
+from collections import Counter
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from api.benchmarking import ClientTarget, HttpTarget, benchmark_environment, summarize
+from api.models import Doctor, Kid, KidVoiceRecording, Media, UploadSession, Week
+from api.seeding import generate_dataset, next_value
+from api.uploads import create_from_upload, media_fields, replace_week_media, store_uploads, write_upload_chunk
+
+FEEDBACK_BATCH_SIZE = 10
+KIDS_PER_BULK_REGISTER = 10
+PICTURE_BYTES = b'\xff' * 64 * 1024
+VIDEO_BYTES = b'\x00' * 512 * 1024
+VOICE_BYTES = b'\x00' * 32 * 1024
+# POST routes that only read, kept by --read-only
+READING_POSTS = {'doctor-login', 'kid-login', 'doctor-kids-list'}
+
+
+class Context:
+    """
+    Ids the routes are called with: a sample doctor, kid and weeks from the
+    dataset, stored files to serve, and pools consumed by one-shot writes.
+    """
+
+    def __init__(self, requests):
+        self.doctor = Doctor.objects.filter(kids__isnull=False).order_by('id').first()
+        if self.doctor is None:
+            raise CommandError("The database has no doctor with kids; run `manage.py seed_data` first.")
+        self.kid = self.doctor.kids.order_by('id').first()
+        weeks = list(Week.objects.filter(kid=self.kid).order_by('week_number'))
+        # Reads use the first week, whose seeded media is swapped for stored files; uploads go to the second
+        self.week, self.upload_week = weeks[0], weeks[1]
+
+        uploads = [SimpleUploadedFile(f'benchmark{index}.jpg', PICTURE_BYTES) for index in range(4)]
+        uploads.append(SimpleUploadedFile('benchmark.mp4', VIDEO_BYTES))
+        stored = store_uploads(uploads, Media._meta.get_field('file').upload_to)
+        self.media = replace_week_media(self.week, [media_fields(upload) for upload in stored])[0]
+        self.voice = create_from_upload(KidVoiceRecording, SimpleUploadedFile('benchmark.mp3', VOICE_BYTES),
+                                        week=self.week, feedback_state=True, media_type='pictures')
+
+        unreviewed = KidVoiceRecording.objects.filter(feedback_state=False).exclude(feedback__isnull=False)
+        pool = list(unreviewed.values_list('id', flat=True)[:requests * (FEEDBACK_BATCH_SIZE + 1)])
+        if len(pool) < requests * (FEEDBACK_BATCH_SIZE + 1):
+            raise CommandError("Not enough unreviewed voice recordings for the feedback routes; seed more data.")
+        self.single_feedback = iter(pool[:requests])
+        self.batch_feedback = iter(pool[requests:])
+
+        self.open_session = UploadSession.objects.create(week=self.upload_week, target='video', filename='open.mp4',
+                                                         total_size=len(VIDEO_BYTES))
+        self.complete_sessions = iter([self.complete_session() for _ in range(requests)])
+
+        self.next_job_id, self.next_doctor_phone = next_value(Doctor, 'job_id'), next_value(Doctor, 'phone')
+        self.next_k_id, self.next_kid_phone = next_value(Kid, 'k_id'), next_value(Kid, 'phone')
+
+    def complete_session(self):
+        session = UploadSession.objects.create(week=self.upload_week, target='voice', media_type='video',
+                                               filename='session.mp3', total_size=len(VOICE_BYTES))
+        with SimpleUploadedFile('chunk', VOICE_BYTES) as stream:
+            session.offset = write_upload_chunk(session, stream, 0, len(VOICE_BYTES))
+        return session
+
+    def new_doctor(self):
+        self.next_job_id += 1
+        self.next_doctor_phone += 1
+        return {'job_id': self.next_job_id, 'phone': self.next_doctor_phone, 'email': f'bench{self.next_job_id}@example.com',
+                'dob': '1980-01-01', 'full_name': 'Dr. Benchmark'}
+
+    def new_kid(self):
+        self.next_k_id += 1
+        self.next_kid_phone += 1
+        return {'k_id': self.next_k_id, 'phone': self.next_kid_phone, 'name': 'Benchmark Kid', 'dob': '2016-01-01',
+                'age': 8, 'doctor': self.doctor.id}
+
+
+def routes(ctx):
+    """
+    ``(url name, method, path, body)`` of every API route, where body returns
+    ``(data, encoding)`` for the next request and is None for bodiless ones.
+    """
+    def url(name, *args, query=''):
+        return lambda: reverse(name, args=args) + query
+
+    def json_body(build):
+        return lambda: (build(), 'json')
+
+    def multipart_body(build):
+        return lambda: (build(), 'multipart')
+
+    owner = f'?k_id={ctx.kid.k_id}'
+    return [
+        # Reads
+        ('doctor-list', 'GET', url('doctor-list'), None),
+        ('doctor-login', 'POST', url('doctor-login'), json_body(lambda: {'job_id': ctx.doctor.job_id})),
+        ('kid-login', 'POST', url('kid-login'), json_body(lambda: {'k_id': ctx.kid.k_id})),
+        ('doctor-kids-list', 'POST', url('doctor-kids-list'), json_body(lambda: {'job_id': ctx.doctor.job_id})),
+        ('doctor-dashboard', 'GET', url('doctor-dashboard', ctx.doctor.job_id), None),
+        ('review-queue', 'GET', url('review-queue', ctx.doctor.job_id), None),
+        ('kid-week-list', 'GET', url('kid-week-list', ctx.kid.id), None),
+        ('kid-media-list', 'GET', url('kid-media-list', ctx.week.id), None),
+        ('doctor-voice-records', 'GET', url('doctor-voice-records', ctx.week.id), None),
+        ('kid-feedback-list', 'GET', url('kid-feedback-list', ctx.kid.k_id), None),
+        ('kid-progress', 'GET', url('kid-progress', ctx.kid.id), None),
+        ('doctor-caseload', 'GET', url('doctor-caseload', ctx.doctor.job_id), None),
+        ('cache-stats', 'GET', url('cache-stats'), None),
+        ('media-derivatives', 'GET', url('media-derivatives', ctx.media.id), None),
+        ('voice-derivatives', 'GET', url('voice-derivatives', ctx.voice.id), None),
+        ('media-file', 'GET', url('media-file', ctx.media.id, query=owner), None),
+        ('voice-file', 'GET', url('voice-file', ctx.voice.id, query=owner), None),
+        ('upload-session-detail', 'GET', url('upload-session-detail', ctx.open_session.id), None),
+        # Writes
+        ('doctor-register', 'POST', url('doctor-register'), json_body(ctx.new_doctor)),
+        ('kid-register', 'POST', url('kid-register'), json_body(ctx.new_kid)),
+        ('kid-bulk-register', 'POST', url('kid-bulk-register'),
+         json_body(lambda: [ctx.new_kid() for _ in range(KIDS_PER_BULK_REGISTER)])),
+        ('doctor-profile-edit', 'PUT', url('doctor-profile-edit', ctx.doctor.job_id),
+         json_body(lambda: {'full_name': ctx.doctor.full_name})),
+        ('kid-profile-edit', 'PUT', url('kid-profile-edit', ctx.kid.k_id), json_body(lambda: {'name': ctx.kid.name})),
+        ('review-queue-claim', 'POST', url('review-queue-claim', ctx.doctor.job_id),
+         json_body(lambda: {'reviewer': 'benchmark', 'limit': 5})),
+        ('pictures-upload', 'POST', url('pictures-upload', ctx.upload_week.id),
+         multipart_body(lambda: {'file': [SimpleUploadedFile(f'picture{index}.jpg', PICTURE_BYTES) for index in range(4)]})),
+        ('video-upload', 'POST', url('video-upload', ctx.upload_week.id),
+         multipart_body(lambda: {'file': SimpleUploadedFile('video.mp4', VIDEO_BYTES)})),
+        ('pictures-save', 'POST', url('pictures-save'),
+         multipart_body(lambda: {'week': ctx.upload_week.id,
+                                 'url': [f'https://example.com/picture{index}.jpg' for index in range(4)]})),
+        ('video-save', 'POST', url('video-save'),
+         multipart_body(lambda: {'week': ctx.upload_week.id, 'url': 'https://example.com/video.mp4'})),
+        ('voice-upload', 'POST', url('voice-upload'),
+         multipart_body(lambda: {'file': SimpleUploadedFile('voice.mp3', VOICE_BYTES), 'week_id': ctx.upload_week.id,
+                                 'media_type': 'pictures'})),
+        ('voice-save', 'POST', url('voice-save'),
+         multipart_body(lambda: {'file': SimpleUploadedFile('voice.mp3', VOICE_BYTES), 'week': ctx.upload_week.id,
+                                 'url': 'https://example.com/voice.mp3', 'media_type': 'video'})),
+        ('doctor-feedback-create', 'POST', lambda: reverse('doctor-feedback-create', args=[next(ctx.single_feedback)]),
+         json_body(lambda: {'stars': 4, 'note': 'Benchmark feedback'})),
+        ('doctor-feedback-batch', 'POST', url('doctor-feedback-batch'),
+         json_body(lambda: [{'voice_id': next(ctx.batch_feedback), 'stars': 5, 'note': 'Benchmark feedback'}
+                            for _ in range(FEEDBACK_BATCH_SIZE)])),
+        ('upload-session-create', 'POST', url('upload-session-create'),
+         json_body(lambda: {'week': ctx.upload_week.id, 'target': 'video', 'filename': 'video.mp4',
+                            'total_size': len(VIDEO_BYTES)})),
+        ('upload-session-finalize', 'POST', lambda: reverse('upload-session-finalize', args=[next(ctx.complete_sessions).id]),
+         None),
+        # Only served by object storages; answers 501 on the local filesystem
+        ('direct-upload-create', 'POST', url('direct-upload-create'),
+         json_body(lambda: {'week': ctx.upload_week.id, 'target': 'video',
+                            'files': [{'filename': 'video.mp4', 'size': len(VIDEO_BYTES)}]})),
+        ('direct-upload-complete', 'POST', lambda: reverse('direct-upload-complete', args=[uuid.uuid4()]), None),
+    ]
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = ("Measure latency percentiles, query counts and payload sizes of every API route on a seeded dataset, "
+            "through the test client (default, on a throwaway database) or against a running server.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Requests per route (default: 50).")
+        parser.add_argument('--doctors', type=int, default=20, help="Doctors seeded for the test client run.")
+        parser.add_argument('--kids-per-doctor', type=int, default=25, help="Kids per seeded doctor.")
+        parser.add_argument('--base-url',
+                            help="Benchmark a running server (e.g. http://localhost:8000/api) sharing this project's "
+                                 "database and MEDIA_ROOT, instead of the test client. Seed it with seed_data first.")
+        parser.add_argument('--routes', nargs='+', help="Only benchmark these URL names.")
+        parser.add_argument('--read-only', action='store_true', help="Skip the routes that write.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="Results file of an earlier run to compare p95 latency and query counts with.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Relative p95 increase reported as a regression (default: 0.2).")
+
+    def handle(self, *args, **options):
+        environment = nullcontext() if options['base_url'] else benchmark_environment()
+        with environment:
+            dataset = None
+            if not options['base_url']:
+                dataset = generate_dataset(options['doctors'], options['kids_per_doctor'])
+            target = HttpTarget(options['base_url']) if options['base_url'] else ClientTarget()
+            results = self.run(target, Context(options['requests']), options)
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'created_at': timezone.now().isoformat(),
+                'target': options['base_url'] or 'test-client',
+                'database': settings.DATABASES['default']['ENGINE'],
+                'requests_per_route': options['requests'],
+                'dataset': dataset,
+            },
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+        self.stdout.write(f"{'route':<26}{'status':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'bytes':>10}")
+        for name, row in results.items():
+            statuses = ','.join(sorted(row['status']))
+            queries = '-' if row['queries'] is None else row['queries']
+            self.stdout.write(f"{name:<26}{statuses:<12}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+                              f"{queries:>9}{row['bytes']:>10}")
+
+        if options['compare']:
+            self.compare(results, options['compare'], options['threshold'])
+
+    def run(self, target, ctx, options):
+        results = {}
+        for name, method, path, body in routes(ctx):
+            if options['routes'] and name not in options['routes']:
+                continue
+            if options['read_only'] and method != 'GET' and name not in READING_POSTS:
+                continue
+
+            latencies, sizes, query_counts, statuses = [], [], [], Counter()
+            for _ in range(options['requests']):
+                data, encoding = body() if body else (None, None)
+                status, size, elapsed, queries = target.send(method, path(), data, encoding)
+                if status == 500:
+                    raise CommandError(f"{name} answered {status}.")
+                latencies.append(elapsed)
+                sizes.append(size)
+                query_counts.append(queries)
+                statuses[str(status)] += 1
+
+            results[name] = dict(
+                summarize(latencies, sum(latencies)),
+                status=dict(statuses),
+                queries=None if query_counts[0] is None else max(query_counts),
+                bytes=int(statistics.median(sizes)),
+            )
+        return results
+
+    def compare(self, results, baseline_path, threshold):
+        with open(baseline_path) as file:
+            baseline = json.load(file)['routes']
+
+        regressions = []
+        self.stdout.write(f"\n{'route':<26}{'p95 before':>11}{'p95 after':>11}{'change':>9}{'queries':>12}")
+        for name, row in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+            queries = f"{before['queries']}->{row['queries']}"
+            flag = ''
+            if change > threshold or (row['queries'] or 0) > (before['queries'] or 0):
+                regressions.append(name)
+                flag = '  REGRESSION'
+            self.stdout.write(f"{name:<26}{before['p95_ms']:>11}{row['p95_ms']:>11}{change:>+9.0%}{queries:>12}{flag}")
+
+        if regressions:
+            raise CommandError(f"Regressions in {len(regressions)} routes: {', '.join(regressions)}")
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+from django.urls import reverse
+
+from api.benchmarking import benchmark_environment, seed_sample_week, summarize
+
+
+class Command(BaseCommand):
+    help = ("Compare concurrent-request throughput of the sync and async API views under the ASGI handler. "
+            "Runs against a throwaway test database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both',
+                            help="Which view stack to measure (default: both, each in its own process).")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Requests in flight at once.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'both':
+            results = {mode: self.run_in_subprocess(mode, options) for mode in ('sync', 'async')}
+        else:
+            expected = options['mode'] == 'async'
+            if settings.API_ASYNC_VIEWS != expected:
+                raise CommandError(f"Set API_ASYNC_VIEWS={'1' if expected else '0'} to measure the {options['mode']} views.")
+            with benchmark_environment():
+                week = seed_sample_week()
+                results = {options['mode']: asyncio.run(self.measure(week, options['requests'], options['concurrency']))}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'endpoint':<24}{'mode':<7}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for endpoint in next(iter(results.values())):
+            for mode, endpoints in results.items():
+                row = endpoints[endpoint]
+                self.stdout.write(f"{endpoint:<24}{mode:<7}{row['requests_per_second']:>10}"
+                                  f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+    def run_in_subprocess(self, mode, options):
+        # The view stack is chosen when the URLconf is imported, so each mode gets a fresh process
+        env = dict(os.environ, API_ASYNC_VIEWS='1' if mode == 'async' else '0')
+        command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_async', '--mode', mode,
+                   '--requests', str(options['requests']), '--concurrency', str(options['concurrency']), '--json']
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"The {mode} benchmark failed:\n{result.stderr}")
+        return json.loads(result.stdout)[mode]
+
+    async def measure(self, week, requests, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        def pictures():
+            return {'file': [SimpleUploadedFile(f'picture{index}.jpg', b'\xff' * 64 * 1024) for index in range(4)]}
+
+        endpoints = {
+            'kid-week-list': lambda: client.get(reverse('kid-week-list', args=[week.kid_id])),
+            'kid-media-list': lambda: client.get(reverse('kid-media-list', args=[week.id])),
+            'doctor-voice-records': lambda: client.get(reverse('doctor-voice-records', args=[week.id])),
+            'doctor-list': lambda: client.get(reverse('doctor-list')),
+            'pictures-upload': lambda: client.post(reverse('pictures-upload', args=[week.id]), pictures()),
+        }
+
+        async def timed(send, latencies):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await send()
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 500:
+                    raise CommandError(f"{response.status_code} from {response.request['PATH_INFO']}")
+
+        results = {}
+        for name, send in endpoints.items():
+            latencies = []
+            started = time.perf_counter()
+            await asyncio.gather(*[timed(send, latencies) for _ in range(requests)])
+            results[name] = summarize(latencies, time.perf_counter() - started)
+        return results
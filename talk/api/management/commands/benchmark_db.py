@@ -0,0 +1,137 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from api.benchmarking import benchmark_environment, seed_sample_week, summarize
+from api.models import KidVoiceRecording
+from api.summaries import rebuild_recording_rollups, rebuild_week_summaries
+
+# Environment of each database profile; 'postgresql' also needs the DB_* connection variables
+PROFILES = {
+    'sqlite': {'DB_ENGINE': 'sqlite', 'SQLITE_TUNING': '0', 'DB_CONN_MAX_AGE': '0'},
+    'sqlite-wal': {'DB_ENGINE': 'sqlite', 'SQLITE_TUNING': '1', 'SQLITE_WAL': '1', 'DB_CONN_MAX_AGE': '60'},
+    'postgresql': {'DB_ENGINE': 'postgresql'},
+}
+
+FEEDBACK_BATCH_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = ("Measure concurrent write throughput of the upload and feedback paths under each database profile. "
+            "Runs against a throwaway test database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', nargs='+', choices=list(PROFILES) + ['current'], default=['sqlite', 'sqlite-wal'],
+                            help="Profiles to measure, each in its own process (default: sqlite sqlite-wal). "
+                                 "'current' measures the profile configured in this process.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per write path.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Threads writing at once.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        results = {}
+        for profile in options['profile']:
+            if profile == 'current':
+                results['current'] = self.measure(options['requests'], options['concurrency'])
+            else:
+                results[profile] = self.run_in_subprocess(profile, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'path':<18}{'profile':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for path in next(iter(results.values())):
+            for profile, paths in results.items():
+                row = paths[path]
+                self.stdout.write(f"{path:<18}{profile:<12}{row['requests_per_second']:>10}{row['p50_ms']:>10}"
+                                  f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['errors']:>8}")
+
+    def run_in_subprocess(self, profile, options):
+        # Database settings are read once at startup, so each profile gets a fresh process
+        env = dict(os.environ, **PROFILES[profile])
+        command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_db', '--profile', 'current',
+                   '--requests', str(options['requests']), '--concurrency', str(options['concurrency']), '--json']
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"The {profile} benchmark failed:\n{result.stderr}")
+        return json.loads(result.stdout)['current']
+
+    def measure(self, requests, concurrency):
+        with benchmark_environment(on_disk=True):
+            week = seed_sample_week()
+            # Unreviewed recordings for the feedback paths, inserted without the per-row signals
+            recordings = KidVoiceRecording.objects.bulk_create([
+                KidVoiceRecording(week=week, doctor_id=week.kid.doctor_id, url=f'https://example.com/voice/{index}.mp3',
+                                  media_type='pictures')
+                for index in range(requests * (FEEDBACK_BATCH_SIZE + 1))
+            ])
+            voice_ids = [recording.id for recording in recordings]
+            rebuild_week_summaries([week.id])
+            rebuild_recording_rollups([week.id])
+            single_ids = iter(voice_ids[:requests])
+            batch_ids = iter(voice_ids[requests:])
+            # Threads open their own connections to the test database
+            connection.close()
+
+            def pictures_upload(client):
+                files = [SimpleUploadedFile(f'picture{index}.jpg', b'\xff' * 64 * 1024) for index in range(4)]
+                return client.post(reverse('pictures-upload', args=[week.id]), {'file': files})
+
+            def feedback(client):
+                return client.post(reverse('doctor-feedback-create', args=[next(single_ids)]),
+                                   {'stars': 5, 'note': 'Benchmark'}, content_type='application/json')
+
+            def feedback_batch(client):
+                items = [{'voice_id': next(batch_ids), 'stars': 4, 'note': 'Benchmark'} for _ in range(FEEDBACK_BATCH_SIZE)]
+                return client.post(reverse('doctor-feedback-batch'), items, content_type='application/json')
+
+            paths = {'pictures-upload': pictures_upload, 'feedback': feedback, 'feedback-batch': feedback_batch}
+            return {name: self.run_concurrently(send, requests, concurrency) for name, send in paths.items()}
+
+    def run_concurrently(self, send, requests, concurrency):
+        lock = threading.Lock()
+        remaining = [requests]
+        latencies = []
+        errors = [0]
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        if not remaining[0]:
+                            return
+                        remaining[0] -= 1
+                    started = time.perf_counter()
+                    try:
+                        response = send(client)
+                        failed = response.status_code >= 400
+                    except Exception:
+                        # e.g. "database is locked" when a writer waited longer than the busy timeout
+                        failed = True
+                    # Like a WSGI server: connections past their CONN_MAX_AGE are closed after each request
+                    close_old_connections()
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+                        errors[0] += failed
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return dict(summarize(latencies, time.perf_counter() - started), errors=errors[0])
@@ -0,0 +1,91 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter per sample: time django.setup() and the first URL
+# resolution, then report the resident memory.
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.urls import resolve, reverse
+# Imports the URLconf and every view module, and builds the reverse lookup tables
+resolve(reverse('doctor-list'))
+urls_done = time.perf_counter()
+try:
+    with open('/proc/self/status') as status:
+        rss_kb = int(next(line for line in status if line.startswith('VmRSS:')).split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1)
+print(json.dumps({
+    'setup_ms': (setup_done - started) * 1000,
+    'urls_ms': (urls_done - setup_done) * 1000,
+    'total_ms': (urls_done - started) * 1000,
+    'rss_mb': rss_kb / 1024,
+    'modules': len(sys.modules),
+    'drf_yasg_loaded': 'drf_yasg' in sys.modules,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = ("Measure worker cold start: import time of django.setup() and of the URLconf, and resident memory "
+            "afterwards, with the API docs on and off. Each sample runs in a fresh process.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs', choices=['on', 'off', 'both'], default='both',
+                            help="Measure with API_DOCS_ENABLED on, off or both (default: both).")
+        parser.add_argument('--runs', type=int, default=5, help="Processes started per configuration; medians are reported.")
+        parser.add_argument('--budget-ms', type=float,
+                            help="Fail when a configuration's median startup time exceeds this many milliseconds.")
+        parser.add_argument('--budget-mb', type=float,
+                            help="Fail when a configuration's median resident memory exceeds this many megabytes.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1.")
+        configurations = ['on', 'off'] if options['docs'] == 'both' else [options['docs']]
+        results = {f'docs-{docs}': self.measure(docs, options['runs']) for docs in configurations}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(f"{'configuration':<16}{'setup ms':>10}{'urls ms':>10}{'total ms':>10}{'rss MB':>10}"
+                              f"{'modules':>9}  drf_yasg")
+            for name, row in results.items():
+                self.stdout.write(f"{name:<16}{row['setup_ms']:>10}{row['urls_ms']:>10}{row['total_ms']:>10}"
+                                  f"{row['rss_mb']:>10}{row['modules']:>9}  {'loaded' if row['drf_yasg_loaded'] else '-'}")
+
+        over = [f"{name}: {row['total_ms']} ms > {options['budget_ms']} ms" for name, row in results.items()
+                if options['budget_ms'] is not None and row['total_ms'] > options['budget_ms']]
+        over += [f"{name}: {row['rss_mb']} MB > {options['budget_mb']} MB" for name, row in results.items()
+                 if options['budget_mb'] is not None and row['rss_mb'] > options['budget_mb']]
+        if over:
+            raise CommandError("Startup budget exceeded:\n" + '\n'.join(over))
+
+    def measure(self, docs, runs):
+        env = dict(os.environ, API_DOCS_ENABLED='1' if docs == 'on' else '0',
+                   DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'talk.settings'))
+        samples = []
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, '-c', PROBE], cwd=settings.BASE_DIR, env=env,
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                raise CommandError(f"The startup probe failed with docs {docs}:\n{result.stderr}")
+            samples.append(json.loads(result.stdout))
+
+        row = {field: round(statistics.median(sample[field] for sample in samples), 1)
+               for field in ('setup_ms', 'urls_ms', 'total_ms', 'rss_mb')}
+        row['modules'] = samples[-1]['modules']
+        row['drf_yasg_loaded'] = samples[-1]['drf_yasg_loaded']
+        row['runs'] = runs
+        return row
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.schema import code_version, generate_schema_files
+
+
+class Command(BaseCommand):
+    help = ("Generate the OpenAPI schema artifacts (JSON and YAML) of the current code version into "
+            "OPENAPI_SCHEMA_ROOT, for the schema endpoints to serve. Run it at build or deploy time.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Regenerate even if the artifacts of this code version already exist.")
+
+    def handle(self, *args, **options):
+        written = generate_schema_files(force=options['force'])
+        if not written:
+            self.stdout.write(f"The schema of code version {code_version()} is up to date.")
+            return
+        for path in written:
+            self.stdout.write(f"Wrote {path}")
+        self.stdout.write(self.style.SUCCESS(f"Generated the schema of code version {code_version()}."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.enrollment import enroll_kids, format_errors, read_kids_csv, validate_kids
+
+
+class Command(BaseCommand):
+    help = "Enroll kids from a CSV file (k_id,name,dob,phone,age,doctor) in a single transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help="Path of the CSV file to import.")
+        parser.add_argument('--dry-run', action='store_true', help="Only validate the rows.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], 'rb') as file:
+                rows = read_kids_csv(file)
+        except OSError as error:
+            raise CommandError(f"Cannot read {options['csv_file']}: {error}")
+
+        if options['dry_run']:
+            valid, errors = validate_kids(rows)
+            kids = []
+        else:
+            kids, errors = enroll_kids(rows)
+
+        for error in format_errors(errors):
+            # Row numbers as seen in a spreadsheet: the header is line 1
+            self.stderr.write(f"Line {error['index'] + 2}: {error['errors']}")
+        if errors:
+            raise CommandError(f"{len(errors)} of {len(rows)} rows are invalid. No kid was created.")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"All {len(valid)} rows are valid."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(kids)} kids enrolled."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Week
+from api.summaries import rebuild_recording_rollups, rebuild_week_summaries
+
+
+class Command(BaseCommand):
+    help = ("Recompute the week summaries (media counts, recording counts, review status and stars) and the "
+            "recording rollups behind the analytics endpoints from the media, voice recording and feedback rows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Weeks recomputed per transaction (default: 1000).")
+        parser.add_argument('--week', type=int, nargs='+', dest='weeks',
+                            help="Only rebuild these week ids.")
+
+    def handle(self, *args, **options):
+        weeks = Week.objects.order_by('id')
+        if options['weeks']:
+            weeks = weeks.filter(id__in=options['weeks'])
+
+        rebuilt, rollups, last_id = 0, 0, 0
+        while True:
+            week_ids = list(weeks.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not week_ids:
+                break
+            with transaction.atomic():
+                rebuilt += rebuild_week_summaries(week_ids)
+                rollups += rebuild_recording_rollups(week_ids)
+            last_id = week_ids[-1]
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} week summaries and {rollups} recording rollups."))
@@ -0,0 +1,80 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from api.reconcile import find_orphans, load_checkpoint, missing_batches, save_checkpoint, scan_batches
+
+
+class Command(BaseCommand):
+    help = ("Compare MEDIA_ROOT with the stored file names in the database: report (or delete) files no row "
+            "references and report rows whose file is missing.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true',
+                            help="Delete the orphaned files instead of only reporting them.")
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help="Only treat files not modified for this many seconds as orphans (default: 3600).")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Files or rows checked per database query (default: 500).")
+        parser.add_argument('--checkpoint',
+                            help="JSON file recording progress; an interrupted run resumes from it. "
+                                 "It is removed once a run completes.")
+        parser.add_argument('--only', choices=['orphans', 'missing'],
+                            help="Run only one of the two checks.")
+
+    def handle(self, *args, **options):
+        try:
+            root = default_storage.path('')
+        except NotImplementedError:
+            raise CommandError("reconcile_media only supports storages on the local filesystem.")
+
+        checkpoint = options['checkpoint']
+        state = load_checkpoint(checkpoint)
+        batch_size = options['batch_size']
+
+        if options['only'] != 'missing':
+            self.reconcile_orphans(root, state, checkpoint, batch_size, options)
+        if options['only'] != 'orphans':
+            self.report_missing(root, state, checkpoint, batch_size)
+
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+    def reconcile_orphans(self, root, state, checkpoint, batch_size, options):
+        # Partial resumable uploads live outside the stored names even when kept under MEDIA_ROOT
+        exclude = {os.path.realpath(settings.RESUMABLE_UPLOAD_ROOT)}
+        cutoff = time.time() - options['min_age']
+        found = freed = 0
+
+        for names, paths in scan_batches(root, state['orphans'], batch_size, exclude):
+            # The state now covers every batch before this one
+            save_checkpoint(checkpoint, state)
+            for name, path, size in find_orphans(names, paths, cutoff):
+                if options['delete']:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                    self.stdout.write(f"Deleted orphan {name} ({size} bytes)")
+                else:
+                    self.stdout.write(f"Orphan {name} ({size} bytes)")
+                found += 1
+                freed += size
+        save_checkpoint(checkpoint, state)
+
+        verb = "deleted" if options['delete'] else "found"
+        self.stdout.write(self.style.SUCCESS(f"{found} orphaned files {verb} ({freed} bytes)."))
+
+    def report_missing(self, root, state, checkpoint, batch_size):
+        missing = 0
+        for model, field, rows in missing_batches(root, state['missing'], batch_size):
+            for pk, name in rows:
+                self.stdout.write(f"Missing {model.__name__} {pk} {field}: {name}")
+            missing += len(rows)
+            save_checkpoint(checkpoint, state)
+
+        style = self.style.WARNING if missing else self.style.SUCCESS
+        self.stdout.write(style(f"{missing} rows point at missing files."))
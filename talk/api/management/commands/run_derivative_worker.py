@@ -0,0 +1,54 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.derivatives import DerivativeUnavailable, build_derivative, claim_jobs, complete_job, fail_job
+
+
+class Command(BaseCommand):
+    help = "Build thumbnails, poster frames, and compressed audio with waveforms for uploads using a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help="Number of worker processes (default: number of CPUs).")
+        parser.add_argument('--batch-size', type=int,
+                            help="Jobs claimed per round (default: twice the number of processes).")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait when no job is due.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit as soon as no job is due instead of polling.")
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        batch_size = options['batch_size'] or processes * 2
+
+        # Workers only touch storage; never share the parent's DB connections
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=processes, initializer=django.setup) as pool:
+            while True:
+                jobs = claim_jobs(batch_size)
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                futures = {pool.submit(build_derivative, job.kind, job.target.file.name): job for job in jobs}
+                for future in as_completed(futures):
+                    job = futures[future]
+                    try:
+                        name, fields = future.result()
+                    except DerivativeUnavailable as error:
+                        fail_job(job, str(error), retryable=False)
+                        self.stderr.write(f"Job {job.id} ({job.kind}) failed: {error}")
+                    except Exception as error:
+                        fail_job(job, str(error) or repr(error))
+                        self.stderr.write(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {error}")
+                    else:
+                        complete_job(job, name, fields)
+                        self.stdout.write(f"Job {job.id} ({job.kind}) done: {name}")
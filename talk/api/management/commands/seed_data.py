@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.seeding import generate_dataset
+
+
+class Command(BaseCommand):
+    help = ("Fill the database with synthetic doctors, kids, weeks, media, voice recordings and feedback "
+            "using bulk inserts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=100, help="Number of doctors (default: 100).")
+        parser.add_argument('--kids-per-doctor', type=int, default=20, help="Kids per doctor (default: 20).")
+        parser.add_argument('--recordings-per-week', type=int, default=2,
+                            help="Voice recordings per week (default: 2).")
+        parser.add_argument('--feedback-ratio', type=float, default=0.5,
+                            help="Share of the recordings that get feedback (default: 0.5).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert (default: 1000).")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible data.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = generate_dataset(
+            options['doctors'], options['kids_per_doctor'], recordings_per_week=options['recordings_per_week'],
+            feedback_ratio=options['feedback_ratio'], batch_size=options['batch_size'], seed=options['seed'],
+        )
+        summary = ', '.join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary} in {time.perf_counter() - started:.1f}s."))
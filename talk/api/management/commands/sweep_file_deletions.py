@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.deletions import sweep_file_deletions
+
+
+class Command(BaseCommand):
+    help = "Delete replaced media files from storage once their grace period is over."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Files deleted per round (default: 100).")
+        parser.add_argument('--poll-interval', type=float, default=30.0,
+                            help="Seconds to wait when no deletion is due.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit as soon as no deletion is due instead of polling.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            deleted, failed = sweep_file_deletions(batch_size)
+            if deleted or failed:
+                self.stdout.write(f"Deleted {deleted} files, {failed} failed.")
+            if deleted + failed < batch_size:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,156 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+slow_query_logger = logging.getLogger('api.slow_queries')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+UPLOAD_BYTES_BUCKETS = tuple(1024 * size for size in (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576))
+
+_lock = threading.Lock()
+
+
+def format_labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name, self.documentation, self.labels = name, documentation, labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with _lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    """
+    Prometheus histogram over fixed ``buckets``, one series per label values.
+    Only per-bucket counts are kept; they are made cumulative when rendered.
+    """
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name, self.documentation, self.labels, self.buckets = name, documentation, labels, buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            counts, total = self.series.get(labels, ([0] * (len(self.buckets) + 1), 0))
+            counts[index] += 1
+            self.series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with _lock:
+            for labels, (counts, total) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{format_labels(self.labels, labels, le=bound)} {cumulative}')
+                lines.append(f'{self.name}_sum{format_labels(self.labels, labels)} {total}')
+                lines.append(f'{self.name}_count{format_labels(self.labels, labels)} {cumulative}')
+        return lines
+
+
+REQUESTS = Counter('api_requests_total', "Requests by route, method and response status.",
+                   ('route', 'method', 'status'))
+REQUEST_DURATION = Histogram('api_request_duration_seconds', "Time until the response is returned, by route.",
+                             ('route', 'method'), DURATION_BUCKETS)
+REQUEST_QUERIES = Histogram('api_request_queries', "SQL queries run per request, by route.",
+                            ('route',), QUERY_COUNT_BUCKETS)
+REQUEST_QUERY_DURATION = Histogram('api_request_query_duration_seconds', "Time spent in SQL per request, by route.",
+                                   ('route',), DURATION_BUCKETS)
+UPLOAD_BYTES = Histogram('api_upload_bytes', "Request body size of POST/PUT/PATCH requests, by route.",
+                         ('route',), UPLOAD_BYTES_BUCKETS)
+SLOW_QUERIES = Counter('api_slow_queries_total', "Queries slower than SLOW_QUERY_THRESHOLD_MS, by route.",
+                       ('route',))
+
+METRICS = [REQUESTS, REQUEST_DURATION, REQUEST_QUERIES, REQUEST_QUERY_DURATION, UPLOAD_BYTES, SLOW_QUERIES]
+
+
+class RequestStats:
+    __slots__ = ('request', 'started', 'queries', 'query_time')
+
+    def __init__(self, request):
+        self.request = request
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+
+
+# Stats of the request being served. Context variables follow the request into
+# the worker threads of sync_to_async, so queries of async views are counted too.
+_current_request = contextvars.ContextVar('api_request_stats', default=None)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper (see ``connection.execute_wrapper``) adding each
+    query's count and time to the current request, and sampling slow ones
+    into the ``api.slow_queries`` log.
+    """
+    stats = _current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.query_time += elapsed
+        if elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+            route = route_name(stats.request)
+            SLOW_QUERIES.inc((route,))
+            if random.random() < settings.SLOW_QUERY_SAMPLE_RATE:
+                slow_query_logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, route, sql[:2000])
+
+
+def start_request(request):
+    stats = RequestStats(request)
+    return stats, _current_request.set(stats)
+
+
+def finish_request(stats, token, response):
+    _current_request.reset(token)
+    request = stats.request
+    route, method = route_name(request), request.method
+
+    REQUESTS.inc((route, method, str(response.status_code)))
+    REQUEST_DURATION.observe((route, method), time.perf_counter() - stats.started)
+    REQUEST_QUERIES.observe((route,), stats.queries)
+    REQUEST_QUERY_DURATION.observe((route,), stats.query_time)
+    if method in ('POST', 'PUT', 'PATCH'):
+        length = request.META.get('CONTENT_LENGTH')
+        if length and length.isdigit():
+            UPLOAD_BYTES.observe((route,), int(length))
+
+
+def render_metrics():
+    return '\n'.join(line for metric in METRICS for line in metric.render()) + '\n'
@@ -0,0 +1,34 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import finish_request, start_request
+
+
+class MetricsMiddleware:
+    """
+    Records the duration, SQL query count and time, and upload size of every
+    request under its URL name (see api.metrics). Keep it first in MIDDLEWARE
+    so the whole stack is timed. Streaming responses are timed until their
+    headers are ready, not until the last byte is sent.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = start_request(request)
+        response = self.get_response(request)
+        finish_request(stats, token, response)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = start_request(request)
+        response = await self.get_response(request)
+        finish_request(stats, token, response)
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_kidvoicerecording_media_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kidvoicerecording',
+            name='checksum',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.AddField(
+            model_name='kidvoicerecording',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='checksum',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:24
+
+import api.models
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_media_size_checksum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('target', models.CharField(choices=[('video', 'Video'), ('voice', 'Voice recording')], max_length=10)),
+                ('media_type', models.CharField(blank=True, choices=[('pictures', 'Pictures'), ('video', 'Video')], max_length=10)),
+                ('filename', models.CharField(max_length=255)),
+                ('total_size', models.BigIntegerField()),
+                ('offset', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True, default=api.models.default_upload_expiry)),
+                ('week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='api.week')),
+            ],
+        ),
+    ]
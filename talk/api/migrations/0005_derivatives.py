@@ -0,0 +1,54 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kidvoicerecording',
+            name='derivative_state',
+            field=models.CharField(choices=[('none', 'None'), ('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='kidvoicerecording',
+            name='normalized_file',
+            field=models.FileField(blank=True, upload_to='voice/normalized/'),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='derivative_state',
+            field=models.CharField(choices=[('none', 'None'), ('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='preview',
+            field=models.FileField(blank=True, upload_to='previews/'),
+        ),
+        migrations.CreateModel(
+            name='DerivativeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('thumbnail', 'Picture thumbnail'), ('poster', 'Video poster frame'), ('audio', 'Normalized audio')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=64)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('media', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='derivative_jobs', to='api.media')),
+                ('voice_recording', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='derivative_jobs', to='api.kidvoicerecording')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='api_derivat_status_602353_idx')],
+            },
+        ),
+    ]
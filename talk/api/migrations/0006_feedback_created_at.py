@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedback',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:29
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_doctor(apps, schema_editor):
+    Kid = apps.get_model('api', 'Kid')
+    KidVoiceRecording = apps.get_model('api', 'KidVoiceRecording')
+    KidVoiceRecording.objects.update(
+        doctor_id=Subquery(Kid.objects.filter(weeks=OuterRef('week_id')).values('doctor_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_feedback_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kidvoicerecording',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='kidvoicerecording',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='kidvoicerecording',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='kidvoicerecording',
+            name='doctor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='voice_recordings', to='api.doctor'),
+        ),
+        migrations.RunPython(backfill_doctor, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='kidvoicerecording',
+            index=models.Index(fields=['feedback_state', 'doctor', 'created_at'], name='voice_review_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_voice_review_queue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['full_name', 'id'], name='doctor_directory_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:40
+
+import api.models
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_pendingfiledeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('batch', models.UUIDField(db_index=True)),
+                ('target', models.CharField(choices=[('pictures', 'Pictures'), ('video', 'Video'), ('voice', 'Voice recording')], max_length=10)),
+                ('media_type', models.CharField(blank=True, choices=[('pictures', 'Pictures'), ('video', 'Video')], max_length=10)),
+                ('name', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=100)),
+                ('size', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True, default=api.models.default_direct_upload_expiry)),
+                ('week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='direct_uploads', to='api.week')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_directupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kidvoicerecording',
+            name='waveform',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
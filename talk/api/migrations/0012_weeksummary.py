@@ -0,0 +1,30 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_kidvoicerecording_waveform'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeekSummary',
+            fields=[
+                ('week', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='api.week')),
+                ('picture_count', models.IntegerField(default=0)),
+                ('video_count', models.IntegerField(default=0)),
+                ('picture_recordings', models.IntegerField(default=0)),
+                ('video_recordings', models.IntegerField(default=0)),
+                ('pending_recordings', models.IntegerField(default=0)),
+                ('reviewed_recordings', models.IntegerField(default=0)),
+                ('feedback_count', models.IntegerField(default=0)),
+                ('stars_total', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_weeksummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='kind',
+            field=models.CharField(blank=True, choices=[('picture', 'Picture'), ('video', 'Video')], max_length=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['week', 'kind'], name='media_week_kind_idx'),
+        ),
+    ]
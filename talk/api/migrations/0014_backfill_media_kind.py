@@ -0,0 +1,53 @@
+from functools import reduce
+from operator import or_
+
+from django.db import migrations, transaction
+from django.db.models import Max, Min, Q
+
+BATCH_SIZE = 5000
+
+# Frozen copies of api.models.PICTURE_EXTENSIONS / VIDEO_EXTENSIONS
+KIND_EXTENSIONS = {
+    'picture': ('jpg', 'jpeg', 'png'),
+    'video': ('mp4', 'avi', 'mov'),
+}
+
+
+def suffix_q(extensions):
+    return reduce(or_, [Q(file__iendswith=extension) | Q(url__iendswith=extension) for extension in extensions])
+
+
+def backfill_kind(apps, schema_editor):
+    """
+    Classify existing media by file name, else URL, in primary key ranges of
+    BATCH_SIZE rows. Every range is its own short transaction, so rows are
+    only locked while their range is updated. Rows matching no extension
+    keep a null kind.
+    """
+    Media = apps.get_model('api', 'Media')
+    db = schema_editor.connection.alias
+    bounds = Media.objects.using(db).aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return
+
+    for start in range(bounds['first'], bounds['last'] + 1, BATCH_SIZE):
+        batch = Media.objects.using(db).filter(id__gte=start, id__lt=start + BATCH_SIZE, kind__isnull=True)
+        with transaction.atomic(using=db):
+            # The file name decides first, like Media.save()
+            batch.filter(suffix_q(KIND_EXTENSIONS['picture'])).exclude(
+                reduce(or_, [Q(file__iendswith=extension) for extension in KIND_EXTENSIONS['video']])
+            ).update(kind='picture')
+            batch.filter(suffix_q(KIND_EXTENSIONS['video'])).update(kind='video')
+
+
+class Migration(migrations.Migration):
+    # Batches commit one by one instead of in a single long transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0013_media_kind'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_kind, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_backfill_media_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kid',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='week',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:07
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_version_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_type', models.CharField(choices=[('pictures', 'Pictures'), ('video', 'Video')], max_length=10)),
+                ('recordings', models.IntegerField(default=0)),
+                ('reviewed', models.IntegerField(default=0)),
+                ('stars_total', models.IntegerField(default=0)),
+                ('review_time_total', models.DurationField(default=datetime.timedelta)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recording_rollups', to='api.week')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='recordingrollup',
+            constraint=models.UniqueConstraint(fields=('week', 'media_type'), name='recording_rollup_week_media_type_uniq'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.db import migrations, transaction
+from django.db.models import Case, Count, DurationField, F, Max, Min, Sum, Value, When
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Aggregate the existing voice recordings and feedback into rollups, for
+    week id ranges of BATCH_SIZE weeks, each in its own short transaction.
+    """
+    Week = apps.get_model('api', 'Week')
+    KidVoiceRecording = apps.get_model('api', 'KidVoiceRecording')
+    RecordingRollup = apps.get_model('api', 'RecordingRollup')
+    db = schema_editor.connection.alias
+    bounds = Week.objects.using(db).aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return
+
+    # Legacy feedback got its created_at (0006) before the recordings did (0007), so it
+    # can predate its recording: count such reviews as immediate instead of negative
+    review_time = Case(When(feedback__created_at__gte=F('created_at'), then=F('feedback__created_at') - F('created_at')),
+                       default=Value(timedelta()), output_field=DurationField())
+    for start in range(bounds['first'], bounds['last'] + 1, BATCH_SIZE):
+        rows = (KidVoiceRecording.objects.using(db).filter(week_id__gte=start, week_id__lt=start + BATCH_SIZE)
+                .values('week_id', 'media_type').order_by()
+                .annotate(recordings=Count('id'), reviewed=Count('feedback'), stars_total=Sum('feedback__stars'),
+                          review_time_total=Sum(review_time)))
+        with transaction.atomic(using=db):
+            RecordingRollup.objects.using(db).bulk_create([
+                RecordingRollup(week_id=row['week_id'], media_type=row['media_type'], recordings=row['recordings'],
+                                reviewed=row['reviewed'], stars_total=row['stars_total'] or 0,
+                                review_time_total=row['review_time_total'] or timedelta(), updated_at=timezone.now())
+                for row in rows
+            ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    # Batches commit one by one instead of in a single long transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0016_recordingrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,11 @@
-from django.db import models
+import os
+import uuid
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import models, router, transaction
+from django.utils import timezone
 
 
 class Doctor(models.Model):
@@ -8,10 +15,19 @@ class Doctor(models.Model):
     dob = models.DateField()
     full_name = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['full_name', 'id'], name='doctor_directory_idx'),
+        ]
+
     def __str__(self):
         return self.full_name
 
 
+# Number of weeks every kid's program is made of
+WEEKS_PER_KID = 4
+
+
 # Kid model (each doctor can have multiple kids)
 class Kid(models.Model):
     k_id = models.IntegerField(unique=True)
@@ -20,39 +36,101 @@ class Kid(models.Model):
     phone = models.IntegerField(unique=True)
     age = models.IntegerField()
     doctor = models.ForeignKey(Doctor, related_name="kids", on_delete=models.CASCADE)
+    # Bumped whenever one of the kid's weeks changes (see api.versions); the week list ETag
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
+        creating = self._state.adding
+
         # Call the original save method
         super().save(*args, **kwargs)
 
-        # Check if weeks are already created
-        if not self.weeks.exists():
-            # Create 4 weeks for the kid
-            for week_number in range(1, 5):
-                Week.objects.create(kid=self, week_number=week_number)
+        # Create the 4 weeks of a new kid, and their summaries, in two inserts
+        if creating:
+            WeekSummary.create_for(Week.objects.bulk_create(Week.initial_weeks(self)))
+        else:
+            # Keep the review queue of the kid's recordings with their current doctor
+            KidVoiceRecording.objects.filter(week__kid=self).exclude(doctor_id=self.doctor_id).update(doctor_id=self.doctor_id)
 
 
 # Week model to store data for each week per kid
 class Week(models.Model):
     kid = models.ForeignKey(Kid, related_name="weeks", on_delete=models.CASCADE)
     week_number = models.IntegerField()
+    # Bumped by every write to the week's media, voice recordings or feedback (see api.versions)
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"Week {self.week_number} for {self.kid.name}"
 
+    @staticmethod
+    def initial_weeks(kid):
+        return [Week(kid=kid, week_number=week_number) for week_number in range(1, WEEKS_PER_KID + 1)]
+
+
+# File extensions used to tell week pictures from week videos
+PICTURE_EXTENSIONS = ('jpg', 'jpeg', 'png')
+VIDEO_EXTENSIONS = ('mp4', 'avi', 'mov')
+
+MEDIA_KIND_CHOICES = [
+    ('picture', 'Picture'),
+    ('video', 'Video'),
+]
+
+
+def media_kind(*names):
+    """
+    'picture' or 'video' from the extension of the first of ``names`` (file
+    names or URLs, whose query string is ignored) that has a known one, or None.
+    """
+    for name in names:
+        name = urlsplit(str(name or '')).path.lower()
+        if name.endswith(PICTURE_EXTENSIONS):
+            return 'picture'
+        if name.endswith(VIDEO_EXTENSIONS):
+            return 'video'
+    return None
+
+
+# Progress of the background derivatives (thumbnails, posters, normalized audio) of a file
+DERIVATIVE_STATE_CHOICES = [
+    ('none', 'None'),
+    ('pending', 'Pending'),
+    ('processing', 'Processing'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+]
+
 
 # Media for each week: pictures and video
 class Media(models.Model):
     week = models.ForeignKey(Week, related_name="media", on_delete=models.CASCADE)
     file = models.FileField(upload_to="media/")
     url = models.CharField(max_length=300, blank=True, null=True)
+    size = models.BigIntegerField(blank=True, null=True)
+    checksum = models.CharField(max_length=128, blank=True, default='')
+    # Set by the endpoint that received the file or URL; rows from older releases are backfilled by migration 0014
+    kind = models.CharField(max_length=10, choices=MEDIA_KIND_CHOICES, blank=True, null=True)
+    # Thumbnail for pictures, poster frame for videos
+    preview = models.FileField(upload_to="previews/", blank=True)
+    derivative_state = models.CharField(max_length=10, choices=DERIVATIVE_STATE_CHOICES, default='none')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['week', 'kind'], name='media_week_kind_idx'),
+        ]
 
     def __str__(self):
         return f"Media File for {self.week}"
 
+    def save(self, *args, **kwargs):
+        if not self.kind:
+            self.kind = media_kind(self.file.name, self.url)
+        super().save(*args, **kwargs)
+
 
 # Voice recordings from the kid to the doctor
 class KidVoiceRecording(models.Model):
@@ -62,20 +140,228 @@ class KidVoiceRecording(models.Model):
     ]
 
     week = models.ForeignKey(Week, related_name="voice_recordings", on_delete=models.CASCADE)
+    # Denormalized from week.kid.doctor so the review queue is a single index scan
+    doctor = models.ForeignKey(Doctor, related_name="voice_recordings", on_delete=models.CASCADE, blank=True, null=True)
     file = models.FileField(upload_to="voice/")
     url = models.CharField(max_length=300, blank=True, null=True)
+    size = models.BigIntegerField(blank=True, null=True)
+    checksum = models.CharField(max_length=128, blank=True, default='')
     feedback_state = models.BooleanField(default=False)
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES, default='pictures')  # New field to track media type
+    normalized_file = models.FileField(upload_to="voice/normalized/", blank=True)
+    # {'duration': seconds, 'peaks': [0..1, ...]} computed with the normalized audio
+    waveform = models.JSONField(blank=True, null=True)
+    derivative_state = models.CharField(max_length=10, choices=DERIVATIVE_STATE_CHOICES, default='none')
+    created_at = models.DateTimeField(default=timezone.now)
+    # Reviewer currently working on this recording, see api.review
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['feedback_state', 'doctor', 'created_at'], name='voice_review_queue_idx'),
+        ]
 
     def __str__(self):
         return f"Voice recording for {self.week} ({self.media_type})"
 
+    def save(self, *args, **kwargs):
+        if self.doctor_id is None and self.week_id is not None:
+            self.doctor_id = Kid.objects.filter(weeks=self.week_id).values_list('doctor_id', flat=True).first()
+        # The week summary is updated by a post_save receiver, in the same transaction
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+
 
 # Feedback from doctor to the kid
 class Feedback(models.Model):
     voice_recording = models.OneToOneField(KidVoiceRecording, related_name="feedback", on_delete=models.CASCADE)
     stars = models.IntegerField(choices=[(i, i) for i in range(1, 6)])
     note = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     def __str__(self):
         return f"Feedback for {self.voice_recording}'s voice"
+
+
+# Denormalized media and review counts of a week, kept up to date by api.summaries
+class WeekSummary(models.Model):
+    week = models.OneToOneField(Week, related_name="summary", on_delete=models.CASCADE, primary_key=True)
+    picture_count = models.IntegerField(default=0)
+    video_count = models.IntegerField(default=0)
+    picture_recordings = models.IntegerField(default=0)
+    video_recordings = models.IntegerField(default=0)
+    pending_recordings = models.IntegerField(default=0)
+    reviewed_recordings = models.IntegerField(default=0)
+    feedback_count = models.IntegerField(default=0)
+    stars_total = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Summary of {self.week}"
+
+    @property
+    def has_video(self):
+        return self.video_count > 0
+
+    @property
+    def media_complete(self):
+        return self.picture_count == 4 and self.video_count == 1
+
+    @property
+    def average_stars(self):
+        return round(self.stars_total / self.feedback_count, 2) if self.feedback_count else None
+
+    @classmethod
+    def create_for(cls, weeks):
+        """
+        Insert the empty summaries of freshly inserted ``weeks``.
+        """
+        week_ids = [week.pk for week in weeks]
+        if None in week_ids:
+            # Backends that cannot return primary keys from bulk inserts
+            week_ids = Week.objects.filter(kid_id__in={week.kid_id for week in weeks}).values_list('id', flat=True)
+        cls.objects.bulk_create([cls(week_id=week_id) for week_id in week_ids], ignore_conflicts=True)
+
+
+# Review counts, stars and review latency of a week's voice recordings of one media type,
+# kept up to date by api.summaries and aggregated by the analytics endpoints
+class RecordingRollup(models.Model):
+    week = models.ForeignKey(Week, related_name="recording_rollups", on_delete=models.CASCADE)
+    media_type = models.CharField(max_length=10, choices=KidVoiceRecording.MEDIA_TYPE_CHOICES)
+    recordings = models.IntegerField(default=0)
+    reviewed = models.IntegerField(default=0)
+    stars_total = models.IntegerField(default=0)
+    # Sum over the reviewed recordings of the time from upload to feedback
+    review_time_total = models.DurationField(default=timedelta)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['week', 'media_type'], name='recording_rollup_week_media_type_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_media_type_display()} rollup of {self.week}"
+
+
+# Background job producing the derivatives of an uploaded media file or voice recording
+class DerivativeJob(models.Model):
+    KIND_CHOICES = [
+        ('thumbnail', 'Picture thumbnail'),
+        ('poster', 'Video poster frame'),
+        ('audio', 'Normalized audio'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    media = models.ForeignKey(Media, related_name="derivative_jobs", on_delete=models.CASCADE, blank=True, null=True)
+    voice_recording = models.ForeignKey(KidVoiceRecording, related_name="derivative_jobs", on_delete=models.CASCADE,
+                                        blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job {self.id} ({self.status})"
+
+    @property
+    def target(self):
+        return self.media if self.media_id else self.voice_recording
+
+
+def default_upload_expiry():
+    return timezone.now() + timedelta(seconds=settings.RESUMABLE_UPLOAD_TTL)
+
+
+class ExpiringQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+
+# Resumable upload of a week video or a voice recording, sent in byte ranges
+class UploadSession(models.Model):
+    TARGET_CHOICES = [
+        ('video', 'Video'),
+        ('voice', 'Voice recording'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    week = models.ForeignKey(Week, related_name="upload_sessions", on_delete=models.CASCADE)
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    media_type = models.CharField(max_length=10, choices=KidVoiceRecording.MEDIA_TYPE_CHOICES, blank=True)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_upload_expiry, db_index=True)
+
+    objects = ExpiringQuerySet.as_manager()
+
+    def __str__(self):
+        return f"Upload session {self.id} ({self.target}) for {self.week}"
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.RESUMABLE_UPLOAD_ROOT, f"{self.id}.part")
+
+
+def default_deletion_time():
+    return timezone.now() + timedelta(seconds=settings.FILE_DELETION_GRACE)
+
+
+# Stored file that no row points at any more, removed by the sweep_file_deletions command
+class PendingFileDeletion(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    delete_after = models.DateTimeField(default=default_deletion_time, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pending deletion of {self.name}"
+
+
+def default_direct_upload_expiry():
+    return timezone.now() + timedelta(seconds=settings.DIRECT_UPLOAD_EXPIRY)
+
+
+# Presigned upload target handed to a client that PUTs the file straight into object storage.
+# The files of one request (e.g. the 4 pictures of a week) share a batch and are completed together.
+class DirectUpload(models.Model):
+    TARGET_CHOICES = [
+        ('pictures', 'Pictures'),
+        ('video', 'Video'),
+        ('voice', 'Voice recording'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    batch = models.UUIDField(db_index=True)
+    week = models.ForeignKey(Week, related_name="direct_uploads", on_delete=models.CASCADE)
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    media_type = models.CharField(max_length=10, choices=KidVoiceRecording.MEDIA_TYPE_CHOICES, blank=True)
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_direct_upload_expiry, db_index=True)
+
+    objects = ExpiringQuerySet.as_manager()
+
+    def __str__(self):
+        return f"Direct upload {self.id} ({self.target}) for {self.week}"
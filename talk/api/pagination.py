@@ -0,0 +1,18 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FeedbackCursorPagination(CursorPagination):
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
+
+
+class DoctorCursorPagination(CursorPagination):
+    # The (full_name, id) index serves the ordering, but DRF's cursor only filters on
+    # full_name: a page starts at the cursor's name and skips the doctors sharing it
+    # that earlier pages returned, so only large runs of one name cost extra rows
+    ordering = ('full_name', 'id')
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = 500
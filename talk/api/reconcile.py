@@ -0,0 +1,136 @@
+import heapq
+import json
+import os
+import posixpath
+from collections import deque
+
+from .deletions import STORED_FILE_FIELDS, referenced_names
+from .models import PendingFileDeletion
+
+# Batches of one directory's file names held in memory at once; a larger
+# directory is streamed once per window of that many batches
+SCAN_WINDOW_BATCHES = 20
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)
+    return {'orphans': {'done': [], 'current': None, 'after': None}, 'missing': {}}
+
+
+def save_checkpoint(path, state):
+    if not path:
+        return
+    # Written aside and renamed, so an interrupted run never leaves a torn checkpoint
+    with open(path + '.tmp', 'w') as file:
+        json.dump(state, file)
+    os.replace(path + '.tmp', path)
+
+
+def file_names(root, directory, exclude, after=None, subdirectories=None):
+    """
+    Stream the storage names of the files in ``directory`` that sort after
+    ``after``, adding its sub-directories outside ``exclude`` to
+    ``subdirectories`` when given.
+    """
+    with os.scandir(os.path.join(root, directory)) as scan:
+        for entry in scan:
+            name = posixpath.join(directory, entry.name) if directory else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if subdirectories is not None and os.path.realpath(entry.path) not in exclude:
+                    subdirectories.append(name)
+            elif entry.is_file(follow_symlinks=False) and (after is None or name > after):
+                yield name
+
+
+def scan_batches(root, state, batch_size, exclude=()):
+    """
+    Walk ``root`` iteratively with ``os.scandir`` and yield ``(names, paths)``
+    batches of at most ``batch_size`` files in name order, where names are
+    the storage names relative to ``root``.
+
+    A directory is streamed keeping only a bounded heap of the next
+    ``SCAN_WINDOW_BATCHES`` batches of names after the last one processed,
+    so memory does not grow with the directory; one larger than that window
+    is streamed again for each window. ``state`` records a batch once the
+    caller asks for the next one, so only after it was processed:
+    directories done are only scanned for sub-directories, and the current
+    directory resumes after the last name processed, which files deleted by
+    earlier batches cannot shift.
+    """
+    window = batch_size * SCAN_WINDOW_BATCHES
+    done = set(state['done'])
+    stack = ['']
+    while stack:
+        directory = stack.pop()
+        after = state.get('after') if directory == state['current'] else None
+
+        subdirectories = []
+        listing = file_names(root, directory, exclude, after, subdirectories)
+        if directory in done:
+            deque(listing, maxlen=0)
+            upcoming = []
+        else:
+            upcoming = heapq.nsmallest(window, listing)
+        stack.extend(sorted(subdirectories, reverse=True))
+
+        while upcoming:
+            for start in range(0, len(upcoming), batch_size):
+                names = upcoming[start:start + batch_size]
+                yield names, [os.path.join(root, name) for name in names]
+                state['current'], state['after'] = directory, names[-1]
+            if len(upcoming) < window:
+                break
+            upcoming = heapq.nsmallest(window, file_names(root, directory, exclude, upcoming[-1]))
+        if directory not in done:
+            state['done'].append(directory)
+            done.add(directory)
+            state['current'], state['after'] = None, None
+
+
+def find_orphans(names, paths, cutoff):
+    """
+    Return the ``(name, path, size)`` of the files in the batch that no row
+    references and that were last modified before the ``cutoff`` timestamp.
+    Files already queued for deletion are left to the sweeper.
+    """
+    in_use = referenced_names(names)
+    in_use.update(PendingFileDeletion.objects.filter(name__in=names).values_list('name', flat=True))
+    orphans = []
+    for name, path in zip(names, paths):
+        if name in in_use:
+            continue
+        try:
+            stat = os.lstat(path)
+        except FileNotFoundError:
+            continue
+        # Uploads are stored before their row is created; recent files may still be claimed
+        if stat.st_mtime < cutoff:
+            orphans.append((name, path, stat.st_size))
+    return orphans
+
+
+def missing_batches(root, state, chunk_size):
+    """
+    Yield ``(model, field, missing)`` for every ``chunk_size`` rows of each
+    stored file field, where missing lists the ``(pk, name)`` of the rows whose
+    file is not under ``root``. Rows are read in primary key order with a
+    chunked iterator; ``state`` maps each field to the last primary key done.
+    """
+    for model, field in STORED_FILE_FIELDS:
+        label = f'{model._meta.label_lower}.{field}'
+        rows = (model.objects.filter(**{f'{field}__gt': '', 'pk__gt': state.get(label, 0)})
+                .order_by('pk').values_list('pk', field).iterator(chunk_size=chunk_size))
+        missing, last_pk, count = [], None, 0
+        for pk, name in rows:
+            if not os.path.exists(os.path.join(root, name)):
+                missing.append((pk, name))
+            last_pk, count = pk, count + 1
+            if count == chunk_size:
+                state[label] = last_pk
+                yield model, field, missing
+                missing, count = [], 0
+        if count:
+            state[label] = last_pk
+            yield model, field, missing
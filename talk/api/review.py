@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import KidVoiceRecording
+
+
+def review_queue(doctor):
+    """
+    Unreviewed voice recordings of all the doctor's kids, oldest first.
+    Served by the (feedback_state, doctor, created_at) index.
+    """
+    return (KidVoiceRecording.objects.filter(feedback_state=False, doctor=doctor)
+            .order_by('created_at', 'id'))
+
+
+def claimable_q(now):
+    return Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=settings.REVIEW_CLAIM_TTL))
+
+
+def claim_recordings(doctor, reviewer, limit):
+    """
+    Claim up to ``limit`` of the oldest unclaimed recordings in the doctor's
+    queue for ``reviewer``. Rows locked by a concurrent claim are skipped on
+    backends supporting SKIP LOCKED; elsewhere the conditional update makes
+    sure a recording is never handed to two reviewers.
+    """
+    now = timezone.now()
+    queue = review_queue(doctor).filter(claimable_q(now))
+
+    with transaction.atomic(using=queue.db):
+        if connections[queue.db].features.has_select_for_update_skip_locked:
+            queue = queue.select_for_update(skip_locked=True)
+        ids = list(queue.values_list('id', flat=True)[:limit])
+        KidVoiceRecording.objects.filter(claimable_q(now), id__in=ids).update(claimed_by=reviewer, claimed_at=now)
+
+    return (KidVoiceRecording.objects.filter(id__in=ids, claimed_by=reviewer, claimed_at=now)
+            .select_related('week__kid').order_by('created_at', 'id'))
@@ -0,0 +1,144 @@
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+
+# drf_yasg is only imported when a schema or docs page is actually built (see api.docs)
+
+SCHEMA_FORMATS = {
+    '.json': 'application/json',
+    '.yaml': 'application/yaml',
+}
+
+# Sources whose changes can change the schema, relative to BASE_DIR
+SCHEMA_SOURCES = ('api/**/*.py', 'talk/**/*.py')
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="doctor and kid app",
+        default_version='v1',
+        description="API documentation for your Django project",
+        terms_of_service="https://www.example.com/policies/terms/",
+        contact=openapi.Contact(email="support@example.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    Version of the code the schema is generated from: API_CODE_VERSION when
+    the deployment sets it (e.g. the git commit), else a digest of the API
+    sources and the drf_yasg version.
+    """
+    if settings.API_CODE_VERSION:
+        return settings.API_CODE_VERSION
+    import drf_yasg
+
+    digest = hashlib.sha256(drf_yasg.__version__.encode())
+    for pattern in SCHEMA_SOURCES:
+        for path in sorted(glob.glob(os.path.join(settings.BASE_DIR, pattern), recursive=True)):
+            digest.update(os.path.relpath(path, settings.BASE_DIR).encode())
+            with open(path, 'rb') as source:
+                digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+def schema_path(fmt, version=None):
+    return os.path.join(settings.OPENAPI_SCHEMA_ROOT, f'openapi-{version or code_version()}{fmt}')
+
+
+def render_schema():
+    """
+    Introspect every API view once and return the encoded schema by format.
+    No request is involved, so clients resolve the API against the docs host.
+    """
+    from drf_yasg.app_settings import swagger_settings
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+
+    from .docs import apply_view_schemas
+
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(api_info())
+    apply_view_schemas()
+    schema = generator.get_schema(request=None, public=True)
+    codecs = {'.json': OpenAPICodecJson, '.yaml': OpenAPICodecYaml}
+    return {fmt: codecs[fmt](validators=[]).encode(schema) for fmt in SCHEMA_FORMATS}
+
+
+def write_atomically(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.openapi-')
+    try:
+        with os.fdopen(fd, 'wb') as destination:
+            destination.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def generate_schema_files(force=False):
+    """
+    Write the schema artifacts of the current code version, unless they
+    already exist, and remove those of other versions. Returns the paths
+    written.
+    """
+    version = code_version()
+    if not force and all(os.path.exists(schema_path(fmt, version)) for fmt in SCHEMA_FORMATS):
+        return []
+
+    written = []
+    for fmt, content in render_schema().items():
+        write_atomically(schema_path(fmt, version), content)
+        written.append(schema_path(fmt, version))
+    for path in glob.glob(os.path.join(settings.OPENAPI_SCHEMA_ROOT, 'openapi-*')):
+        if path not in written:
+            os.remove(path)
+    return written
+
+
+def read_schema_files():
+    """
+    The encoded schema of the current code version by format, from its
+    artifacts. Missing artifacts are generated; when they cannot be written
+    the schema is only returned.
+    """
+    try:
+        contents = {}
+        for fmt in SCHEMA_FORMATS:
+            with open(schema_path(fmt), 'rb') as artifact:
+                contents[fmt] = artifact.read()
+        return contents
+    except FileNotFoundError:
+        pass
+
+    contents = render_schema()
+    try:
+        for fmt, content in contents.items():
+            write_atomically(schema_path(fmt), content)
+    except OSError:
+        pass
+    return contents
+
+
+def load_schema(fmt):
+    """
+    ``(content, etag)`` of the schema in ``fmt``, read once per process.
+    """
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                _loaded.update((fmt, (content, f'"{hashlib.sha256(content).hexdigest()[:32]}"'))
+                               for fmt, content in read_schema_files().items())
+    return _loaded[fmt]
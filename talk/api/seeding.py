@@ -0,0 +1,98 @@
+import random
+from collections import Counter
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import invalidate_doctor_list
+from .models import Doctor, Feedback, Kid, KidVoiceRecording, Media, Week
+from .summaries import rebuild_recording_rollups, rebuild_week_summaries
+
+FIRST_NAMES = ['Sara', 'Omar', 'Lina', 'Khalid', 'Noura', 'Faisal', 'Huda', 'Yousef', 'Reem', 'Majed',
+               'Dana', 'Turki', 'Maha', 'Saad', 'Aseel', 'Nasser']
+LAST_NAMES = ['Alharbi', 'Alqahtani', 'Alghamdi', 'Alzahrani', 'Aldosari', 'Alotaibi', 'Alshehri', 'Almutairi']
+
+
+def next_value(model, field):
+    return (model.objects.aggregate(value=Max(field))['value'] or 0) + 1
+
+
+def generate_dataset(doctors, kids_per_doctor, recordings_per_week=2, feedback_ratio=0.5, batch_size=1000, seed=0):
+    """
+    Insert ``doctors`` doctors with ``kids_per_doctor`` kids each, their weeks,
+    4 pictures and a video per week, ``recordings_per_week`` voice recordings
+    per week and feedback on about ``feedback_ratio`` of them.
+
+    Everything is written with bulk inserts, a few hundred doctors' worth of
+    rows per transaction, after the largest existing ids and phone numbers,
+    so it can run on a non-empty database. Media rows only carry URLs; no
+    file is written. Returns the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    counts = Counter()
+    now = timezone.now()
+    job_id, doctor_phone = next_value(Doctor, 'job_id'), next_value(Doctor, 'phone')
+    k_id, kid_phone = next_value(Kid, 'k_id'), next_value(Kid, 'phone')
+    # Enough doctors per round for about batch_size kids
+    doctors_per_round = max(1, batch_size // max(kids_per_doctor, 1))
+
+    for first in range(0, doctors, doctors_per_round):
+        with transaction.atomic():
+            job_ids = [job_id + index for index in range(first, min(doctors, first + doctors_per_round))]
+            Doctor.objects.bulk_create([
+                Doctor(job_id=value, phone=doctor_phone + value - job_id, email=f'doctor{value}@example.com',
+                       dob=date(1970 + rng.randrange(25), rng.randrange(1, 13), rng.randrange(1, 29)),
+                       full_name=f'Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}')
+                for value in job_ids
+            ], batch_size=batch_size)
+            # Primary keys are read back, since not every backend returns them from bulk inserts
+            doctor_ids = list(Doctor.objects.filter(job_id__in=job_ids).values_list('id', flat=True))
+
+            kids = []
+            for doctor_id in doctor_ids:
+                for _ in range(kids_per_doctor):
+                    age = rng.randrange(4, 13)
+                    kids.append(Kid(k_id=k_id, phone=kid_phone, name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                                    dob=date(now.year - age, rng.randrange(1, 13), rng.randrange(1, 29)), age=age,
+                                    doctor_id=doctor_id))
+                    k_id += 1
+                    kid_phone += 1
+            Kid.objects.bulk_create(kids, batch_size=batch_size)
+            kids = list(Kid.objects.filter(k_id__in=[kid.k_id for kid in kids]).only('id', 'doctor_id'))
+            Week.objects.bulk_create([week for kid in kids for week in Week.initial_weeks(kid)], batch_size=batch_size)
+            weeks = list(Week.objects.filter(kid__in=kids).values_list('id', 'kid__doctor_id'))
+
+            media = []
+            recordings = []
+            for week_id, doctor_id in weeks:
+                media.extend(Media(week_id=week_id, kind='picture',
+                                   url=f'https://media.example.com/{week_id}/picture{index}.jpg')
+                             for index in range(4))
+                media.append(Media(week_id=week_id, kind='video', url=f'https://media.example.com/{week_id}/video.mp4'))
+                for index in range(recordings_per_week):
+                    recordings.append(KidVoiceRecording(
+                        week_id=week_id, doctor_id=doctor_id, media_type=('pictures', 'video')[index % 2],
+                        url=f'https://media.example.com/{week_id}/voice{index}.mp3',
+                        feedback_state=rng.random() < feedback_ratio,
+                        created_at=now - timedelta(minutes=rng.randrange(28 * 24 * 60)),
+                    ))
+            Media.objects.bulk_create(media, batch_size=batch_size)
+            KidVoiceRecording.objects.bulk_create(recordings, batch_size=batch_size)
+
+            reviewed = KidVoiceRecording.objects.filter(week_id__in=[week_id for week_id, _ in weeks], feedback_state=True)
+            # Reviewed within three days of the upload
+            feedback = [Feedback(voice_recording_id=voice_id, stars=rng.randrange(1, 6), note="Keep practicing!",
+                                 created_at=min(now, created_at + timedelta(minutes=rng.randrange(3 * 24 * 60))))
+                        for voice_id, created_at in reviewed.values_list('id', 'created_at')]
+            Feedback.objects.bulk_create(feedback, batch_size=batch_size)
+            rebuild_week_summaries([week_id for week_id, _ in weeks])
+            rebuild_recording_rollups([week_id for week_id, _ in weeks])
+
+        counts.update({'doctors': len(doctor_ids), 'kids': len(kids), 'weeks': len(weeks), 'media': len(media),
+                       'voice_recordings': len(recordings), 'feedback': len(feedback)})
+
+    # Bulk inserts skip the signals that drop cached doctor list pages (week summaries and rollups are rebuilt above)
+    invalidate_doctor_list()
+    return dict(counts)
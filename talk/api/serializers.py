@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from .models import Doctor, Kid, Week, Media, KidVoiceRecording, Feedback
+from django.conf import settings
+
+from .models import (
+    Doctor, Kid, Week, Media, KidVoiceRecording, Feedback, UploadSession, DerivativeJob, DirectUpload, media_kind,
+)
 
 
 class DoctorSerializer(serializers.ModelSerializer):
@@ -8,16 +12,40 @@ class DoctorSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class DoctorDirectorySerializer(DoctorSerializer):
+    """
+    Doctor serializer limited to the ``fields`` requested by the client.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class KidSerializer(serializers.ModelSerializer):
     class Meta:
         model = Kid
         fields = ['k_id', 'name', 'dob', 'phone', 'age', 'doctor']
 
 
+class KidEnrollmentSerializer(serializers.ModelSerializer):
+    # Uniqueness and doctors are checked for the whole batch at once, not per row
+    k_id = serializers.IntegerField()
+    phone = serializers.IntegerField()
+    doctor = serializers.IntegerField()
+
+    class Meta:
+        model = Kid
+        fields = ['k_id', 'name', 'dob', 'phone', 'age', 'doctor']
+
+
 class WeekSerializer(serializers.ModelSerializer):
     class Meta:
         model = Week
-        fields = '__all__'
+        # Not '__all__': the version counter only feeds the ETags
+        fields = ['id', 'kid', 'week_number']
 
 
 class MediaUploadSerializer(serializers.ModelSerializer):
@@ -47,11 +75,135 @@ class KidVoiceRecordingSerializer(serializers.ModelSerializer):
 class KidVoiceRecordingSaveSerializer(serializers.ModelSerializer):
     class Meta:
         model = KidVoiceRecording
-        fields = ['week', 'file', 'url', 'media_type', 'feedback_state']
-        read_only_fields = ['feedback_state']  # feedback_state should be read-only and default to False
+        fields = ['week', 'file', 'url', 'media_type', 'feedback_state', 'normalized_file', 'waveform']
+        read_only_fields = ['feedback_state', 'normalized_file', 'waveform']  # feedback_state should be read-only and default to False
 
 
 class FeedbackSerializer(serializers.ModelSerializer):
     class Meta:
         model = Feedback
         fields = ['voice_recording', 'stars', 'note']
+
+
+class FeedbackItemSerializer(serializers.ModelSerializer):
+    # Recordings are looked up for the whole batch at once, not per item
+    voice_id = serializers.IntegerField()
+
+    class Meta:
+        model = Feedback
+        fields = ['voice_id', 'stars', 'note']
+
+
+class KidFeedbackSerializer(serializers.ModelSerializer):
+    week_number = serializers.IntegerField(source='voice_recording.week.week_number', read_only=True)
+    media_type = serializers.CharField(source='voice_recording.media_type', read_only=True)
+    recording_url = serializers.CharField(source='voice_recording.url', read_only=True)
+
+    class Meta:
+        model = Feedback
+        fields = ['voice_recording', 'stars', 'note', 'created_at', 'week_number', 'media_type', 'recording_url']
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'week', 'target', 'media_type', 'filename', 'total_size', 'offset', 'expires_at']
+        read_only_fields = ['id', 'offset', 'expires_at']
+
+    def validate_total_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("total_size must be a positive number of bytes.")
+        return value
+
+    def validate(self, data):
+        if data['target'] == 'video' and media_kind(data['filename']) != 'video':
+            raise serializers.ValidationError({'filename': "You must upload a video file."})
+        if data['target'] == 'voice' and data.get('media_type') not in ['pictures', 'video']:
+            raise serializers.ValidationError({'media_type': "Invalid media_type. Must be 'pictures' or 'video'."})
+        return data
+
+
+class DirectUploadFileSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=200)
+    content_type = serializers.CharField(max_length=100, required=False)
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_size(self, value):
+        if value > settings.DIRECT_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Files can be at most {settings.DIRECT_UPLOAD_MAX_SIZE} bytes.")
+        return value
+
+
+class DirectUploadRequestSerializer(serializers.ModelSerializer):
+    files = DirectUploadFileSerializer(many=True)
+
+    class Meta:
+        model = DirectUpload
+        fields = ['week', 'target', 'media_type', 'files']
+
+    def validate(self, data):
+        filenames = [file['filename'] for file in data['files']]
+        if data['target'] == 'pictures' and (len(filenames) != 4 or
+                                             not all(media_kind(name) == 'picture' for name in filenames)):
+            raise serializers.ValidationError({'files': "You must upload exactly 4 pictures."})
+        if data['target'] == 'video' and (len(filenames) != 1 or media_kind(filenames[0]) != 'video'):
+            raise serializers.ValidationError({'files': "You must upload exactly 1 video file."})
+        if data['target'] == 'voice':
+            if len(filenames) != 1:
+                raise serializers.ValidationError({'files': "You must upload exactly 1 voice recording."})
+            if data.get('media_type') not in ['pictures', 'video']:
+                raise serializers.ValidationError({'media_type': "Invalid media_type. Must be 'pictures' or 'video'."})
+        return data
+
+
+class MediaDerivativeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Media
+        fields = ['id', 'derivative_state', 'preview']
+
+
+class KidVoiceRecordingDerivativeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = KidVoiceRecording
+        fields = ['id', 'derivative_state', 'normalized_file', 'waveform']
+
+
+class DashboardWeekSerializer(serializers.ModelSerializer):
+    picture_count = serializers.IntegerField(source='summary.picture_count', read_only=True)
+    has_video = serializers.BooleanField(source='summary.has_video', read_only=True)
+    media_complete = serializers.BooleanField(source='summary.media_complete', read_only=True)
+    pending_recordings = serializers.IntegerField(source='summary.pending_recordings', read_only=True)
+    reviewed_recordings = serializers.IntegerField(source='summary.reviewed_recordings', read_only=True)
+    average_stars = serializers.FloatField(source='summary.average_stars', read_only=True)
+
+    class Meta:
+        model = Week
+        fields = ['id', 'week_number', 'picture_count', 'has_video', 'media_complete',
+                  'pending_recordings', 'reviewed_recordings', 'average_stars']
+
+
+class DashboardKidSerializer(serializers.ModelSerializer):
+    weeks = DashboardWeekSerializer(many=True, read_only=True)
+    pending_recordings = serializers.SerializerMethodField()
+    reviewed_recordings = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Kid
+        fields = ['k_id', 'name', 'age', 'weeks', 'pending_recordings', 'reviewed_recordings']
+
+    def get_pending_recordings(self, kid):
+        return sum(week.summary.pending_recordings for week in kid.weeks.all())
+
+    def get_reviewed_recordings(self, kid):
+        return sum(week.summary.reviewed_recordings for week in kid.weeks.all())
+
+
+class ReviewQueueSerializer(serializers.ModelSerializer):
+    k_id = serializers.IntegerField(source='week.kid.k_id', read_only=True)
+    kid_name = serializers.CharField(source='week.kid.name', read_only=True)
+    week_number = serializers.IntegerField(source='week.week_number', read_only=True)
+
+    class Meta:
+        model = KidVoiceRecording
+        fields = ['id', 'k_id', 'kid_name', 'week', 'week_number', 'url', 'normalized_file', 'waveform', 'media_type',
+                  'created_at', 'claimed_by', 'claimed_at']
@@ -0,0 +1,159 @@
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Media players send Accept headers like ``video/*``; file views answer
+    with the file itself, so never reject a request during negotiation.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class FileRange:
+    """
+    Read-only view of ``length`` bytes of ``file`` starting at ``start``.
+
+    It keeps ``fileno()`` and ``tell()`` of the underlying file so a WSGI
+    ``file_wrapper`` (e.g. gunicorn) can hand the range to ``sendfile()``
+    using the response Content-Length, without the bytes entering Python.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive ``(start, end)`` of a single ``bytes=`` range, or None
+    when the header should be ignored (absent, malformed or multi-range).
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec:
+        return None
+    first, sep, last = spec.partition('-')
+    if not sep:
+        return None
+
+    try:
+        if first == '':
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def file_etag(stat, checksum=''):
+    if checksum:
+        return f'"{checksum}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def handoff_response(name, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SERVE_MODE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + name
+    else:
+        response['X-Sendfile'] = default_storage.path(name)
+    return response
+
+
+def serve_stored_file(request, name, checksum=''):
+    """
+    Serve the stored file ``name`` with Range/206 and ETag/Last-Modified
+    conditional support. The file is never read into memory by Django.
+    """
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        # Remote storages serve (and range) the object themselves
+        return HttpResponseRedirect(default_storage.url(name))
+
+    if settings.MEDIA_SERVE_MODE in ('x-accel-redirect', 'x-sendfile'):
+        return handoff_response(name, content_type)
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    etag = file_etag(stat, checksum)
+    last_modified = http_date(stat.st_mtime)
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        return conditional
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if if_range is None or if_range in (etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = stat.st_size
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = f'private, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    return response
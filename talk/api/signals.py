@@ -0,0 +1,78 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import doctor_profile_key, invalidate, invalidate_doctor_list, kid_profile_key
+from .derivatives import enqueue_derivative_job
+from .metrics import record_query
+from .summaries import rebuild_week_on_commit, record_voice_recording
+from .models import Doctor, Feedback, Kid, KidVoiceRecording, Media
+
+
+@receiver(post_save, sender=Media)
+@receiver(post_save, sender=KidVoiceRecording)
+def queue_derivatives(sender, instance, created, raw=False, **kwargs):
+    # Derivatives are built by the worker; the request only records the job
+    if created and not raw:
+        enqueue_derivative_job(instance)
+
+
+@receiver(post_save, sender=KidVoiceRecording)
+def count_voice_recording(sender, instance, created, raw=False, **kwargs):
+    # Runs inside the transaction KidVoiceRecording.save() opens
+    if created and not raw:
+        record_voice_recording(instance)
+
+
+@receiver(post_delete, sender=Media)
+@receiver(post_delete, sender=KidVoiceRecording)
+def recount_week(sender, instance, **kwargs):
+    rebuild_week_on_commit(instance.week_id)
+
+
+@receiver(post_delete, sender=Feedback)
+def recount_reviewed_week(sender, instance, **kwargs):
+    # Sent before the recording's own deletion when the feedback goes with it, so the row is still there
+    week_id = KidVoiceRecording.objects.filter(id=instance.voice_recording_id).values_list('week_id', flat=True).first()
+    if week_id is not None:
+        rebuild_week_on_commit(week_id)
+
+
+@receiver(pre_save, sender=Doctor)
+@receiver(pre_save, sender=Kid)
+def remember_cache_id(sender, instance, raw=False, **kwargs):
+    # The cache is keyed by job_id / k_id, which profile edits may change
+    if instance.pk and not raw:
+        field = 'job_id' if sender is Doctor else 'k_id'
+        instance._previous_cache_id = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def invalidate_doctor(sender, instance, using, **kwargs):
+    keys = doctor_profile_key(instance.job_id), doctor_profile_key(getattr(instance, '_previous_cache_id', None))
+
+    def invalidate_doctor_entries():
+        invalidate(*keys)
+        invalidate_doctor_list()
+
+    # After the commit: a read between an earlier invalidation and the commit would cache the old rows again
+    transaction.on_commit(invalidate_doctor_entries, using=using)
+
+
+@receiver(post_save, sender=Kid)
+@receiver(post_delete, sender=Kid)
+def invalidate_kid(sender, instance, using, **kwargs):
+    keys = kid_profile_key(instance.k_id), kid_profile_key(getattr(instance, '_previous_cache_id', None))
+    transaction.on_commit(partial(invalidate, *keys), using=using)
+
+
+@receiver(connection_created)
+def instrument_queries(sender, connection, **kwargs):
+    # Queries outside a request (commands, workers) pass through untimed
+    if settings.METRICS_ENABLED and record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
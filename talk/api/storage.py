@@ -0,0 +1,36 @@
+from botocore.exceptions import ClientError
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+
+class S3MediaStorage(S3Storage):
+    """
+    Media storage on any S3-compatible object store (AWS S3, MinIO, moto).
+    On top of the django-storages backend it hands out presigned PUT URLs and
+    looks objects up with HEAD, so clients can upload straight to the bucket.
+
+    Selected with ``MEDIA_STORAGE=s3``; needs ``django-storages[s3]``.
+    """
+
+    def presigned_put(self, name, content_type, expires_in):
+        key = self._normalize_name(clean_name(name))
+        return self.connection.meta.client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': self.bucket_name, 'Key': key, 'ContentType': content_type},
+            ExpiresIn=expires_in,
+            HttpMethod='PUT',
+        )
+
+    def head(self, name):
+        """
+        Return the ``size`` and ``etag`` of the stored object ``name``, or None
+        when it does not exist (yet).
+        """
+        key = self._normalize_name(clean_name(name))
+        try:
+            response = self.connection.meta.client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as error:
+            if error.response['ResponseMetadata']['HTTPStatusCode'] == 404:
+                return None
+            raise
+        return {'size': response['ContentLength'], 'etag': response['ETag'].strip('"')}
@@ -0,0 +1,207 @@
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, DurationField, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import KidVoiceRecording, Media, RecordingRollup, Week, WeekSummary
+from .versions import bump_week_versions
+
+SUMMARY_FIELDS = ['picture_count', 'video_count', 'picture_recordings', 'video_recordings', 'pending_recordings',
+                  'reviewed_recordings', 'feedback_count', 'stars_total']
+ROLLUP_FIELDS = ['recordings', 'reviewed', 'stars_total', 'review_time_total']
+
+# Weeks whose rows were deleted, rebuilt by the next commit of this thread
+_deleted = threading.local()
+
+
+def compute_week_summaries(week_ids):
+    """
+    Build (unsaved) summaries of the existing weeks among ``week_ids`` from
+    their media, voice recordings and feedback, with two grouped queries.
+    """
+    summaries = {week_id: WeekSummary(week_id=week_id, updated_at=timezone.now())
+                 for week_id in Week.objects.filter(id__in=week_ids).values_list('id', flat=True)}
+
+    media = Media.objects.filter(week_id__in=summaries).values('week_id').annotate(
+        picture_count=Count('id', filter=Q(kind='picture')),
+        video_count=Count('id', filter=Q(kind='video')),
+    )
+    recordings = (KidVoiceRecording.objects.filter(week_id__in=summaries).values('week_id').annotate(
+        picture_recordings=Count('id', filter=Q(media_type='pictures')),
+        video_recordings=Count('id', filter=Q(media_type='video')),
+        pending_recordings=Count('id', filter=Q(feedback_state=False)),
+        reviewed_recordings=Count('id', filter=Q(feedback_state=True)),
+        feedback_count=Count('feedback'),
+        stars_total=Sum('feedback__stars'),
+    ))
+    for row in list(media) + list(recordings):
+        summary = summaries[row.pop('week_id')]
+        for field, value in row.items():
+            setattr(summary, field, value or 0)
+    return list(summaries.values())
+
+
+def rebuild_week_summaries(week_ids):
+    """
+    Recompute the summaries of ``week_ids`` from scratch and upsert them.
+    Returns the number of summaries written.
+    """
+    summaries = compute_week_summaries(week_ids)
+    WeekSummary.objects.bulk_create(summaries, update_conflicts=True, unique_fields=['week'],
+                                    update_fields=SUMMARY_FIELDS + ['updated_at'])
+    return len(summaries)
+
+
+def compute_recording_rollups(week_ids):
+    """
+    Build (unsaved) rollups of the voice recordings of ``week_ids`` by media
+    type, aggregated by the database in one grouped query.
+    """
+    # Feedback dated before its recording (rows predating the timestamps) counts as reviewed at once
+    review_time = Case(When(feedback__created_at__gte=F('created_at'), then=F('feedback__created_at') - F('created_at')),
+                       default=Value(timedelta()), output_field=DurationField())
+    rows = (KidVoiceRecording.objects.filter(week_id__in=week_ids).values('week_id', 'media_type')
+            .order_by().annotate(recordings=Count('id'), reviewed=Count('feedback'),
+                                 stars_total=Sum('feedback__stars'), review_time_total=Sum(review_time)))
+    return [RecordingRollup(week_id=row['week_id'], media_type=row['media_type'], recordings=row['recordings'],
+                            reviewed=row['reviewed'], stars_total=row['stars_total'] or 0,
+                            review_time_total=row['review_time_total'] or timedelta(), updated_at=timezone.now())
+            for row in rows]
+
+
+def rebuild_recording_rollups(week_ids):
+    """
+    Recompute the recording rollups of ``week_ids`` from scratch, upsert them
+    and drop those of media types left without recordings. Returns the
+    number of rollups written.
+    """
+    rollups = compute_recording_rollups(week_ids)
+    RecordingRollup.objects.bulk_create(rollups, update_conflicts=True, unique_fields=['week', 'media_type'],
+                                        update_fields=ROLLUP_FIELDS + ['updated_at'])
+    stale = Q()
+    for rollup in rollups:
+        stale |= Q(week_id=rollup.week_id, media_type=rollup.media_type)
+    RecordingRollup.objects.filter(week_id__in=week_ids).exclude(stale).delete()
+    return len(rollups)
+
+
+def adjust_recording_rollup(week_id, media_type, **deltas):
+    """
+    Add ``deltas`` to the week's rollup of ``media_type`` with one UPDATE.
+    The first recording of a week and media type inserts the rollup with
+    zero counts before adding to it, so concurrent first recordings are
+    all counted.
+    """
+    rollups = RecordingRollup.objects.filter(week_id=week_id, media_type=media_type)
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    if not rollups.update(updated_at=timezone.now(), **increments):
+        RecordingRollup.objects.bulk_create([RecordingRollup(week_id=week_id, media_type=media_type)],
+                                            ignore_conflicts=True)
+        rollups.update(updated_at=timezone.now(), **increments)
+
+
+def adjust_week_summary(week_id, **deltas):
+    """
+    Add ``deltas`` to the counters of the week's summary with one UPDATE,
+    in the caller's transaction. A missing summary is rebuilt instead, which
+    already accounts for the change when the caller made it first.
+    """
+    updated = WeekSummary.objects.filter(week_id=week_id).update(
+        updated_at=timezone.now(), **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        rebuild_week_summaries([week_id])
+
+
+def set_week_media(week_id, media):
+    """
+    Record the media set that just replaced the week's media, in the
+    summary and the week's version.
+    """
+    bump_week_versions([week_id])
+    kinds = [row.kind for row in media]
+    updated = WeekSummary.objects.filter(week_id=week_id).update(
+        picture_count=kinds.count('picture'), video_count=kinds.count('video'), updated_at=timezone.now()
+    )
+    if not updated:
+        rebuild_week_summaries([week_id])
+
+
+def record_voice_recording(recording):
+    bump_week_versions([recording.week_id])
+    counter = 'video_recordings' if recording.media_type == 'video' else 'picture_recordings'
+    state = 'reviewed_recordings' if recording.feedback_state else 'pending_recordings'
+    adjust_week_summary(recording.week_id, **{counter: 1, state: 1})
+    adjust_recording_rollup(recording.week_id, recording.media_type, recordings=1,
+                            reviewed=int(recording.feedback_state))
+
+
+def record_feedback(feedback):
+    """
+    Move the recordings that just got ``feedback`` from pending to reviewed
+    and add their stars and review times, with one UPDATE per week and per
+    week and media type, and bump the versions of those weeks.
+    """
+    recordings = {recording_id: (week_id, media_type, created_at) for recording_id, week_id, media_type, created_at
+                  in KidVoiceRecording.objects.filter(id__in=[item.voice_recording_id for item in feedback])
+                  .values_list('id', 'week_id', 'media_type', 'created_at')}
+    weeks = defaultdict(lambda: [0, 0])
+    rollups = defaultdict(lambda: [0, 0, timedelta()])
+    for item in feedback:
+        week_id, media_type, created_at = recordings[item.voice_recording_id]
+        weeks[week_id][0] += 1
+        weeks[week_id][1] += item.stars
+        rollup = rollups[week_id, media_type]
+        rollup[0] += 1
+        rollup[1] += item.stars
+        rollup[2] += max(item.created_at - created_at, timedelta())
+    bump_week_versions(weeks)
+    for week_id, (count, stars) in weeks.items():
+        adjust_week_summary(week_id, pending_recordings=-count, reviewed_recordings=count, feedback_count=count,
+                            stars_total=stars)
+    for (week_id, media_type), (count, stars, review_time) in rollups.items():
+        adjust_recording_rollup(week_id, media_type, reviewed=count, stars_total=stars, review_time_total=review_time)
+
+
+def rebuild_week_on_commit(week_id):
+    """
+    Recompute the summary and recording rollups of ``week_id`` from its rows
+    once the current transaction commits. Deletions (admin, shell, cascades)
+    go through none of the paths adjusting the counters, so the weeks they
+    touch are rebuilt instead, once however many of their rows went.
+    """
+    if not hasattr(_deleted, 'week_ids'):
+        _deleted.week_ids = set()
+    _deleted.week_ids.add(week_id)
+    transaction.on_commit(rebuild_deleted_weeks)
+
+
+def rebuild_deleted_weeks():
+    # Weeks left by a rolled back transaction are rebuilt too, which is harmless
+    week_ids, _deleted.week_ids = _deleted.week_ids, set()
+    if not week_ids:
+        return
+    with transaction.atomic():
+        # Locked first, so counters adjusted by concurrent writes land on top of the rebuilt values
+        list(WeekSummary.objects.select_for_update().filter(week_id__in=week_ids).values_list('pk', flat=True))
+        list(RecordingRollup.objects.select_for_update().filter(week_id__in=week_ids).values_list('pk', flat=True))
+        bump_week_versions(week_ids)
+        rebuild_week_summaries(week_ids)
+        rebuild_recording_rollups(week_ids)
+
+
+def week_summaries(week_ids):
+    """
+    Summaries of ``week_ids`` by week id, building the missing ones (weeks
+    created before summaries existed). Unknown weeks are left out.
+    """
+    summaries = {summary.week_id: summary for summary in WeekSummary.objects.filter(week_id__in=week_ids)}
+    missing = set(week_ids) - set(summaries)
+    if missing:
+        with transaction.atomic():
+            rebuild_week_summaries(missing)
+        summaries.update((summary.week_id, summary) for summary in WeekSummary.objects.filter(week_id__in=missing))
+    return summaries
@@ -1,3 +1,505 @@
-from django.test import TestCase
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from array import array
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Q
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import review
+from .cache import doctor_list_version, doctor_profile_key, get_cache
+from .derivatives import complete_job, waveform_peaks
+from .feedback import ALREADY_REVIEWED, create_feedback_batch
+from .models import (
+    DerivativeJob, Doctor, Feedback, Kid, KidVoiceRecording, Media, PendingFileDeletion, RecordingRollup, UploadSession,
+    WeekSummary,
+)
+from .reconcile import scan_batches
+from .schema import render_schema
+from .serving import serve_stored_file
+from .summaries import compute_recording_rollups, compute_week_summaries
+from .uploads import UploadOffsetConflict, store_upload, write_upload_chunk
+
+try:
+    import boto3
+    from moto import mock_aws
+
+    from .storage import S3MediaStorage
+except ImportError:
+    mock_aws = None
+
+S3_OPTIONS = {
+    'bucket_name': 'media',
+    'region_name': 'us-east-1',
+    'access_key': 'testing',
+    'secret_key': 'testing',
+    'querystring_auth': False,
+    'file_overwrite': False,
+}
+
+
+@override_settings(UPLOAD_CHECKSUM_ALGORITHM='sha256')
+class S3StoreUploadTests(SimpleTestCase):
+    """
+    ``store_upload`` against an S3 bucket mocked by moto: the S3 backend reads
+    the upload instead of iterating ``chunks()``, and the recorded size and
+    checksum must still be those of the bytes stored.
+    """
+
+    def setUp(self):
+        if mock_aws is None:
+            self.skipTest("moto is not installed")
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket='media')
+        self.storage = S3MediaStorage(**S3_OPTIONS)
+        patcher = mock.patch('api.uploads.default_storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_size_and_checksum_of_stored_bytes(self):
+        content = b'\xff' * 5000 + b'\x00' * 3000
+        stored = store_upload(SimpleUploadedFile('a.jpg', content), 'media/')
+
+        self.assertEqual(stored.size, len(content))
+        self.assertEqual(stored.checksum, hashlib.sha256(content).hexdigest())
+        with self.storage.open(stored.name) as stored_file:
+            self.assertEqual(stored_file.read(), content)
+
+
+class WaveformPeaksTests(SimpleTestCase):
+    """
+    ``waveform_peaks`` gives the same peaks with and without NumPy, one per
+    slice of the recording, including a shorter last slice.
+    """
+
+    def pcm(self, samples):
+        values = array('h', samples)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values.tobytes()
+
+    def peaks_without_numpy(self, pcm, points):
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            return waveform_peaks(pcm, points)
+
+    def test_uneven_slices(self):
+        samples = [(index * 37) % 20000 - 10000 for index in range(8001)]
+        pcm = self.pcm(samples)
+        peaks = self.peaks_without_numpy(pcm, 200)
+
+        width = -(-len(samples) // 200)
+        self.assertEqual(len(peaks), -(-len(samples) // width))
+        self.assertEqual(peaks[-1], round(max(map(abs, samples[(len(peaks) - 1) * width:])) / 32768, 3))
+        if importlib.util.find_spec('numpy') is not None:
+            self.assertEqual(waveform_peaks(pcm, 200), peaks)
+
+    def test_fewer_samples_than_points(self):
+        pcm = self.pcm([100, -200, 300])
+        self.assertEqual(self.peaks_without_numpy(pcm, 200), [0.003, 0.006, 0.009])
+        self.assertEqual(waveform_peaks(pcm, 200), [0.003, 0.006, 0.009])
+
+
+@mock.patch('api.reconcile.SCAN_WINDOW_BATCHES', 2)
+class ScanBatchesTests(SimpleTestCase):
+    """
+    ``scan_batches`` streams directories larger than its window in name
+    order and resumes after the last batch processed.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'a', 'b'))
+        self.names = [f'top{index}' for index in range(2)] + [f'a/f{index:02}' for index in range(20)] + ['a/b/g']
+        for name in self.names:
+            open(os.path.join(self.root, name), 'w').close()
+
+    def scan(self, state, stop=None):
+        names = []
+        for count, (batch, paths) in enumerate(scan_batches(self.root, state, 3)):
+            if count == stop:
+                break
+            names.extend(batch)
+        return names
+
+    def test_names_in_order_across_windows(self):
+        state = {'done': [], 'current': None, 'after': None}
+        self.assertEqual(self.scan(state), ['top0', 'top1'] + self.names[2:])
+        self.assertEqual(state, {'done': ['', 'a', 'a/b'], 'current': None, 'after': None})
+
+    def test_resume_after_the_last_batch_processed(self):
+        state = {'done': [], 'current': None, 'after': None}
+        first = self.scan(state, stop=5)
+        self.assertEqual(state, {'done': [''], 'current': 'a', 'after': 'a/f11'})
+        self.assertEqual(first[-3:], ['a/f09', 'a/f10', 'a/f11'])
+        self.assertEqual(first + self.scan(state), self.names)
+
+
+def create_kid(job_id=1, k_id=1):
+    doctor = Doctor.objects.create(job_id=job_id, phone=job_id, email=f'doctor{job_id}@example.com', dob='1980-01-01',
+                                   full_name=f'Dr. {job_id}')
+    return Kid.objects.create(k_id=k_id, name=f'Kid {k_id}', dob='2015-01-01', phone=1000 + k_id, age=9, doctor=doctor)
+
+
+class TemporaryMediaMixin:
+    """
+    Points MEDIA_ROOT and RESUMABLE_UPLOAD_ROOT at temporary directories.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for setting in ('MEDIA_ROOT', 'RESUMABLE_UPLOAD_ROOT'):
+            directory = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+            override = override_settings(**{setting: directory})
+            override.enable()
+            self.addCleanup(override.disable)
+
+
+@override_settings(MEDIA_SERVE_MODE='sendfile')
+class ServeStoredFileTests(TemporaryMediaMixin, SimpleTestCase):
+    content = b'0123456789'
+
+    def setUp(self):
+        super().setUp()
+        with open(os.path.join(settings.MEDIA_ROOT, 'a.mp4'), 'wb') as file:
+            file.write(self.content)
+
+    def get(self, **headers):
+        response = serve_stored_file(RequestFactory().get('/', **headers), 'a.mp4', 'abc')
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_single_range(self):
+        response = self.get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(self.body(response), b'2345')
+
+    def test_suffix_range(self):
+        response = self.get(HTTP_RANGE='bytes=-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+        self.assertEqual(self.body(response), b'789')
+
+    def test_unsatisfiable_range(self):
+        for header in ('bytes=10-', 'bytes=-0', 'bytes=5-2'):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range_mismatch_serves_the_whole_file(self):
+        response = self.get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+        response = self.get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"abc"')
+        self.assertEqual(response.status_code, 206)
+
+
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='', DEBUG=False)
+    def test_not_served_without_a_token_outside_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS_ENABLED=False, METRICS_TOKEN='secret')
+    def test_not_served_when_disabled(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret', DEBUG=False)
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+
+class UploadSessionTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.week = create_kid().weeks.first()
+        self.session = UploadSession.objects.create(week=self.week, target='video', filename='a.mp4', total_size=10)
+
+    def put(self, content, **headers):
+        return self.client.put(f'/api/uploads/{self.session.id}/', content, content_type='application/octet-stream',
+                               **headers)
+
+    def test_content_range_must_match_the_body(self):
+        response = self.put(b'hello', HTTP_CONTENT_RANGE='bytes 0-8/10')
+        self.assertEqual(response.status_code, 400)
+        response = self.put(b'helloworld!', HTTP_CONTENT_RANGE='bytes 0-10/10')
+        self.assertEqual(response.status_code, 400)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.offset, 0)
+
+    def test_chunk_at_a_stale_offset_conflicts(self):
+        self.assertEqual(write_upload_chunk(self.session, io.BytesIO(b'hello'), 0, 5), 5)
+        with self.assertRaises(UploadOffsetConflict) as conflict:
+            write_upload_chunk(self.session, io.BytesIO(b'HELLO'), 0, 5)
+        self.assertEqual(conflict.exception.offset, 5)
+        with open(self.session.partial_path, 'rb') as partial:
+            self.assertEqual(partial.read(), b'hello')
+
+    def test_finalize_checks_size_and_records_checksum(self):
+        self.put(b'helloworld', HTTP_CONTENT_RANGE='bytes 0-9/10')
+        with open(self.session.partial_path, 'r+b') as partial:
+            partial.truncate(7)
+
+        response = self.client.post(f'/api/uploads/{self.session.id}/finalize/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '7')
+
+        self.put(b'rld', HTTP_UPLOAD_OFFSET='7')
+        response = self.client.post(f'/api/uploads/{self.session.id}/finalize/')
+        self.assertEqual(response.status_code, 201)
+        media = Media.objects.get(week=self.week)
+        self.assertEqual((media.size, media.checksum), (10, hashlib.sha256(b'helloworld').hexdigest()))
+        self.assertFalse(UploadSession.objects.exists())
+
+
+class ConcurrentChunkTests(TemporaryMediaMixin, TransactionTestCase):
+    def test_chunks_at_the_same_offset_are_serialized(self):
+        week = create_kid().weeks.first()
+        session = UploadSession.objects.create(week=week, target='video', filename='a.mp4', total_size=10)
+        started, release = threading.Event(), threading.Event()
+
+        class SlowStream(io.BytesIO):
+            def read(self, size=-1):
+                started.set()
+                release.wait(5)
+                return super().read(size)
+
+        results = {}
+
+        def write(label, stream):
+            try:
+                results[label] = write_upload_chunk(session, stream, 0, 5)
+            except UploadOffsetConflict as conflict:
+                results[label] = conflict
+            finally:
+                connection.close()
+
+        slow = threading.Thread(target=write, args=('slow', SlowStream(b'hello')))
+        slow.start()
+        started.wait(5)
+        fast = threading.Thread(target=write, args=('fast', io.BytesIO(b'HELLO')))
+        fast.start()
+        fast.join(0.2)
+        # The second writer waits for the lock instead of writing over the first
+        self.assertTrue(fast.is_alive())
+        release.set()
+        slow.join(5)
+        fast.join(5)
+
+        self.assertEqual(results['slow'], 5)
+        self.assertIsInstance(results['fast'], UploadOffsetConflict)
+        with open(session.partial_path, 'rb') as partial:
+            self.assertEqual(partial.read(), b'hello')
+
+
+def create_recording(week, media_type='pictures', name='a.wav'):
+    return KidVoiceRecording.objects.create(week=week, file=f'voice/{name}', url=f'/media/voice/{name}',
+                                            feedback_state=False, media_type=media_type)
+
+
+class ReviewClaimTests(TestCase):
+    def setUp(self):
+        self.kid = create_kid()
+        week = self.kid.weeks.first()
+        self.recordings = [create_recording(week, name=f'{index}.wav') for index in range(3)]
+
+    def test_claims_do_not_overlap(self):
+        first = list(review.claim_recordings(self.kid.doctor, 'alice', 2))
+        second = list(review.claim_recordings(self.kid.doctor, 'bob', 2))
+
+        self.assertEqual(first, self.recordings[:2])
+        self.assertEqual(second, self.recordings[2:])
+        self.assertEqual(list(review.claim_recordings(self.kid.doctor, 'carol', 2)), [])
+
+    def test_stale_read_does_not_steal_a_claim(self):
+        claimed = list(review.claim_recordings(self.kid.doctor, 'alice', 3))
+        calls, claimable = [], review.claimable_q
+
+        def claimable_q(now):
+            # The queue is read as a concurrent claim saw it before alice's update
+            calls.append(now)
+            return Q() if len(calls) == 1 else claimable(now)
+
+        with mock.patch('api.review.claimable_q', claimable_q):
+            self.assertEqual(list(review.claim_recordings(self.kid.doctor, 'bob', 3)), [])
+        self.assertEqual(len(claimed), 3)
+        self.assertEqual(set(KidVoiceRecording.objects.values_list('claimed_by', flat=True)), {'alice'})
+
+
+class FeedbackBatchTests(TestCase):
+    def setUp(self):
+        week = create_kid().weeks.first()
+        self.recordings = [create_recording(week, name=f'{index}.wav') for index in range(2)]
+
+    def items(self, *recordings):
+        return [{'voice_id': recording.id, 'stars': 4, 'note': 'Good'} for recording in recordings]
+
+    def test_reviewed_recording_is_a_conflict(self):
+        feedback, errors, conflicts = create_feedback_batch(self.items(self.recordings[0]))
+        self.assertEqual((len(feedback), errors, conflicts), (1, {}, {}))
+
+        feedback, errors, conflicts = create_feedback_batch(self.items(*self.recordings))
+        self.assertEqual([item.voice_recording_id for item in feedback], [self.recordings[1].id])
+        self.assertEqual(conflicts, {0: ALREADY_REVIEWED})
+        self.assertEqual(Feedback.objects.count(), 2)
+
+    def test_review_after_validation_is_a_conflict(self):
+        items = self.items(self.recordings[0])
+        accepted = {0: {'voice_id': self.recordings[0].id, 'stars': 4, 'note': 'Good'}}
+        create_feedback_batch(items)
+
+        # Validated before the first batch committed: the re-check under the row lock reports it
+        with mock.patch('api.feedback.validate_feedback', return_value=(accepted, {}, {})):
+            feedback, errors, conflicts = create_feedback_batch(items)
+        self.assertEqual((feedback, conflicts), ([], {0: ALREADY_REVIEWED}))
+        self.assertEqual(Feedback.objects.count(), 1)
+
+
+class WeekSummaryTests(TestCase):
+    def setUp(self):
+        self.week = create_kid().weeks.first()
+
+    def assertSummaryMatchesRows(self):
+        summary = WeekSummary.objects.get(week=self.week)
+        expected, = compute_week_summaries([self.week.id])
+        for field in ('picture_count', 'video_count', 'picture_recordings', 'video_recordings',
+                      'pending_recordings', 'reviewed_recordings', 'feedback_count', 'stars_total'):
+            self.assertEqual(getattr(summary, field), getattr(expected, field), field)
+        return summary
+
+    def test_counts_after_replacing_media(self):
+        urls = [f'/media/media/{index}.jpg' for index in range(4)]
+        response = self.client.post('/api/media/pictures/save/', {'week': self.week.id, 'url': urls})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.assertSummaryMatchesRows().picture_count, 4)
+
+        response = self.client.post('/api/media/video/save/', {'week': self.week.id, 'url': '/media/media/a.mp4'})
+        self.assertEqual(response.status_code, 201)
+        summary = self.assertSummaryMatchesRows()
+        self.assertEqual((summary.picture_count, summary.video_count), (0, 1))
+
+    def test_counts_after_recordings_and_feedback(self):
+        recordings = [create_recording(self.week, media_type, f'{index}.wav')
+                      for index, media_type in enumerate(['pictures', 'pictures', 'video'])]
+        create_feedback_batch([{'voice_id': recordings[0].id, 'stars': 5, 'note': 'Great'}])
+
+        summary = self.assertSummaryMatchesRows()
+        self.assertEqual((summary.pending_recordings, summary.reviewed_recordings, summary.stars_total), (2, 1, 5))
+
+
+    def test_counts_after_deleting_rows(self):
+        recordings = [create_recording(self.week, media_type, f'{index}.wav')
+                      for index, media_type in enumerate(['pictures', 'video'])]
+        create_feedback_batch([{'voice_id': recording.id, 'stars': 4, 'note': 'Good'} for recording in recordings])
+        Media.objects.create(week=self.week, file='media/a.jpg', kind='picture')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recordings[0].delete()
+            Feedback.objects.filter(voice_recording=recordings[1]).delete()
+            Media.objects.filter(week=self.week).delete()
+        summary = self.assertSummaryMatchesRows()
+        self.assertEqual((summary.picture_count, summary.video_recordings, summary.feedback_count), (0, 1, 0))
+        rollup = RecordingRollup.objects.get(week=self.week)
+        self.assertEqual((rollup.media_type, rollup.recordings, rollup.reviewed, rollup.stars_total), ('video', 1, 0, 0))
+
+
+class ConditionalWeekListTests(TestCase):
+    def test_not_modified_until_a_write(self):
+        kid = create_kid()
+        url = f'/api/kid/{kid.id}/weeks/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        create_recording(kid.weeks.first())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unknown_kid_has_no_etag(self):
+        response = self.client.get('/api/kid/999/weeks/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class RecordingRollupTests(TestCase):
+    def test_totals_match_the_recordings(self):
+        kid = create_kid()
+        first, second = kid.weeks.order_by('week_number')[:2]
+        recordings = [create_recording(first, 'pictures', 'a.wav'), create_recording(first, 'video', 'b.wav'),
+                      create_recording(second, 'pictures', 'c.wav')]
+        create_feedback_batch([{'voice_id': recordings[0].id, 'stars': 5, 'note': 'Great'},
+                               {'voice_id': recordings[2].id, 'stars': 2, 'note': 'Again'}])
+
+        stored = {(rollup.week_id, rollup.media_type): (rollup.recordings, rollup.reviewed, rollup.stars_total)
+                  for rollup in RecordingRollup.objects.all()}
+        expected = {(rollup.week_id, rollup.media_type): (rollup.recordings, rollup.reviewed, rollup.stars_total)
+                    for rollup in compute_recording_rollups([first.id, second.id])}
+        self.assertEqual(stored, expected)
+
+        response = self.client.get(f'/api/analytics/kid/{kid.id}/')
+        overall = response.json()['data']['overall']
+        self.assertEqual((overall['recordings'], overall['reviewed'], overall['average_stars']), (3, 2, 3.5))
+        self.assertEqual(overall['completion_rate'], 0.667)
+
+
+class CacheInvalidationTests(TestCase):
+    def test_doctor_entries_are_dropped_on_commit(self):
+        doctor = create_kid().doctor
+        key = doctor_profile_key(doctor.job_id)
+        get_cache().set(key, {'job_id': doctor.job_id})
+        version = doctor_list_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.full_name = 'Dr. Renamed'
+            doctor.save()
+            # Still cached until the commit, when no read can see the old row anymore
+            self.assertIsNotNone(get_cache().get(key))
+        self.assertIsNone(get_cache().get(key))
+        self.assertNotEqual(doctor_list_version(), version)
+
+
+class OpenAPISchemaTests(SimpleTestCase):
+    def test_recorded_view_schemas_are_applied(self):
+        if not settings.API_DOCS_ENABLED:
+            self.skipTest("the API docs are disabled")
+        schema = json.loads(render_schema()['.json'])
+        parameters = schema['paths']['/api/kid/{kid_id}/weeks/']['get']['parameters']
+        self.assertIn({'name': 'kid_id', 'in': 'query', 'description': "Kid's ID", 'type': 'integer'}, parameters)
+
+
+class CompleteJobTests(TestCase):
+    def test_derivative_of_a_deleted_media_is_queued_for_deletion(self):
+        media = Media.objects.create(week=create_kid().weeks.first(), file='media/a.jpg', url='/media/media/a.jpg',
+                                     kind='picture')
+        job = DerivativeJob.objects.get(media=media)
+        job.media  # Loaded as the worker has it when the build finishes
+        media.delete()
+
+        complete_job(job, 'previews/a.jpg')
+        self.assertTrue(PendingFileDeletion.objects.filter(name='previews/a.jpg').exists())
@@ -0,0 +1,341 @@
+import fcntl
+import hashlib
+import os
+import posixpath
+import re
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .deletions import schedule_file_deletion
+from .models import Media, UploadSession, default_upload_expiry
+from .summaries import set_week_media
+
+
+StoredUpload = namedtuple('StoredUpload', ['name', 'url', 'size', 'checksum'])
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+class UploadOffsetConflict(Exception):
+    """
+    Raised when a chunk does not start at the session's current ``offset``,
+    because another chunk landed first.
+    """
+
+    def __init__(self, offset):
+        super().__init__(f"The upload session is at offset {offset}.")
+        self.offset = offset
+
+
+class IncompleteUploadError(Exception):
+    """
+    Raised when a session's partial file does not hold ``total_size`` bytes;
+    ``size`` is the offset to resume the upload from.
+    """
+
+    def __init__(self, size):
+        super().__init__(f"The partial file holds {size} bytes.")
+        self.size = size
+
+
+class HashingFile(File):
+    """
+    Wraps an uploaded file so that every byte the storage backend pulls
+    through ``chunks()`` or ``read()`` also feeds the running size and
+    checksum. Bytes read again after a rewind (e.g. an S3 retry) are only
+    counted once.
+
+    The wrapper deliberately hides ``temporary_file_path()`` so storages
+    always stream the bytes through us instead of moving the temp file.
+    """
+
+    def __init__(self, uploaded_file, chunk_size=None):
+        super().__init__(uploaded_file, name=uploaded_file.name)
+        self.chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+        self.hasher = hashlib.new(settings.UPLOAD_CHECKSUM_ALGORITHM)
+        self.bytes_written = 0
+
+    def read(self, size=-1):
+        start = self.file.tell()
+        data = self.file.read(size)
+        # Only the bytes past those already hashed are new
+        if start <= self.bytes_written < start + len(data):
+            unseen = data[self.bytes_written - start:]
+            self.hasher.update(unseen)
+            self.bytes_written += len(unseen)
+        return data
+
+    def chunks(self, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        self.seek(0)
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    @property
+    def checksum(self):
+        return self.hasher.hexdigest()
+
+
+def absolute_media_url(request, name):
+    url = default_storage.url(name)
+    if request is not None and url.startswith('/'):
+        url = request.build_absolute_uri(url)
+    return url
+
+
+def store_upload(uploaded_file, upload_to, request=None, chunk_size=None):
+    """
+    Stream ``uploaded_file`` once into its final storage path under
+    ``upload_to`` and return the stored name, public URL, size and checksum.
+    """
+    content = HashingFile(uploaded_file, chunk_size)
+    name = default_storage.generate_filename(posixpath.join(upload_to, posixpath.basename(uploaded_file.name)))
+    name = default_storage.save(name, content)
+    return StoredUpload(name, absolute_media_url(request, name), content.bytes_written, content.checksum)
+
+
+def store_uploads(uploaded_files, upload_to, request=None):
+    """
+    Store several uploads with ``store_upload``. If one fails, the files
+    already written are queued for deletion before the error is re-raised.
+    """
+    stored = []
+    try:
+        for uploaded_file in uploaded_files:
+            stored.append(store_upload(uploaded_file, upload_to, request))
+    except Exception:
+        schedule_file_deletion([upload.name for upload in stored])
+        raise
+    return stored
+
+
+def media_fields(stored, kind=None):
+    return {'file': stored.name, 'url': stored.url, 'size': stored.size, 'checksum': stored.checksum, 'kind': kind}
+
+
+def replace_week_media(week, new_media):
+    """
+    Swap the media set of ``week`` for rows built from the ``new_media`` field
+    dicts, whose files must already be in storage. The old rows are deleted
+    and the new ones created in one transaction, which also queues the old
+    files for deferred deletion, so the week is never seen without media,
+    and records the new media counts in the week summary. Returns the
+    created rows.
+    """
+    try:
+        with transaction.atomic():
+            old_media = list(Media.objects.select_for_update().filter(week=week).values_list('id', 'file', 'preview'))
+            Media.objects.filter(id__in=[media_id for media_id, _, _ in old_media]).delete()
+            # Created one by one so post_save still queues their derivatives
+            created = [Media.objects.create(week=week, **fields) for fields in new_media]
+            set_week_media(week.id, created)
+            schedule_file_deletion([name for _, file, preview in old_media for name in (file, preview)])
+    except Exception:
+        schedule_file_deletion([fields.get('file') for fields in new_media])
+        raise
+    return created
+
+
+def create_from_upload(model, uploaded_file, request=None, **fields):
+    """
+    Store ``uploaded_file`` under the ``upload_to`` of ``model.file`` and create
+    the row pointing at the stored name, so the FileField never writes it again.
+    """
+    upload_to = model._meta.get_field('file').upload_to
+    stored = store_upload(uploaded_file, upload_to, request)
+    return model.objects.create(
+        file=stored.name,
+        url=stored.url,
+        size=stored.size,
+        checksum=stored.checksum,
+        **fields
+    )
+
+
+async def acreate_from_upload(model, uploaded_file, request=None, **fields):
+    """
+    Async variant of ``create_from_upload``: the storage write runs in a
+    worker thread so the event loop is never blocked on disk I/O.
+    """
+    stored = await astore_upload(uploaded_file, model._meta.get_field('file').upload_to, request)
+    return await model.objects.acreate(
+        file=stored.name,
+        url=stored.url,
+        size=stored.size,
+        checksum=stored.checksum,
+        **fields
+    )
+
+
+async def astore_upload(uploaded_file, upload_to, request=None, chunk_size=None):
+    return await sync_to_async(store_upload, thread_sensitive=False)(uploaded_file, upload_to, request, chunk_size)
+
+
+def parse_chunk_offset(request):
+    """
+    Return ``(start, end, total)`` for a chunk PUT from its ``Content-Range``
+    header, falling back to ``Upload-Offset``. ``end`` and ``total`` are None
+    when not given.
+    """
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = CONTENT_RANGE_RE.match(content_range.strip())
+        if not match:
+            raise ValueError("Malformed Content-Range header.")
+        start, end, total = match.groups()
+        if int(end) < int(start):
+            raise ValueError("Malformed Content-Range header.")
+        return int(start), int(end), None if total == '*' else int(total)
+    upload_offset = request.headers.get('Upload-Offset')
+    if upload_offset is None or not upload_offset.isdigit():
+        raise ValueError("A Content-Range or Upload-Offset header is required.")
+    return int(upload_offset), None, None
+
+
+def open_locked_partial_file(session, flags, mode):
+    """
+    Open the session's partial file with ``flags`` and take an exclusive
+    ``flock`` on it, released when the file is closed. The chunk writes and
+    the finalize of one session thus run one at a time across workers,
+    without holding a database transaction during the file I/O.
+    """
+    partial = os.fdopen(os.open(session.partial_path, flags, 0o600), mode)
+    try:
+        fcntl.flock(partial, fcntl.LOCK_EX)
+    except BaseException:
+        partial.close()
+        raise
+    return partial
+
+
+def current_offset(session):
+    """
+    The session's offset as stored now, raising ``UploadSession.DoesNotExist``
+    once it was finalized or expired.
+    """
+    offset = UploadSession.objects.active().filter(id=session.id).values_list('offset', flat=True).first()
+    if offset is None:
+        raise UploadSession.DoesNotExist
+    return offset
+
+
+def write_upload_chunk(session, stream, start, length, chunk_size=None):
+    """
+    Write ``length`` bytes from ``stream`` into the session's partial file at
+    ``start``, record the new offset and return it. Bytes already stored are
+    never read. Raises ``UploadOffsetConflict`` when the session is no longer
+    at ``start`` and ``UploadSession.DoesNotExist`` when it is gone.
+    """
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    os.makedirs(settings.RESUMABLE_UPLOAD_ROOT, exist_ok=True)
+    with open_locked_partial_file(session, os.O_WRONLY | os.O_CREAT, 'wb') as destination:
+        # Re-read under the lock: a chunk written while we waited moved the offset
+        try:
+            offset = current_offset(session)
+        except UploadSession.DoesNotExist:
+            # The file was moved by finalize or swept; drop any we just created
+            try:
+                os.remove(session.partial_path)
+            except FileNotFoundError:
+                pass
+            raise
+        if offset != start:
+            raise UploadOffsetConflict(offset)
+
+        destination.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = stream.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            destination.write(chunk)
+            remaining -= len(chunk)
+        # Drop anything left behind by an interrupted chunk past this point
+        destination.truncate()
+        offset = destination.tell()
+        UploadSession.objects.filter(id=session.id).update(offset=offset, expires_at=default_upload_expiry())
+        return offset
+
+
+def move_into_storage(path, name):
+    """
+    Move the local file at ``path`` into storage as ``name``. On the local
+    filesystem this is a rename, otherwise the file is streamed once.
+    """
+    try:
+        default_storage.path(name)
+    except NotImplementedError:
+        with open(path, 'rb') as source:
+            name = default_storage.save(name, File(source, name=name))
+        os.remove(path)
+        return name
+
+    name = default_storage.get_available_name(name)
+    destination = default_storage.path(name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    file_move_safe(path, destination)
+    return name
+
+
+def file_checksum(source, chunk_size=None):
+    hasher = hashlib.new(settings.UPLOAD_CHECKSUM_ALGORITHM)
+    for chunk in iter(lambda: source.read(chunk_size or settings.UPLOAD_CHUNK_SIZE), b''):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def finalize_upload_session(session, model, request=None):
+    """
+    Check that a completed session's file holds all of its bytes, checksum
+    it and move it under the ``upload_to`` of ``model.file``, then return the
+    stored upload. The session row is deleted once the file is in place.
+    Raises ``IncompleteUploadError`` when the file size does not match the
+    session and ``UploadSession.DoesNotExist`` when it was finalized or
+    expired meanwhile.
+    """
+    try:
+        partial = open_locked_partial_file(session, os.O_RDONLY, 'rb')
+    except FileNotFoundError:
+        current_offset(session)
+        raise IncompleteUploadError(0)
+
+    with partial:
+        current_offset(session)
+        size = os.fstat(partial.fileno()).st_size
+        if size != session.total_size:
+            # An overlong file is rewritten from the start
+            raise IncompleteUploadError(size if size < session.total_size else 0)
+
+        # The one extra read of the upload: a running hash cannot be carried
+        # between chunk requests (hashlib state is not serializable and chunks
+        # can land on any worker), and the file was just written locally, so
+        # it is read back sequentially, mostly from the page cache
+        checksum = file_checksum(partial)
+        upload_to = model._meta.get_field('file').upload_to
+        name = default_storage.generate_filename(posixpath.join(upload_to, posixpath.basename(session.filename)))
+        name = move_into_storage(session.partial_path, name)
+        UploadSession.objects.filter(id=session.id).delete()
+    return StoredUpload(name, absolute_media_url(request, name), size, checksum)
+
+
+def purge_expired_upload_sessions(limit=100):
+    """
+    Delete up to ``limit`` expired sessions and their partial files.
+    """
+    expired = list(UploadSession.objects.expired()[:limit])
+    for session in expired:
+        try:
+            os.remove(session.partial_path)
+        except FileNotFoundError:
+            pass
+    UploadSession.objects.filter(pk__in=[session.pk for session in expired]).delete()
+    return len(expired)
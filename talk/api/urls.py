@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import *
 
@@ -5,8 +6,12 @@ urlpatterns = [
     path('doctor/register/', DoctorCreateView.as_view(), name='doctor-register'),
     path('doctor/login/', DoctorLoginView.as_view(), name='doctor-login'),
     path('kid/register/', KidCreateView.as_view(), name='kid-register'),
+    path('kid/bulk-register/', KidBulkCreateView.as_view(), name='kid-bulk-register'),
     path('kid/login/', KidLoginView.as_view(), name='kid-login'),
     path('doctor/kids/', DoctorKidsListView.as_view(), name='doctor-kids-list'),
+    path('doctor/<int:job_id>/dashboard/', DoctorDashboardView.as_view(), name='doctor-dashboard'),
+    path('doctor/<int:job_id>/review-queue/', ReviewQueueView.as_view(), name='review-queue'),
+    path('doctor/<int:job_id>/review-queue/claim/', ReviewQueueClaimView.as_view(), name='review-queue-claim'),
     path('kid/<int:kid_id>/weeks/', KidWeekListView.as_view(), name='kid-week-list'),
 
     # New endpoints for pictures and video uploads and saves
@@ -19,14 +24,45 @@ urlpatterns = [
     path('voice/save/', KidVoiceRecordingSaveView.as_view(), name='voice-save'),
 
     path('feedback/create/<int:voice_id>/', DoctorFeedbackCreateView.as_view(), name='doctor-feedback-create'),
+    path('feedback/batch/', DoctorFeedbackBatchCreateView.as_view(), name='doctor-feedback-batch'),
 
     # Updated endpoint for doctor to view voice recordings by week_id in URL
     path('doctor/voice-records/<int:week_id>/', DoctorVoiceRecordsListView.as_view(), name='doctor-voice-records'),
 
     path('media/list/<int:week_id>/', KidMediaListView.as_view(), name='kid-media-list'),
     path('doctors/', DoctorListView.as_view(), name='doctor-list'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
     path('feedback/kid/<int:kid_id>/', KidFeedbackListView.as_view(), name='kid-feedback-list'),
 
     path('doctor/profile/<int:job_id>/edit/', DoctorProfileEditView.as_view(), name='doctor-profile-edit'),
     path('kid/profile/<int:k_id>/edit/', KidProfileEditView.as_view(), name='kid-profile-edit'),
+
+    # Resumable uploads for week videos and voice recordings
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('uploads/<uuid:upload_id>/', UploadSessionDetailView.as_view(), name='upload-session-detail'),
+    path('uploads/<uuid:upload_id>/finalize/', UploadSessionFinalizeView.as_view(), name='upload-session-finalize'),
+
+    # Direct uploads to object storage with presigned URLs
+    path('uploads/direct/', DirectUploadCreateView.as_view(), name='direct-upload-create'),
+    path('uploads/direct/<uuid:batch_id>/complete/', DirectUploadCompleteView.as_view(), name='direct-upload-complete'),
+
+    # Status of the background derivatives built for uploaded files
+    path('media/<int:media_id>/derivatives/', MediaDerivativeStatusView.as_view(), name='media-derivatives'),
+    path('voice/<int:voice_id>/derivatives/', KidVoiceRecordingDerivativeStatusView.as_view(), name='voice-derivatives'),
+
+    # Range-aware file serving, authorized against the owning week
+    path('media/<int:media_id>/file/', MediaFileView.as_view(), name='media-file'),
+    path('voice/<int:voice_id>/file/', KidVoiceRecordingFileView.as_view(), name='voice-file'),
+
+    # Review analytics served from the recording rollups
+    path('analytics/kid/<int:kid_id>/', KidProgressView.as_view(), name='kid-progress'),
+    path('analytics/doctor/<int:job_id>/', DoctorCaseloadView.as_view(), name='doctor-caseload'),
 ]
+
+if settings.API_ASYNC_VIEWS:
+    from .async_views import ASYNC_VIEWS
+
+    urlpatterns = [
+        path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name) if pattern.name in ASYNC_VIEWS else pattern
+        for pattern in urlpatterns
+    ]
@@ -0,0 +1,64 @@
+from django.db.models import F
+from django.utils.cache import get_conditional_response
+
+from .models import Kid, Week
+
+
+def bump_week_versions(week_ids):
+    """
+    Mark the weeks ``week_ids`` and their kids as changed, with one UPDATE
+    each, in the caller's transaction.
+    """
+    week_ids = list(week_ids)
+    if not week_ids:
+        return
+    Week.objects.filter(id__in=week_ids).update(version=F('version') + 1)
+    Kid.objects.filter(weeks__id__in=week_ids).update(version=F('version') + 1)
+
+
+def week_version(week_id):
+    # Primary key lookup of the counter alone; None for an unknown week
+    return Week.objects.filter(id=week_id).values_list('version', flat=True).first()
+
+
+def kid_version(kid_id):
+    return Kid.objects.filter(id=kid_id).values_list('version', flat=True).first()
+
+
+async def aweek_version(week_id):
+    return await Week.objects.filter(id=week_id).values_list('version', flat=True).afirst()
+
+
+async def akid_version(kid_id):
+    return await Kid.objects.filter(id=kid_id).values_list('version', flat=True).afirst()
+
+
+def version_etag(resource, object_id, version):
+    """
+    Strong ETag of ``resource`` (the URL name) of a kid or week at
+    ``version``, or None when the kid or week does not exist.
+    """
+    if version is None:
+        return None
+    return f'"{resource}-{object_id}-{version}"'
+
+
+def not_modified(request, etag):
+    """
+    The 304 response when the request's If-None-Match matches ``etag``,
+    else None. Read the version before the data it describes: a write in
+    between then only costs the client one more full response.
+    """
+    if etag is None:
+        return None
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        with_etag(response, etag)
+    return response
+
+
+def with_etag(response, etag):
+    # Clients may keep the response but must revalidate it before every use
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
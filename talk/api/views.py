@@ -1,12 +1,41 @@
-import os
-from django.core.files.storage import default_storage
+import csv
+import json
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
 from .serializers import *
-from talk import settings
+from .models import media_kind
+from .analytics import doctor_caseload, kid_progress
+from .cache import cache_stats, cached, doctor_list_key, doctor_profile_key, kid_profile_key
+from .direct_uploads import (
+    complete_direct_uploads, create_direct_uploads, direct_uploads_supported, purge_expired_direct_uploads,
+)
+from .docs import openapi, swagger_auto_schema
+from .enrollment import enroll_kids, format_errors, read_kids_csv
+from .feedback import create_feedback_batch, format_conflicts
+from .metrics import render_metrics
+from .pagination import DoctorCursorPagination, FeedbackCursorPagination
+from .review import claim_recordings, review_queue
+from .schema import SCHEMA_FORMATS, load_schema
+from .serving import IgnoreClientContentNegotiation, serve_stored_file
+from .summaries import record_feedback, week_summaries
+from .uploads import (
+    IncompleteUploadError, UploadOffsetConflict, create_from_upload, finalize_upload_session, media_fields,
+    parse_chunk_offset, purge_expired_upload_sessions, replace_week_media, store_uploads, write_upload_chunk,
+)
+from .versions import kid_version, not_modified, version_etag, week_version, with_etag
 
 
 # Utility function to format responses
@@ -18,13 +47,139 @@ def format_response(status_value, message, data=None):
     }
 
 
-# Utility function to delete media files for a week
-def delete_existing_media(week):
-    media_files = Media.objects.filter(week=week)
-    for media_file in media_files:
-        if media_file.file and default_storage.exists(media_file.file.name):
-            default_storage.delete(media_file.file.name)
-    media_files.delete()
+# Utility function to expose cursor pagination links without changing the response body
+def pagination_headers(paginator):
+    links = []
+    for rel, link in (('next', paginator.get_next_link()), ('prev', paginator.get_previous_link())):
+        if link:
+            links.append(f'<{link}>; rel="{rel}"')
+    return {'Link': ', '.join(links)} if links else {}
+
+
+# Utility function to parse a `limit` parameter, capped at `maximum`; None when invalid
+def parse_limit(value, default, maximum=100):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return None
+    return min(limit, maximum) if limit > 0 else None
+
+
+# Utility function to parse a `since` query parameter given as an ISO 8601 date or datetime
+def parse_since(value):
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            moment = datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+# Utility function loading a week's pictures and video behind its summary
+def week_media(week_id):
+    """
+    Return ``(summary, pictures, video)`` of a week. The media rows are only
+    loaded when the summary says the week is complete; summary is None when
+    the week does not exist.
+    """
+    summary = week_summaries([week_id]).get(week_id)
+    if summary is None or not summary.media_complete:
+        return summary, [], []
+    media = Media.objects.filter(week_id=week_id, kind__in=['picture', 'video']).order_by('id').values_list('kind', 'url')
+    return summary, [url for kind, url in media if kind == 'picture'], [url for kind, url in media if kind == 'video']
+
+
+# Utility function to serve a week's stored file to the kid or doctor owning the week
+def serve_week_file(request, queryset, file_field, checksum_field=None):
+    k_id = request.GET.get('k_id')
+    job_id = request.GET.get('job_id')
+    if not k_id and not job_id:
+        return Response(format_response(False, "k_id or job_id is required."), status=status.HTTP_400_BAD_REQUEST)
+
+    fields = [file_field, 'week__kid__k_id', 'week__kid__doctor__job_id']
+    if checksum_field:
+        fields.append(checksum_field)
+    row = queryset.values(*fields).first()
+    if row is None or not row[file_field]:
+        return Response(format_response(False, "File not found."), status=status.HTTP_404_NOT_FOUND)
+
+    if str(row['week__kid__k_id']) != k_id and str(row['week__kid__doctor__job_id']) != job_id:
+        return Response(format_response(False, "You do not have access to this week."), status=status.HTTP_403_FORBIDDEN)
+
+    response = serve_stored_file(request, row[file_field], row[checksum_field] if checksum_field else '')
+    if response is None:
+        return Response(format_response(False, "File not found."), status=status.HTTP_404_NOT_FOUND)
+    return response
+
+
+# Utility functions building the cached login payloads; None when the doctor or kid does not exist
+def doctor_profile(job_id):
+    doctor = Doctor.objects.filter(job_id=job_id).first()
+    return dict(DoctorSerializer(doctor).data) if doctor else None
+
+
+def kid_profile(k_id):
+    kid = Kid.objects.filter(k_id=k_id).first()
+    return dict(KidSerializer(kid).data) if kid else None
+
+
+# Utility functions of the doctor directory: `q` prefix search, `fields` sparse fieldsets and NDJSON export
+DOCTOR_DIRECTORY_FIELDS = tuple(DoctorSerializer().fields)
+
+
+def parse_doctor_directory_params(params):
+    """
+    Return ``(q, fields, export)`` from the query parameters, or raise
+    ValueError with the message to send back.
+    """
+    q = params.get('q', '').strip()
+    fields = DOCTOR_DIRECTORY_FIELDS
+    if params.get('fields'):
+        fields = tuple(dict.fromkeys(name.strip() for name in params['fields'].split(',') if name.strip()))
+        if not fields or not set(fields) <= set(DOCTOR_DIRECTORY_FIELDS):
+            raise ValueError(f"fields must be a comma separated list of: {', '.join(DOCTOR_DIRECTORY_FIELDS)}.")
+    export = params.get('export')
+    if export not in (None, 'ndjson'):
+        raise ValueError("Invalid export. Must be 'ndjson'.")
+    return q, fields, export
+
+
+def doctor_directory(q):
+    doctors = Doctor.objects.order_by(*DoctorCursorPagination.ordering)
+    return doctors.filter(full_name__istartswith=q) if q else doctors
+
+
+def doctor_directory_page(request, q, fields):
+    """
+    Build one cursor page of the directory for the DRF ``request``, cached per
+    query until a doctor changes. Raises NotFound for an invalid cursor.
+    """
+    def build():
+        paginator = DoctorCursorPagination()
+        # The cursor position is read from full_name and id, so they are always loaded
+        doctors = doctor_directory(q).only(*set(fields) | {'full_name', 'id'})
+        page = paginator.paginate_queryset(doctors, request)
+        data = DoctorDirectorySerializer(page, many=True, fields=fields).data
+        return {'data': [dict(doctor) for doctor in data], 'headers': pagination_headers(paginator)}
+
+    key = doctor_list_key(request.get_host(), q, fields, request.query_params.get('cursor'),
+                          request.query_params.get('limit'))
+    return cached(key, 'doctor_list', build)
+
+
+def doctor_directory_rows(q, fields):
+    # One JSON object per line, read from a server-side chunked iterator so the directory is never held in memory
+    rows = doctor_directory(q).values(*fields).iterator(chunk_size=settings.DOCTOR_EXPORT_CHUNK_SIZE)
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
 
 
 # 1- Doctor Registration View
@@ -50,12 +205,12 @@ class DoctorLoginView(APIView):
         if not job_id:
             return Response(format_response(False, "job_id is required."), status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            doctor = Doctor.objects.get(job_id=job_id)
-            serializer = DoctorSerializer(doctor)
-            return Response(format_response(True, "Login successful.", serializer.data), status=status.HTTP_200_OK)
-        except Doctor.DoesNotExist:
+        data = None
+        if str(job_id).isdigit():
+            data = cached(doctor_profile_key(job_id), 'doctor_profile', lambda: doctor_profile(job_id))
+        if data is None:
             return Response(format_response(False, "Doctor with job_id not found."), status=status.HTTP_404_NOT_FOUND)
+        return Response(format_response(True, "Login successful.", data), status=status.HTTP_200_OK)
 
 
 # 3- Kid Registration View
@@ -81,12 +236,12 @@ class KidLoginView(APIView):
         if not k_id:
             return Response(format_response(False, "k_id is required."), status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            kid = Kid.objects.get(k_id=k_id)
-            serializer = KidSerializer(kid)
-            return Response(format_response(True, "Login successful.", serializer.data), status=status.HTTP_200_OK)
-        except Kid.DoesNotExist:
+        data = None
+        if str(k_id).isdigit():
+            data = cached(kid_profile_key(k_id), 'kid_profile', lambda: kid_profile(k_id))
+        if data is None:
             return Response(format_response(False, "Kid with id not found."), status=status.HTTP_404_NOT_FOUND)
+        return Response(format_response(True, "Login successful.", data), status=status.HTTP_200_OK)
 
 
 # Doctor Views:
@@ -120,11 +275,17 @@ class DoctorKidsListView(APIView):
 class KidWeekListView(APIView):
     @swagger_auto_schema(manual_parameters=[openapi.Parameter('kid_id', openapi.IN_QUERY, description="Kid's ID", type=openapi.TYPE_INTEGER)])
     def get(self, request, kid_id):
+        etag = version_etag('kid-week-list', kid_id, kid_version(kid_id))
+        cached_response = not_modified(request, etag)
+        if cached_response is not None:
+            return cached_response
+
         try:
             weeks = Week.objects.filter(kid_id=kid_id)
             serializer = WeekSerializer(weeks, many=True)
-            return Response(format_response(True, "Weeks fetched successfully.", serializer.data),
-                            status=status.HTTP_200_OK)
+            response = Response(format_response(True, "Weeks fetched successfully.", serializer.data),
+                                status=status.HTTP_200_OK)
+            return with_etag(response, etag) if etag else response
         except Kid.DoesNotExist:
             return Response(format_response(False, "Kid not found."), status=status.HTTP_404_NOT_FOUND)
 
@@ -138,24 +299,17 @@ class PicturesUploadView(APIView):
     def post(self, request, week_id):
         pictures = request.FILES.getlist('file')
 
-        if len(pictures) != 4 or not all([file.name.endswith(('jpg', 'jpeg', 'png')) for file in pictures]):
+        if len(pictures) != 4 or not all([media_kind(file.name) == 'picture' for file in pictures]):
             return Response(format_response(False, "You must upload exactly 4 pictures."),
                             status=status.HTTP_400_BAD_REQUEST)
 
         try:
             week = Week.objects.get(id=week_id)
-            delete_existing_media(week)
-
-            urls = []
-            for picture in pictures:
-                file_path = os.path.join(settings.MEDIA_ROOT, picture.name)
-                with open(file_path, 'wb+') as destination:
-                    for chunk in picture.chunks():
-                        destination.write(chunk)
 
-                url = request.scheme + '://' + request.get_host() + settings.MEDIA_URL + picture.name
-                Media.objects.create(week=week, file=picture, url=url)
-                urls.append(url)
+            # The new pictures are stored before the week's current media is replaced
+            stored = store_uploads(pictures, Media._meta.get_field('file').upload_to, request)
+            replace_week_media(week, [media_fields(upload, 'picture') for upload in stored])
+            urls = [upload.url for upload in stored]
 
             return Response(format_response(True, "Pictures uploaded successfully.", {"urls": urls}),
                             status=status.HTTP_200_OK)
@@ -173,18 +327,15 @@ class PicturesSaveView(APIView):
         week_id = request.data.get('week')
         urls = request.data.getlist('url')
 
-        if len(urls) != 4 or not all([url.endswith(('jpg', 'jpeg', 'png')) for url in urls]):
+        if len(urls) != 4 or not all([media_kind(url) == 'picture' for url in urls]):
             return Response(format_response(False, "You must provide exactly 4 picture URLs."),
                             status=status.HTTP_400_BAD_REQUEST)
 
         try:
             week = Week.objects.get(id=week_id)
-            # Delete any existing pictures for this week
-            delete_existing_media(week)
 
-            # Save new picture URLs
-            for url in urls:
-                Media.objects.create(week=week, url=url)
+            # Replace any existing media of this week with the new picture URLs
+            replace_week_media(week, [{'url': url, 'kind': 'picture'} for url in urls])
 
             return Response(format_response(True, "Pictures saved successfully."),
                             status=status.HTTP_201_CREATED)
@@ -202,23 +353,18 @@ class VideoUploadView(APIView):
     def post(self, request, week_id):
         video = request.FILES.get('file')
 
-        if not video or not video.name.endswith(('mp4', 'avi', 'mov')):
+        if not video or media_kind(video.name) != 'video':
             return Response(format_response(False, "You must upload exactly 1 video file."),
                             status=status.HTTP_400_BAD_REQUEST)
 
         try:
             week = Week.objects.get(id=week_id)
-            delete_existing_media(week)
 
-            file_path = os.path.join(settings.MEDIA_ROOT, video.name)
-            with open(file_path, 'wb+') as destination:
-                for chunk in video.chunks():
-                    destination.write(chunk)
+            # The new video is stored before the week's current media is replaced
+            stored = store_uploads([video], Media._meta.get_field('file').upload_to, request)
+            media, = replace_week_media(week, [media_fields(upload, 'video') for upload in stored])
 
-            url = request.scheme + '://' + request.get_host() + settings.MEDIA_URL + video.name
-            Media.objects.create(week=week, file=video, url=url)
-
-            return Response(format_response(True, "Video uploaded successfully.", {"url": url}),
+            return Response(format_response(True, "Video uploaded successfully.", {"url": media.url}),
                             status=status.HTTP_200_OK)
 
         except Week.DoesNotExist:
@@ -234,17 +380,15 @@ class VideoSaveView(APIView):
         week_id = request.data.get('week')
         url = request.data.get('url')
 
-        if not url.endswith(('mp4', 'avi', 'mov')):
+        if media_kind(url) != 'video':
             return Response(format_response(False, "You must provide a valid video URL."),
                             status=status.HTTP_400_BAD_REQUEST)
 
         try:
             week = Week.objects.get(id=week_id)
-            # Delete any existing video for this week
-            delete_existing_media(week)
 
-            # Save new video URL
-            Media.objects.create(week=week, url=url)
+            # Replace any existing media of this week with the new video URL
+            replace_week_media(week, [{'url': url, 'kind': 'video'}])
 
             return Response(format_response(True, "Video saved successfully."),
                             status=status.HTTP_201_CREATED)
@@ -276,19 +420,11 @@ class KidVoiceRecordingUploadView(APIView):
             except Week.DoesNotExist:
                 return Response(format_response(False, "Week with id not found."), status=status.HTTP_404_NOT_FOUND)
 
-            # Save the voice file in the MEDIA_ROOT
-            file_path = os.path.join(settings.MEDIA_ROOT, voice_file.name)
-            with open(file_path, 'wb+') as destination:
-                for chunk in voice_file.chunks():
-                    destination.write(chunk)
-
-            # Generate the URL for the file
-            url = request.scheme + '://' + request.get_host() + settings.MEDIA_URL + voice_file.name
+            # Stream the voice file once into storage and save the recording
+            voice_recording = create_from_upload(KidVoiceRecording, voice_file, request, week=week,
+                                                 feedback_state=False, media_type=media_type)
 
-            # Save the voice recording
-            KidVoiceRecording.objects.create(week=week, file=voice_file, url=url, feedback_state=False, media_type=media_type)
-
-            return Response(format_response(True, "Voice recording uploaded successfully.", {'url': url}),
+            return Response(format_response(True, "Voice recording uploaded successfully.", {'url': voice_recording.url}),
                             status=status.HTTP_200_OK)
         return Response(format_response(False, "Invalid data.", serializer.errors),
                         status=status.HTTP_400_BAD_REQUEST)
@@ -351,11 +487,18 @@ class DoctorFeedbackCreateView(APIView):
             # Validate the serializer
             serializer = FeedbackSerializer(data=data)
             if serializer.is_valid():
-                feedback = serializer.save()
-
-                # Update the feedback_state to prevent multiple feedback
-                voice_recording.feedback_state = True
-                voice_recording.save()
+                with transaction.atomic():
+                    # Re-check under the row lock so a concurrent review gets the same answer, not an error
+                    reviewed = not KidVoiceRecording.objects.select_for_update().filter(
+                        id=voice_recording.id, feedback_state=False).exists()
+                    if reviewed or Feedback.objects.filter(voice_recording_id=voice_recording.id).exists():
+                        return Response(format_response(False, "Feedback has already been provided for this voice recording."),
+                                        status=status.HTTP_400_BAD_REQUEST)
+                    feedback = serializer.save()
+
+                    # Update the feedback_state to prevent multiple feedback, without rewriting the whole row
+                    KidVoiceRecording.objects.filter(id=voice_recording.id).update(feedback_state=True)
+                    record_feedback([feedback])
 
                 return Response(
                     format_response(True, "Feedback added successfully.", FeedbackSerializer(feedback).data),
@@ -376,20 +519,24 @@ class DoctorVoiceRecordsListView(APIView):
         ]
     )
     def get(self, request, week_id):
-        try:
-            week = Week.objects.get(id=week_id)
-            voice_records = KidVoiceRecording.objects.filter(week=week)
+        version = week_version(week_id)
+        if version is None:
+            return Response(format_response(False, "Week with id not found."), status=status.HTTP_404_NOT_FOUND)
+        etag = version_etag('doctor-voice-records', week_id, version)
+        cached_response = not_modified(request, etag)
+        if cached_response is not None:
+            return cached_response
 
-            if not voice_records.exists():
-                return Response(format_response(False, "No voice recordings found for this week."),
-                                status=status.HTTP_404_NOT_FOUND)
+        voice_records = KidVoiceRecording.objects.filter(week_id=week_id)
 
-            serializer = KidVoiceRecordingSaveSerializer(voice_records, many=True)
-            return Response(format_response(True, "Voice records fetched successfully.", serializer.data),
-                            status=status.HTTP_200_OK)
+        if not voice_records.exists():
+            return Response(format_response(False, "No voice recordings found for this week."),
+                            status=status.HTTP_404_NOT_FOUND)
 
-        except Week.DoesNotExist:
-            return Response(format_response(False, "Week with id not found."), status=status.HTTP_404_NOT_FOUND)
+        serializer = KidVoiceRecordingSaveSerializer(voice_records, many=True)
+        response = Response(format_response(True, "Voice records fetched successfully.", serializer.data),
+                            status=status.HTTP_200_OK)
+        return with_etag(response, etag)
 
 
 # 13- Kid gets pictures and video for the week using week_id
@@ -397,78 +544,133 @@ class KidMediaListView(APIView):
     @swagger_auto_schema(
         manual_parameters=[openapi.Parameter('week_id', openapi.IN_QUERY, description="Week ID", type=openapi.TYPE_INTEGER)]
     )
-    def get(self, request):
-        week_id = request.GET.get('week_id')
+    def get(self, request, week_id=None):
+        week_id = week_id or request.GET.get('week_id')
         if not week_id:
             return Response(format_response(False, "week_id is required."), status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            week = Week.objects.get(id=week_id)
-            media_files = Media.objects.filter(week=week)
-
-            if not media_files.exists():
-                return Response(format_response(False, "No media found for this week."), status=status.HTTP_404_NOT_FOUND)
-
-            # Separate pictures and video
-            pictures = [media.url for media in media_files if media.file.name.endswith(('jpg', 'jpeg', 'png'))]
-            video = [media.url for media in media_files if media.file.name.endswith(('mp4', 'avi', 'mov'))]
-
-            # Check if there are exactly 4 pictures and 1 video
-            if len(pictures) == 4 and len(video) == 1:
-                response_data = {
-                    "pictures": pictures,
-                    "video": video[0]
-                }
-                return Response(format_response(True, "Media files fetched successfully.", response_data),
-                                status=status.HTTP_200_OK)
-            else:
-                return Response(format_response(False, "The week must contain exactly 4 pictures and 1 video."),
-                                status=status.HTTP_400_BAD_REQUEST)
+            week_id = int(week_id)
+            version = week_version(week_id)
+        except ValueError:
+            version = None
+        if version is None:
+            return Response(format_response(False, "Week with id not found."), status=status.HTTP_404_NOT_FOUND)
+        etag = version_etag('kid-media-list', week_id, version)
+        cached_response = not_modified(request, etag)
+        if cached_response is not None:
+            return cached_response
 
-        except Week.DoesNotExist:
+        summary, pictures, video = week_media(week_id)
+        if summary is None:
             return Response(format_response(False, "Week with id not found."), status=status.HTTP_404_NOT_FOUND)
 
+        # The week summary answers the completeness check without loading the media rows
+        if not summary.picture_count and not summary.video_count:
+            return Response(format_response(False, "No media found for this week."), status=status.HTTP_404_NOT_FOUND)
+
+        # Check if there are exactly 4 pictures and 1 video
+        if summary.media_complete:
+            response_data = {
+                "pictures": pictures,
+                "video": video[0]
+            }
+            response = Response(format_response(True, "Media files fetched successfully.", response_data),
+                                status=status.HTTP_200_OK)
+            return with_etag(response, etag)
+        return Response(format_response(False, "The week must contain exactly 4 pictures and 1 video."),
+                        status=status.HTTP_400_BAD_REQUEST)
+
 
 # 14- List all doctors for kid registration
 class DoctorListView(APIView):
     @swagger_auto_schema(
-        operation_description="Retrieve a list of doctors",
+        operation_description="Retrieve a page of doctors ordered by name",
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Prefix of the doctor's full name", type=openapi.TYPE_STRING),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the Link header of the previous page",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Page size", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('export', openapi.IN_QUERY, description="'ndjson' to stream every matching doctor",
+                              type=openapi.TYPE_STRING),
+        ],
         responses={200: DoctorSerializer(many=True)}
     )
     def get(self, request):
-        doctors = Doctor.objects.all()
-        serializer = DoctorSerializer(doctors, many=True)
+        try:
+            q, fields, export = parse_doctor_directory_params(request.query_params)
+        except ValueError as error:
+            return Response(format_response(False, str(error)), status=status.HTTP_400_BAD_REQUEST)
+
+        if export:
+            return StreamingHttpResponse(doctor_directory_rows(q, fields), content_type='application/x-ndjson')
+
+        try:
+            page = doctor_directory_page(request, q, fields)
+        except NotFound:
+            return Response(format_response(False, "Invalid cursor."), status=status.HTTP_400_BAD_REQUEST)
+
         return Response({
             "status": True,
             "message": "Doctors fetched successfully.",
-            "data": serializer.data
-        }, status=status.HTTP_200_OK)
+            "data": page['data']
+        }, status=status.HTTP_200_OK, headers=page['headers'])
 
 
 # 15- List of the voices feedbacks
 class KidFeedbackListView(APIView):
-    @swagger_auto_schema(responses={200: FeedbackSerializer(many=True)})
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('week', openapi.IN_QUERY, description="Week number", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('media_type', openapi.IN_QUERY, description="'pictures' or 'video'", type=openapi.TYPE_STRING),
+            openapi.Parameter('since', openapi.IN_QUERY, description="Only feedback created at or after this ISO 8601 time",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the Link header of the previous page",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Page size", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: KidFeedbackSerializer(many=True)}
+    )
     def get(self, request, kid_id):
-        # Get all voice recordings for the kid
-        voice_recordings = KidVoiceRecording.objects.filter(week__kid__k_id=kid_id)
+        # Feedback is the root of a single join, so the page costs one query however many recordings exist
+        feedback = Feedback.objects.filter(voice_recording__week__kid__k_id=kid_id).select_related('voice_recording__week')
 
-        feedback_list = []
-        for voice_recording in voice_recordings:
-            try:
-                # Try to get the associated feedback
-                feedback = voice_recording.feedback
-                feedback_data = FeedbackSerializer(feedback).data
-                feedback_list.append(feedback_data)
-            except Feedback.DoesNotExist:
-                continue  # Skip if no feedback exists for this voice recording
-
-        if feedback_list:
-            return Response(format_response(True, "Feedback fetched successfully.", feedback_list),
-                            status=status.HTTP_200_OK)
-        else:
+        week_number = request.GET.get('week')
+        if week_number:
+            if not week_number.isdigit():
+                return Response(format_response(False, "week must be a week number."), status=status.HTTP_400_BAD_REQUEST)
+            feedback = feedback.filter(voice_recording__week__week_number=week_number)
+
+        media_type = request.GET.get('media_type')
+        if media_type:
+            if media_type not in ['pictures', 'video']:
+                return Response(format_response(False, "Invalid media_type. Must be 'pictures' or 'video'."),
+                                status=status.HTTP_400_BAD_REQUEST)
+            feedback = feedback.filter(voice_recording__media_type=media_type)
+
+        since = request.GET.get('since')
+        if since:
+            since_value = parse_since(since)
+            if since_value is None:
+                return Response(format_response(False, "since must be an ISO 8601 date or datetime."),
+                                status=status.HTTP_400_BAD_REQUEST)
+            feedback = feedback.filter(created_at__gte=since_value)
+
+        paginator = FeedbackCursorPagination()
+        try:
+            page = paginator.paginate_queryset(feedback, request, view=self)
+        except NotFound:
+            return Response(format_response(False, "Invalid cursor."), status=status.HTTP_400_BAD_REQUEST)
+
+        if not page and not request.GET.get('cursor'):
             return Response(format_response(False, "No feedback found for this kid."),
                             status=status.HTTP_404_NOT_FOUND)
 
+        return Response(format_response(True, "Feedback fetched successfully.", KidFeedbackSerializer(page, many=True).data),
+                        status=status.HTTP_200_OK, headers=pagination_headers(paginator))
+
 
 # 16- Doctor Profile Edit View
 class DoctorProfileEditView(APIView):
@@ -503,4 +705,424 @@ class KidProfileEditView(APIView):
             return Response(format_response(True, "Kid profile updated successfully.", serializer.data),
                             status=status.HTTP_200_OK)
         return Response(format_response(False, "Error updating profile.", serializer.errors),
-                        status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+                        status=status.HTTP_400_BAD_REQUEST)
+
+
+# 18- Resumable uploads: open a session for a week video or a voice recording
+class UploadSessionCreateView(APIView):
+    @swagger_auto_schema(request_body=UploadSessionSerializer)
+    def post(self, request):
+        # Stale sessions are swept whenever a new one is opened
+        purge_expired_upload_sessions()
+
+        serializer = UploadSessionSerializer(data=request.data)
+        if serializer.is_valid():
+            session = serializer.save()
+            return Response(format_response(True, "Upload session created.", UploadSessionSerializer(session).data),
+                            status=status.HTTP_201_CREATED, headers={'Upload-Offset': session.offset})
+        return Response(format_response(False, "Error creating upload session.", serializer.errors),
+                        status=status.HTTP_400_BAD_REQUEST)
+
+
+# 19- Resumable uploads: query the current offset and append byte ranges
+class UploadSessionDetailView(APIView):
+    @swagger_auto_schema(responses={200: UploadSessionSerializer})
+    def get(self, request, upload_id):
+        try:
+            session = UploadSession.objects.active().get(id=upload_id)
+        except UploadSession.DoesNotExist:
+            return Response(format_response(False, "Upload session not found or expired."),
+                            status=status.HTTP_404_NOT_FOUND)
+
+        return Response(format_response(True, "Upload session fetched successfully.", UploadSessionSerializer(session).data),
+                        status=status.HTTP_200_OK, headers={'Upload-Offset': session.offset})
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('Content-Range', openapi.IN_HEADER, description="bytes <start>-<end>/<total>", type=openapi.TYPE_STRING),
+            openapi.Parameter('Upload-Offset', openapi.IN_HEADER, description="Offset of the chunk when Content-Range is not sent", type=openapi.TYPE_INTEGER),
+        ]
+    )
+    def put(self, request, upload_id):
+        try:
+            start, end, total = parse_chunk_offset(request)
+        except ValueError as error:
+            return Response(format_response(False, str(error)), status=status.HTTP_400_BAD_REQUEST)
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+
+        try:
+            session = UploadSession.objects.active().get(id=upload_id)
+        except UploadSession.DoesNotExist:
+            return Response(format_response(False, "Upload session not found or expired."),
+                            status=status.HTTP_404_NOT_FOUND)
+
+        if total is not None and total != session.total_size:
+            return Response(format_response(False, "Total size does not match the upload session."),
+                            status=status.HTTP_400_BAD_REQUEST)
+        if end is not None and (end - start + 1 != length or end >= session.total_size):
+            return Response(format_response(False, "Content-Range does not match the chunk length or the upload size."),
+                            status=status.HTTP_400_BAD_REQUEST)
+        if start != session.offset:
+            return Response(format_response(False, "Chunk offset does not match the upload session.", {'offset': session.offset}),
+                            status=status.HTTP_409_CONFLICT, headers={'Upload-Offset': session.offset})
+        if not length or start + length > session.total_size:
+            return Response(format_response(False, "Chunk is empty or exceeds the upload size."),
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Written under a lock on the partial file, so requests at the same
+        # offset cannot interleave their writes and truncations
+        try:
+            offset = write_upload_chunk(session, request.stream, start, length)
+        except UploadSession.DoesNotExist:
+            return Response(format_response(False, "Upload session not found or expired."),
+                            status=status.HTTP_404_NOT_FOUND)
+        except UploadOffsetConflict as conflict:
+            return Response(format_response(False, "Chunk offset does not match the upload session.", {'offset': conflict.offset}),
+                            status=status.HTTP_409_CONFLICT, headers={'Upload-Offset': conflict.offset})
+
+        return Response(format_response(True, "Chunk stored successfully.", {'offset': offset}),
+                        status=status.HTTP_200_OK, headers={'Upload-Offset': offset})
+
+
+# 20- Resumable uploads: attach the assembled file to the week video or voice recording
+class UploadSessionFinalizeView(APIView):
+    @swagger_auto_schema(responses={201: openapi.Response('Upload finalized successfully')})
+    def post(self, request, upload_id):
+        try:
+            session = UploadSession.objects.active().select_related('week').get(id=upload_id)
+        except UploadSession.DoesNotExist:
+            return Response(format_response(False, "Upload session not found or expired."),
+                            status=status.HTTP_404_NOT_FOUND)
+
+        if session.offset != session.total_size:
+            return Response(format_response(False, "Upload is not complete.", {'offset': session.offset}),
+                            status=status.HTTP_409_CONFLICT, headers={'Upload-Offset': session.offset})
+
+        week, media_type = session.week, session.media_type
+        model = Media if session.target == 'video' else KidVoiceRecording
+        try:
+            stored = finalize_upload_session(session, model, request)
+        except UploadSession.DoesNotExist:
+            return Response(format_response(False, "Upload session not found or expired."),
+                            status=status.HTTP_404_NOT_FOUND)
+        except IncompleteUploadError as error:
+            # Resume from the bytes actually on disk
+            if not UploadSession.objects.filter(id=session.id).update(offset=error.size):
+                return Response(format_response(False, "Upload session not found or expired."),
+                                status=status.HTTP_404_NOT_FOUND)
+            return Response(format_response(False, "Upload is not complete.", {'offset': error.size}),
+                            status=status.HTTP_409_CONFLICT, headers={'Upload-Offset': error.size})
+
+        if model is Media:
+            replace_week_media(week, [media_fields(stored, 'video')])
+            message = "Video uploaded successfully."
+        else:
+            KidVoiceRecording.objects.create(week=week, file=stored.name, url=stored.url, size=stored.size,
+                                             checksum=stored.checksum, feedback_state=False, media_type=media_type)
+            message = "Voice recording uploaded successfully."
+
+        return Response(format_response(True, message, {'url': stored.url}), status=status.HTTP_201_CREATED)
+
+
+# 21- Poll the derivative (thumbnail / poster frame) status of a media file
+class MediaDerivativeStatusView(APIView):
+    @swagger_auto_schema(responses={200: MediaDerivativeSerializer})
+    def get(self, request, media_id):
+        try:
+            media = Media.objects.only('id', 'derivative_state', 'preview').get(id=media_id)
+        except Media.DoesNotExist:
+            return Response(format_response(False, "Media not found."), status=status.HTTP_404_NOT_FOUND)
+
+        serializer = MediaDerivativeSerializer(media, context={'request': request})
+        return Response(format_response(True, "Derivative status fetched successfully.", serializer.data),
+                        status=status.HTTP_200_OK)
+
+
+# 22- Poll the derivative (normalized audio) status of a voice recording
+class KidVoiceRecordingDerivativeStatusView(APIView):
+    @swagger_auto_schema(responses={200: KidVoiceRecordingDerivativeSerializer})
+    def get(self, request, voice_id):
+        try:
+            voice_recording = KidVoiceRecording.objects.only('id', 'derivative_state', 'normalized_file', 'waveform').get(id=voice_id)
+        except KidVoiceRecording.DoesNotExist:
+            return Response(format_response(False, "Voice recording not found."), status=status.HTTP_404_NOT_FOUND)
+
+        serializer = KidVoiceRecordingDerivativeSerializer(voice_recording, context={'request': request})
+        return Response(format_response(True, "Derivative status fetched successfully.", serializer.data),
+                        status=status.HTTP_200_OK)
+
+
+# 23- Serve a week picture or video (or its preview) with Range and conditional GET support
+class MediaFileView(APIView):
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('k_id', openapi.IN_QUERY, description="Kid's ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('job_id', openapi.IN_QUERY, description="Doctor's job ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('variant', openapi.IN_QUERY, description="'preview' for the thumbnail or poster frame",
+                              type=openapi.TYPE_STRING),
+        ]
+    )
+    def get(self, request, media_id):
+        queryset = Media.objects.filter(id=media_id)
+        if request.GET.get('variant') == 'preview':
+            return serve_week_file(request, queryset, 'preview')
+        return serve_week_file(request, queryset, 'file', 'checksum')
+
+
+# 24- Serve a voice recording (or its normalized audio) with Range and conditional GET support
+class KidVoiceRecordingFileView(APIView):
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('k_id', openapi.IN_QUERY, description="Kid's ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('job_id', openapi.IN_QUERY, description="Doctor's job ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('variant', openapi.IN_QUERY, description="'normalized' for the normalized audio",
+                              type=openapi.TYPE_STRING),
+        ]
+    )
+    def get(self, request, voice_id):
+        queryset = KidVoiceRecording.objects.filter(id=voice_id)
+        if request.GET.get('variant') == 'normalized':
+            return serve_week_file(request, queryset, 'normalized_file')
+        return serve_week_file(request, queryset, 'file', 'checksum')
+
+
+# 25- Doctor dashboard: every kid with their weeks, media completeness and review counts
+class DoctorDashboardView(APIView):
+    @swagger_auto_schema(responses={200: DashboardKidSerializer(many=True)})
+    def get(self, request, job_id):
+        try:
+            doctor = Doctor.objects.only('id', 'job_id', 'full_name').get(job_id=job_id)
+        except Doctor.DoesNotExist:
+            return Response(format_response(False, "Doctor with job_id not found."), status=status.HTTP_404_NOT_FOUND)
+
+        # Counts come from the week summaries, so the query count does not grow with the number of kids
+        missing = list(Week.objects.filter(kid__doctor=doctor, summary__isnull=True).values_list('id', flat=True))
+        if missing:
+            week_summaries(missing)
+        weeks = Week.objects.select_related('summary').order_by('week_number')
+        kids = (Kid.objects.filter(doctor=doctor).only('id', 'k_id', 'name', 'age').order_by('name')
+                .prefetch_related(Prefetch('weeks', queryset=weeks)))
+
+        data = {
+            'job_id': doctor.job_id,
+            'full_name': doctor.full_name,
+            'kids': DashboardKidSerializer(kids, many=True).data,
+        }
+        return Response(format_response(True, "Dashboard fetched successfully.", data), status=status.HTTP_200_OK)
+
+
+# 26- Bulk kid enrollment from a JSON array or a CSV upload
+class KidBulkCreateView(APIView):
+    @swagger_auto_schema(
+        request_body=KidEnrollmentSerializer(many=True),
+        responses={201: KidSerializer(many=True)}
+    )
+    def post(self, request):
+        if 'file' in request.FILES:
+            try:
+                rows = read_kids_csv(request.FILES['file'])
+            except (UnicodeDecodeError, csv.Error):
+                return Response(format_response(False, "The file must be a UTF-8 CSV file."),
+                                status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = request.data.get('kids') if isinstance(request.data, dict) else request.data
+
+        if not isinstance(rows, list) or not rows:
+            return Response(format_response(False, "A non-empty list of kids is required."),
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.KID_ENROLLMENT_MAX_ROWS:
+            return Response(format_response(False, f"At most {settings.KID_ENROLLMENT_MAX_ROWS} kids can be enrolled at once."),
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        kids, errors = enroll_kids(rows)
+        if errors:
+            return Response(format_response(False, "Error enrolling kids. No kid was created.", format_errors(errors)),
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(format_response(True, f"{len(kids)} kids enrolled successfully.", KidSerializer(kids, many=True).data),
+                        status=status.HTTP_201_CREATED)
+
+
+# 27- Doctor's review queue: the oldest unreviewed recordings across all their kids
+class ReviewQueueView(APIView):
+    @swagger_auto_schema(
+        manual_parameters=[openapi.Parameter('limit', openapi.IN_QUERY, description="Number of recordings (max 100)",
+                                             type=openapi.TYPE_INTEGER)],
+        responses={200: ReviewQueueSerializer(many=True)}
+    )
+    def get(self, request, job_id):
+        try:
+            doctor = Doctor.objects.only('id').get(job_id=job_id)
+        except Doctor.DoesNotExist:
+            return Response(format_response(False, "Doctor with job_id not found."), status=status.HTTP_404_NOT_FOUND)
+
+        limit = parse_limit(request.GET.get('limit'), default=20)
+        if limit is None:
+            return Response(format_response(False, "limit must be a positive number."), status=status.HTTP_400_BAD_REQUEST)
+
+        recordings = review_queue(doctor).select_related('week__kid')[:limit]
+        return Response(format_response(True, "Review queue fetched successfully.",
+                                        ReviewQueueSerializer(recordings, many=True).data),
+                        status=status.HTTP_200_OK)
+
+
+# 28- Claim a batch of recordings from the doctor's review queue
+class ReviewQueueClaimView(APIView):
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'reviewer': openapi.Schema(type=openapi.TYPE_STRING, description="Who is claiming (defaults to the job ID)"),
+                'limit': openapi.Schema(type=openapi.TYPE_INTEGER, description="Number of recordings to claim (max 100)"),
+            }
+        ),
+        responses={200: ReviewQueueSerializer(many=True)}
+    )
+    def post(self, request, job_id):
+        try:
+            doctor = Doctor.objects.only('id').get(job_id=job_id)
+        except Doctor.DoesNotExist:
+            return Response(format_response(False, "Doctor with job_id not found."), status=status.HTTP_404_NOT_FOUND)
+
+        reviewer = str(request.data.get('reviewer') or job_id)[:64]
+        limit = parse_limit(request.data.get('limit'), default=10)
+        if limit is None:
+            return Response(format_response(False, "limit must be a positive number."), status=status.HTTP_400_BAD_REQUEST)
+
+        recordings = claim_recordings(doctor, reviewer, limit)
+        return Response(format_response(True, "Recordings claimed successfully.",
+                                        ReviewQueueSerializer(recordings, many=True).data),
+                        status=status.HTTP_200_OK)
+
+
+# 29- Hit and miss counters of the doctor / kid lookup cache in this process
+class CacheStatsView(APIView):
+    def get(self, request):
+        return Response(format_response(True, "Cache stats fetched successfully.", cache_stats()),
+                        status=status.HTTP_200_OK)
+
+
+# 30- Doctor gives feedback on many voice recordings at once
+class DoctorFeedbackBatchCreateView(APIView):
+    @swagger_auto_schema(
+        request_body=FeedbackItemSerializer(many=True),
+        responses={201: FeedbackSerializer(many=True)}
+    )
+    def post(self, request):
+        items = request.data.get('feedback') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response(format_response(False, "A non-empty list of feedback is required."),
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.FEEDBACK_BATCH_MAX_ITEMS:
+            return Response(format_response(False, f"At most {settings.FEEDBACK_BATCH_MAX_ITEMS} feedback items can be sent at once."),
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        feedback, errors, conflicts = create_feedback_batch(items)
+        if errors:
+            return Response(format_response(False, "Error adding feedback. No feedback was added.", format_errors(errors)),
+                            status=status.HTTP_400_BAD_REQUEST)
+        data = {'created': FeedbackSerializer(feedback, many=True).data, 'conflicts': format_conflicts(conflicts)}
+        if not feedback:
+            return Response(format_response(False, "Feedback has already been provided for these voice recordings.", data),
+                            status=status.HTTP_409_CONFLICT)
+        return Response(format_response(True, f"{len(feedback)} feedback added successfully.", data),
+                        status=status.HTTP_201_CREATED)
+
+
+# 31- Direct uploads: presigned PUT URLs for pictures, video or a voice recording of a week
+class DirectUploadCreateView(APIView):
+    @swagger_auto_schema(request_body=DirectUploadRequestSerializer)
+    def post(self, request):
+        if not direct_uploads_supported():
+            return Response(format_response(False, "Direct uploads need an object storage (MEDIA_STORAGE=s3)."),
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        # Expired upload targets are swept whenever new ones are handed out
+        purge_expired_direct_uploads()
+
+        serializer = DirectUploadRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(format_response(False, "Invalid data.", serializer.errors), status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        batch, uploads = create_direct_uploads(data['week'], data['target'], data.get('media_type'), data['files'])
+        return Response(format_response(True, "Upload URLs created.", {'batch': batch, 'uploads': uploads}),
+                        status=status.HTTP_201_CREATED)
+
+
+# 32- Direct uploads: confirm the files were PUT and attach them to the week
+class DirectUploadCompleteView(APIView):
+    @swagger_auto_schema(responses={201: openapi.Response('Upload completed successfully')})
+    def post(self, request, batch_id):
+        if not direct_uploads_supported():
+            return Response(format_response(False, "Direct uploads need an object storage (MEDIA_STORAGE=s3)."),
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        created, problems = complete_direct_uploads(batch_id, request)
+        if created is None:
+            return Response(format_response(False, "Direct upload not found, expired or already completed."),
+                            status=status.HTTP_404_NOT_FOUND)
+        if problems:
+            return Response(format_response(False, "Upload is not complete.", problems), status=status.HTTP_409_CONFLICT)
+
+        return Response(format_response(True, "Upload completed successfully.", {'urls': [row.url for row in created]}),
+                        status=status.HTTP_201_CREATED)
+
+
+# 33- Per-route request metrics of this process in the Prometheus text format
+class MetricsView(APIView):
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @swagger_auto_schema(auto_schema=None)
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if not settings.METRICS_ENABLED or not (token or settings.DEBUG):
+            return Response(format_response(False, "Metrics are not enabled."), status=status.HTTP_404_NOT_FOUND)
+        if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response(format_response(False, "Invalid metrics token."), status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# 34- OpenAPI schema, generated once per code version instead of on every request
+class OpenAPISchemaView(APIView):
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @swagger_auto_schema(auto_schema=None)
+    def get(self, request, format):
+        content, etag = load_schema(format)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=SCHEMA_FORMATS[format])
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+        return response
+
+
+# 35- Review progress of a kid's voice recordings by week and media type
+class KidProgressView(APIView):
+    @swagger_auto_schema(responses={200: openapi.Response('Kid progress fetched successfully')})
+    def get(self, request, kid_id):
+        try:
+            kid = Kid.objects.only('id', 'k_id', 'name').get(id=kid_id)
+        except Kid.DoesNotExist:
+            return Response(format_response(False, "Kid not found."), status=status.HTTP_404_NOT_FOUND)
+
+        # Served from the recording rollups kept up to date by the upload and feedback paths
+        return Response(format_response(True, "Kid progress fetched successfully.", kid_progress(kid)),
+                        status=status.HTTP_200_OK)
+
+
+# 36- Review quality of a doctor's caseload by kid and media type
+class DoctorCaseloadView(APIView):
+    @swagger_auto_schema(responses={200: openapi.Response('Doctor caseload fetched successfully')})
+    def get(self, request, job_id):
+        try:
+            doctor = Doctor.objects.only('id', 'job_id', 'full_name').get(job_id=job_id)
+        except Doctor.DoesNotExist:
+            return Response(format_response(False, "Doctor with job_id not found."), status=status.HTTP_404_NOT_FOUND)
+
+        return Response(format_response(True, "Doctor caseload fetched successfully.", doctor_caseload(doctor)),
+                        status=status.HTTP_200_OK)
@@ -28,9 +28,15 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'api',
-    'drf_yasg',
 ]
 
+# Serve the Swagger UI, ReDoc and the OpenAPI schema. drf_yasg is only imported by
+# the first docs request (see api.docs), and never when off: the view decorators
+# describing the API are then no-ops, so workers that do not serve docs use less memory.
+API_DOCS_ENABLED = os.environ.get('API_DOCS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -41,6 +47,31 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-route request metrics served in the Prometheus text format at /metrics (see
+# api.metrics), off unless METRICS_ENABLED is set. Every process keeps its own
+# numbers, so scrape each worker. Outside DEBUG the endpoint is only served with
+# METRICS_TOKEN set (sent as "Authorization: Bearer <token>"), since routes,
+# traffic and slow queries describe the deployment.
+# Queries slower than SLOW_QUERY_THRESHOLD_MS are counted, and SLOW_QUERY_SAMPLE_RATE
+# of them are logged with their SQL to the api.slow_queries logger.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', 0))
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'api.middleware.MetricsMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.slow_queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 ROOT_URLCONF = 'talk.urls'
 
 TEMPLATES = [
@@ -65,13 +96,77 @@ WSGI_APPLICATION = 'talk.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# The database profile is chosen from the environment with DB_ENGINE:
+#
+# - sqlite (default): SQLITE_PATH, served by the api.backends.sqlite3 backend which
+#   applies SQLITE_PRAGMAS to every new connection (a busy timeout instead of
+#   immediate "database is locked" errors, and mmap reads) and starts transactions
+#   with BEGIN IMMEDIATE. Set SQLITE_TUNING=0 to use Django's stock backend.
+#   SQLITE_WAL=1 also switches the database to the WAL journal, so readers never
+#   block the writer, with synchronous=NORMAL. The switch rewrites the database
+#   header and keeps -wal/-shm files next to it, so it is left off for the
+#   checked-in development database.
+# - postgresql: DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT. Connections are
+#   kept for DB_CONN_MAX_AGE seconds and health-checked before reuse. Behind
+#   PgBouncer in transaction pooling mode set DB_PGBOUNCER=1, which turns off the
+#   server-side cursors Django uses for QuerySet.iterator().
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', 'true').lower() in ('1', 'true', 'yes')
+SQLITE_WAL = os.environ.get('SQLITE_WAL', 'false').lower() in ('1', 'true', 'yes')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'talk'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_PGBOUNCER', 'false').lower() in ('1', 'true', 'yes'),
+            'OPTIONS': {'connect_timeout': 5},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'api.backends.sqlite3' if SQLITE_TUNING else 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # Seconds a statement waits for the write lock before failing
+            'OPTIONS': {'timeout': 20},
+        }
+    }
+
+SQLITE_PRAGMAS = {
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'memory',
+}
+if SQLITE_WAL:
+    SQLITE_PRAGMAS.update({'journal_mode': 'wal', 'synchronous': 'normal'})
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Per-process memory by default; point CACHE_BACKEND/CACHE_LOCATION at Redis or
+# Memcached to share entries between workers.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'talk-api'),
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 300)),
     }
 }
 
+# Cache holding the doctor list and doctor / kid profile payloads (see api.cache)
+API_CACHE_ALIAS = 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -112,6 +207,93 @@ STATIC_URL = 'static/'
 # Media files settings
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
+
+# Uploads are streamed once into storage in chunks of this size while the
+# size and checksum are computed on the way through.
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+UPLOAD_CHECKSUM_ALGORITHM = 'sha256'
+
+# Serve the upload and main listing endpoints with natively async views (see
+# api.async_views). Only worthwhile when running under ASGI, e.g.
+# `uvicorn talk.asgi:application`.
+API_ASYNC_VIEWS = os.environ.get('API_ASYNC_VIEWS', 'false').lower() in ('1', 'true', 'yes')
+
+# Largest number of kids accepted by one bulk enrollment request
+KID_ENROLLMENT_MAX_ROWS = 1000
+
+# Largest number of feedback items accepted by one batch request
+FEEDBACK_BATCH_MAX_ITEMS = 500
+
+# Rows fetched per database round trip when streaming the doctor directory export
+DOCTOR_EXPORT_CHUNK_SIZE = 2000
+
+# A reviewer's claim on queued voice recordings lapses after this many seconds
+REVIEW_CLAIM_TTL = 15 * 60
+
+# Resumable uploads are assembled here before being moved into MEDIA_ROOT, so
+# keep it on the same filesystem; the default directory is ignored by git. Sessions
+# idle for longer than the TTL expire.
+RESUMABLE_UPLOAD_ROOT = os.environ.get('RESUMABLE_UPLOAD_ROOT', os.path.join(BASE_DIR, 'partial_uploads/'))
+RESUMABLE_UPLOAD_TTL = int(os.environ.get('RESUMABLE_UPLOAD_TTL', 24 * 60 * 60))
+
+# Media storage: the local filesystem by default, or any S3-compatible object store
+# (AWS S3, MinIO, moto) with MEDIA_STORAGE=s3, which needs django-storages[s3].
+# Object storage also enables presigned direct uploads, valid for DIRECT_UPLOAD_EXPIRY
+# seconds, so media bytes never pass through the Django workers.
+MEDIA_STORAGE = os.environ.get('MEDIA_STORAGE', 'filesystem')
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+if MEDIA_STORAGE == 's3':
+    STORAGES['default'] = {
+        'BACKEND': 'api.storage.S3MediaStorage',
+        'OPTIONS': {
+            'bucket_name': os.environ.get('MEDIA_S3_BUCKET'),
+            'endpoint_url': os.environ.get('MEDIA_S3_ENDPOINT_URL'),
+            'region_name': os.environ.get('MEDIA_S3_REGION'),
+            'access_key': os.environ.get('MEDIA_S3_ACCESS_KEY_ID'),
+            'secret_key': os.environ.get('MEDIA_S3_SECRET_ACCESS_KEY'),
+            'custom_domain': os.environ.get('MEDIA_S3_CUSTOM_DOMAIN'),
+            # Media URLs are stored on the rows, so they must not expire
+            'querystring_auth': False,
+            'file_overwrite': False,
+        },
+    }
+DIRECT_UPLOAD_EXPIRY = int(os.environ.get('DIRECT_UPLOAD_EXPIRY', 60 * 60))
+DIRECT_UPLOAD_MAX_SIZE = int(os.environ.get('DIRECT_UPLOAD_MAX_SIZE', 2 * 1024 ** 3))
+
+# Replaced media files stay on disk for FILE_DELETION_GRACE seconds, so responses
+# still streaming them finish, before the sweep_file_deletions command removes them.
+# Failed deletions are retried with an exponential backoff starting at the retry delay.
+FILE_DELETION_GRACE = int(os.environ.get('FILE_DELETION_GRACE', 5 * 60))
+FILE_DELETION_RETRY_DELAY = 60
+
+# Derivatives (picture thumbnails, video posters, normalized audio) are built by
+# `manage.py run_derivative_worker`. Failed jobs are retried with exponential
+# backoff, and running jobs whose worker disappeared are picked up again after
+# the timeout; both count against the maximum attempts.
+DERIVATIVE_JOB_MAX_ATTEMPTS = 5
+DERIVATIVE_JOB_RETRY_DELAY = 30
+DERIVATIVE_JOB_TIMEOUT = 10 * 60
+DERIVATIVE_THUMBNAIL_SIZE = (320, 320)
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+# Voice recordings are transcoded to mono VOICE_TRANSCODE_CODEC (aac, libopus or
+# libmp3lame) at VOICE_TRANSCODE_BITRATE for review, and get a waveform of
+# VOICE_WAVEFORM_POINTS peaks from a decode at VOICE_WAVEFORM_SAMPLE_RATE Hz.
+VOICE_TRANSCODE_CODEC = os.environ.get('VOICE_TRANSCODE_CODEC', 'aac')
+VOICE_TRANSCODE_BITRATE = os.environ.get('VOICE_TRANSCODE_BITRATE', '48k')
+VOICE_WAVEFORM_POINTS = 200
+VOICE_WAVEFORM_SAMPLE_RATE = 8000
+
+# How media files are handed to clients: 'sendfile' streams them through the
+# server's wsgi.file_wrapper (zero-copy under gunicorn), 'x-accel-redirect'
+# (nginx) and 'x-sendfile' (Apache, lighttpd) let the front server send them.
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'sendfile')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -121,4 +303,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Disable authentication for Swagger docs generation
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': None,
-}
\ No newline at end of file
+    # Point the UI at the pregenerated schema instead of introspecting the API per page view
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+# The OpenAPI schema is generated once per code version into OPENAPI_SCHEMA_ROOT,
+# by `manage.py generate_openapi_schema` at build time or else on the first
+# request, and served with an ETag and a public max-age. API_CODE_VERSION (e.g.
+# the git commit) names the version; when unset, a digest of the sources is used.
+# The default directory is ignored by git.
+API_CODE_VERSION = os.environ.get('API_CODE_VERSION', '')
+OPENAPI_SCHEMA_ROOT = os.environ.get('OPENAPI_SCHEMA_ROOT', os.path.join(BASE_DIR, 'openapi/'))
+OPENAPI_SCHEMA_MAX_AGE = int(os.environ.get('OPENAPI_SCHEMA_MAX_AGE', 24 * 60 * 60))
\ No newline at end of file
@@ -1,29 +1,22 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include ,re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
+from api.docs import ui_view
+from api.views import MetricsView, OpenAPISchemaView
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="doctor and kid app",
-      default_version='v1',
-      description="API documentation for your Django project",
-      terms_of_service="https://www.example.com/policies/terms/",
-      contact=openapi.Contact(email="support@example.com"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-
-)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-    path('swagger.json/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
 
+# The schema comes from OpenAPISchemaView; the UIs only render their page
+if settings.API_DOCS_ENABLED:
+    urlpatterns += [
+        re_path(r'^swagger(?P<format>\.json|\.yaml)$', OpenAPISchemaView.as_view(), name='schema-json'),
+        path('swagger/', ui_view('swagger'), name='schema-swagger-ui'),
+        path('redoc/', ui_view('redoc'), name='schema-redoc'),
+        path('swagger.json/', OpenAPISchemaView.as_view(), {'format': '.json'}, name='schema-json'),
+    ]